@@ -1,13 +1,17 @@
 # file: api/ai_tasks.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 # Импортируем наши модули
-from db import crud, schemas, models
-from db.database import get_db
-from api.auth_dependency import get_current_user
+from db import crud_async, schemas, models
+from db.database import get_async_db
+from api.auth_dependency import get_current_user_async
+from api.responses import FastJSONResponse, ai_content_to_dict
+from core import text_stats
+from core.config import settings
+from core.executors import parsing_executor
 from services import ai_processor
 
 # Создаем новый роутер для AI-задач
@@ -17,35 +21,40 @@ router = APIRouter(prefix="/ai", tags=["AI Tasks"])
 async def generate_ai_content(
     note_id: int = Form(...),
     task_type: schemas.AITaskType = Form(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """
     Запускает генерацию AI-контента (summary, flashcards, quiz) для существующей заметки
     и сохраняет результат в базу данных.
     """
-    # --- СИНХРОННЫЙ БЛОК: РАБОТА С БАЗОЙ ДАННЫХ ---
-    # 1. Находим заметку в БД и проверяем, что она принадлежит текущему пользователю
-    note = crud.get_note_by_id(db, note_id=note_id, user_id=current_user.id)
+    # --- РАБОТА С БАЗОЙ ДАННЫХ (асинхронная сессия, event loop не блокируется) ---
+    # 1. Находим заметку в БД и проверяем, что она принадлежит текущему пользователю.
+    # Читается только текст блоков заметки, без остальных колонок блоков
+    note = await crud_async.get_note_text(db, note_id=note_id, user_id=current_user.id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note not found."
         )
 
-    # 2. Собираем весь текст из контента заметки для отправки в AI
-    text_content = ""
-    if isinstance(note.content, list):
-        text_content = " ".join([
-            block.get("text", "") for block in note.content if isinstance(block, dict)
-        ])
-    
-    if not text_content.strip():
+    if not note.plain_text.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Note has no text content to process."
         )
-    # --- КОНЕЦ СИНХРОННОГО БЛОКА ---
+
+    # 2. Укладываем текст в бюджет модели по сохраненному числу токенов
+    token_count = note.token_count
+    if token_count is None or note.content_hash is None:
+        token_count = await parsing_executor.run(text_stats.count_tokens, note.plain_text)
+        content_hash = await parsing_executor.run(text_stats.content_hash, note.block_texts)
+        await crud_async.set_note_text_stats(db, note, content_hash=content_hash, token_count=token_count)
+    text_content = text_stats.trim_to_token_budget(note.plain_text, token_count, settings.AI_MAX_INPUT_TOKENS)
+    # Завершаем транзакцию чтения: соединение возвращается в пул
+    # и не простаивает занятым, пока ждем ответ OpenAI
+    await db.commit()
+    # --- КОНЕЦ РАБОТЫ С БАЗОЙ ---
 
     # --- АСИНХРОННЫЙ БЛОК: РАБОТА С OpenAI ---
     generated_data = None
@@ -63,13 +72,14 @@ async def generate_ai_content(
         )
     # --- КОНЕЦ АСИНХРОННОГО БЛОКА ---
 
-    # --- СНОВА СИНХРОННЫЙ БЛОК: СОХРАНЕНИЕ В БД ---
+    # --- СОХРАНЕНИЕ В БД ---
     ai_content_to_create = schemas.AIGeneratedContentCreate(
         content_type=task_type,
         data=generated_data
     )
     
     # Сохраняем результат в базу данных с помощью новой CRUD-функции
-    db_ai_content = crud.create_ai_content(db, content=ai_content_to_create, note_id=note.id)
-    
-    return db_ai_content
\ No newline at end of file
+    db_ai_content = await crud_async.create_ai_content(db, content=ai_content_to_create, note_id=note.id)
+
+    # Данные только что сохранены нами же — отдаем без повторной проверки через response_model
+    return FastJSONResponse(ai_content_to_dict(db_ai_content))
\ No newline at end of file
@@ -4,9 +4,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 # Импортируем наши модули
-from db import crud, schemas
+from db import crud, models, schemas
 from db.database import get_db
-from core import security
+from .auth_dependency import create_user_token, get_current_user, invalidate_user
 
 # Создаем новый роутер.
 # prefix="/auth" означает, что все эндпоинты в этом файле будут начинаться с /auth
@@ -37,11 +37,27 @@ def signup_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     else:
         print(f"User with device_id {db_user.device_id} already exists. Issuing new token.")
 
-    # Создаем JWT токен. В 'sub' (subject) мы помещаем device_id.
-    # Это позволит нам в будущем идентифицировать пользователя по токену.
-    access_token = security.create_access_token(
-        data={"sub": db_user.device_id}
-    )
+    # Создаем JWT токен. В 'sub' (subject) мы помещаем device_id,
+    # а ID пользователя и версия токенов позволяют проверять токен по кэшу, без БД.
+    access_token = create_user_token(db_user)
 
     # Возвращаем токен клиенту
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post("/revoke-tokens", response_model=schemas.Token)
+def revoke_tokens(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Отзывает все выданные пользователю токены (например, при потере устройства)
+    и возвращает новый токен для текущего клиента.
+    """
+    new_version = crud.increment_token_version(db, user_id=current_user.id)
+    invalidate_user(current_user.id)
+    if new_version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
+
+    db_user = crud.get_user_by_id(db, user_id=current_user.id)
+    return {"access_token": create_user_token(db_user), "token_type": "bearer"}
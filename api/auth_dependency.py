@@ -1,41 +1,146 @@
 # file: api/auth_dependency.py
 
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from db import crud, models
-from db.database import get_db
+from db import crud, crud_async, models
+from db.database import get_async_db, get_db
 from core import security
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
 
 # Создаем правильную схему HTTPBearer
 bearer_scheme = HTTPBearer(auto_error=True)
 
-def get_current_user(
-    auth: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db)
-) -> models.User:
+# Пользователи по ID для проверки токенов без обращения к БД.
+# В кэше лежат отсоединенные от сессии объекты User: у них загружены только
+# колонки (id, device_id, token_version), связи (notes, folders) недоступны.
+user_cache = TTLCache(
+    "auth_users",
+    maxsize=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_user(user_id: int):
     """
-    Зависимость для получения текущего пользователя на основе JWT Bearer токена.
+    Убирает пользователя из кэша. Вызывается после любого изменения пользователя,
+    влияющего на проверку токенов (новая версия токенов, удаление).
     """
-    token = auth.credentials
-    
-    credentials_exception = HTTPException(
+    user_cache.pop(user_id)
+
+
+def create_user_token(user: models.User) -> str:
+    """Токен с device_id (sub), ID пользователя (uid) и версией токенов (ver)."""
+    return security.create_access_token(
+        data={"sub": user.device_id, "uid": user.id, "ver": user.token_version}
+    )
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _decode_token(token: str) -> Optional[dict]:
+    """Проверяет подпись и срок токена; payload или None."""
     payload = security.decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
+    if payload is None or payload.get("sub") is None:
+        return None
+    return payload
+
+
+def _matches_token(user: Optional[models.User], payload: dict) -> bool:
+    """
+    Пользователь соответствует токену. Старые токены без "uid"/"ver"
+    считаются токенами версии 0 и отзываются так же, как новые.
+    """
+    if user is None or user.device_id != payload["sub"]:
+        return False
+    if payload.get("uid") is not None and user.id != payload["uid"]:
+        return False
+    return user.token_version == payload.get("ver", 0)
+
+
+def _cached_user(payload: dict) -> Optional[models.User]:
+    """Пользователь из кэша, если токен новый (с "uid") и версия совпадает."""
+    uid = payload.get("uid")
+    if uid is None:
+        return None
+    user = user_cache.get(uid)
+    if user is not None and _matches_token(user, payload):
+        return user
+    # Версия в кэше может отставать (токены отозваны в другом процессе) — перечитаем из БД
+    return None
+
 
-    device_id: str = payload.get("sub")
-    if device_id is None:
-        raise credentials_exception
+def _accept_user(db, user: Optional[models.User], payload: dict) -> Optional[models.User]:
+    """Проверяет загруженного из БД пользователя и кладет его в кэш."""
+    if not _matches_token(user, payload):
+        metrics.inc("auth.tokens_rejected")
+        return None
+    db.expunge(user)
+    user_cache.set(user.id, user)
+    return user
 
-    user = crud.get_user_by_device_id(db, device_id=device_id)
+
+def get_current_user(
+    auth: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+) -> models.User:
+    """
+    Зависимость для получения текущего пользователя на основе JWT Bearer токена.
+    Обычно пользователь берется из кэша, и запроса к БД нет вовсе.
+    """
+    payload = _decode_token(auth.credentials)
+    if payload is None:
+        raise _credentials_exception()
+
+    user = _cached_user(payload)
+    if user is None:
+        if payload.get("uid") is not None:
+            user = crud.get_user_by_id(db, user_id=payload["uid"])
+        else:
+            user = crud.get_user_by_device_id(db, device_id=payload["sub"])
+        user = _accept_user(db, user, payload)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    return user
\ No newline at end of file
+    return user
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> Optional[models.User]:
+    """Пользователь по токену или None (для WebSocket, где нет HTTPException)."""
+    payload = _decode_token(token)
+    if payload is None:
+        return None
+    user = _cached_user(payload)
+    if user is not None:
+        return user
+    if payload.get("uid") is not None:
+        user = await crud_async.get_user_by_id(db, user_id=payload["uid"])
+    else:
+        user = await crud_async.get_user_by_device_id(db, device_id=payload["sub"])
+    return _accept_user(db, user, payload)
+
+
+async def get_current_user_async(
+    auth: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    """
+    То же, что get_current_user, но через асинхронную сессию. Эндпоинт,
+    объявивший Depends(get_async_db), получит ту же сессию (FastAPI кэширует зависимости).
+    """
+    user = await authenticate_token(db, auth.credentials)
+    if user is None:
+        raise _credentials_exception()
+    return user
@@ -0,0 +1,46 @@
+# file: api/conditional.py
+
+"""
+Условные GET (ETag / If-None-Match).
+
+ETag вычисляется из дешевого признака версии данных (счетчик изменений
+пользователя, updated_at заметки), который читается одним индексированным
+запросом. Если клиент прислал тот же ETag, эндпоинт отвечает 304 без тела,
+не загружая и не сериализуя сами данные.
+"""
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Клиент обязан перепроверять ответ при каждом использовании, но может хранить его у себя
+CACHE_CONTROL = "private, no-cache"
+
+
+def weak_etag(*parts) -> str:
+    """Слабый ETag из частей версии (ответы семантически равны, байтовое совпадение не обещаем)."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с одним из перечисленных в If-None-Match (слабое сравнение)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
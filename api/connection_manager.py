@@ -1,48 +1,160 @@
 # file: api/connection_manager.py
 
-from fastapi import WebSocket
-from typing import Dict, List
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from fastapi import WebSocket, status
+
+from core.config import settings
+from core.metrics import metrics
+
+# Что делать, когда очередь исходящих сообщений соединения заполнена
+QUEUE_FULL_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+class _Peer:
+    """Соединение в комнате: ограниченная очередь исходящих сообщений и задача, которая ее отправляет."""
+    def __init__(self, websocket: WebSocket, note_id: str):
+        self.websocket = websocket
+        self.note_id = note_id
+        self.queue: Deque[str] = deque()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+
 
 class ConnectionManager:
     """
     Класс для управления активными WebSocket-соединениями.
     Работает по принципу "комнат", где каждая комната - это ID заметки.
+
+    У каждого соединения своя очередь исходящих сообщений (до WS_SEND_QUEUE_SIZE)
+    и своя задача-писатель. broadcast только кладет сообщение в очереди и не ждет
+    отправки, поэтому медленный или зависший клиент не задерживает остальных.
+    Если очередь клиента заполнена, применяется WS_QUEUE_FULL_POLICY:
+      * drop_oldest — выбрасывается самое старое сообщение;
+      * coalesce — очередь заменяется новым сообщением (клиенту важно только
+        последнее состояние);
+      * disconnect — медленный клиент отключается.
+    Клиент, не принявший сообщение за WS_SEND_TIMEOUT_SECONDS, тоже отключается.
+    Глубина очередей и отключения видны в /metrics как ws.*.
     """
-    def __init__(self):
-        # Словарь для хранения активных соединений.
-        # Формат: { "note_id_1": [websocket1, websocket2], "note_id_2": [websocket3] }
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(self, queue_size: int, policy: str, send_timeout_seconds: float):
+        if policy not in QUEUE_FULL_POLICIES:
+            raise ValueError(f"Unknown WebSocket queue policy '{policy}', expected one of {QUEUE_FULL_POLICIES}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout_seconds = send_timeout_seconds
+        # Формат: { "note_id_1": {websocket1: peer1, websocket2: peer2}, ... }
+        self.active_connections: Dict[str, Dict[WebSocket, _Peer]] = {}
+        # Задачи закрытия отключенных клиентов: event loop держит на задачи только слабые
+        # ссылки, поэтому без этого множества незавершенная задача может быть собрана GC
+        self._closing: Set[asyncio.Task] = set()
+
+        metrics.register_gauge("ws.connections", lambda: sum(len(room) for room in self.active_connections.values()))
+        metrics.register_gauge("ws.queue_depth_total", lambda: sum(len(peer.queue) for peer in self._peers()))
+        metrics.register_gauge("ws.queue_depth_max", lambda: max((len(peer.queue) for peer in self._peers()), default=0))
+
+    def _peers(self):
+        return [peer for room in list(self.active_connections.values()) for peer in list(room.values())]
 
     async def connect(self, websocket: WebSocket, note_id: str):
         """
         Принимает новое WebSocket-соединение и добавляет его в "комнату" заметки.
         """
         await websocket.accept()
-        if note_id not in self.active_connections:
-            # Если это первое подключение к этой заметке, создаем для нее "комнату"
-            self.active_connections[note_id] = []
-        self.active_connections[note_id].append(websocket)
+        peer = _Peer(websocket, note_id)
+        peer.writer = asyncio.create_task(self._write_loop(peer))
+        # Если это первое подключение к этой заметке, создается и "комната"
+        self.active_connections.setdefault(note_id, {})[websocket] = peer
 
     def disconnect(self, websocket: WebSocket, note_id: str):
         """
-        Удаляет WebSocket-соединение из "комнаты" заметки.
+        Удаляет WebSocket-соединение из "комнаты" заметки и останавливает его отправку.
+        Повторный вызов (например, после отключения медленного клиента) ничего не делает.
         """
-        if note_id in self.active_connections:
-            self.active_connections[note_id].remove(websocket)
-            # Если в комнате больше никого не осталось, можно удалить и саму комнату
-            if not self.active_connections[note_id]:
-                del self.active_connections[note_id]
+        room = self.active_connections.get(note_id)
+        if room is None:
+            return
+        peer = room.pop(websocket, None)
+        # Если в комнате больше никого не осталось, удаляем и саму комнату
+        if not room:
+            del self.active_connections[note_id]
+        if peer is not None and peer.writer is not asyncio.current_task():
+            peer.writer.cancel()
 
-    async def broadcast(self, message: str, note_id: str, sender: WebSocket):
+    def is_connected(self, websocket: WebSocket, note_id: str) -> bool:
+        """Соединение все еще в комнате (не отключено как медленное)."""
+        return websocket in self.active_connections.get(note_id, {})
+
+    def broadcast(self, message: str, note_id: str, sender: WebSocket):
         """
-        Рассылает сообщение всем подключенным клиентам в "комнате" заметки,
-        кроме самого отправителя.
+        Ставит сообщение в очередь каждому клиенту в "комнате" заметки,
+        кроме самого отправителя. Не ждет отправки.
         """
-        if note_id in self.active_connections:
-            for connection in self.active_connections[note_id]:
-                if connection != sender:
-                    await connection.send_text(message)
+        room = self.active_connections.get(note_id)
+        if not room:
+            return
+        for connection, peer in list(room.items()):
+            if connection != sender:
+                self._enqueue(peer, message)
+
+    def _enqueue(self, peer: _Peer, message: str):
+        if len(peer.queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                metrics.inc("ws.slow_consumer_evictions")
+                self._evict(peer)
+                return
+            if self.policy == "coalesce":
+                metrics.inc("ws.messages_coalesced", len(peer.queue))
+                peer.queue.clear()
+            else:
+                metrics.inc("ws.messages_dropped")
+                peer.queue.popleft()
+        peer.queue.append(message)
+        metrics.inc("ws.messages_enqueued")
+        peer.wakeup.set()
+
+    def _evict(self, peer: _Peer):
+        """Убирает клиента из комнаты и закрывает соединение (в фоне, не задерживая рассылку)."""
+        self.disconnect(peer.websocket, peer.note_id)
+        task = asyncio.create_task(self._close(peer.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            # Соединение уже закрыто или оборвано
+            pass
+
+    async def _write_loop(self, peer: _Peer):
+        """Отправляет сообщения из очереди клиента по одному, пока соединение в комнате."""
+        while True:
+            if not peer.queue:
+                peer.wakeup.clear()
+                await peer.wakeup.wait()
+                continue
+            message = peer.queue.popleft()
+            try:
+                await asyncio.wait_for(peer.websocket.send_text(message), timeout=self.send_timeout_seconds)
+            except asyncio.TimeoutError:
+                metrics.inc("ws.slow_consumer_evictions")
+                self._evict(peer)
+                return
+            except Exception as e:
+                # Соединение оборвалось: читающий цикл эндпоинта тоже получит отключение
+                print(f"WebSocket send to note {peer.note_id} failed: {e}")
+                metrics.inc("ws.send_errors")
+                self.disconnect(peer.websocket, peer.note_id)
+                return
+            metrics.inc("ws.messages_sent")
 
 # Создаем один глобальный экземпляр менеджера,
 # который будет использоваться во всем приложении (Singleton pattern).
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    policy=settings.WS_QUEUE_FULL_POLICY,
+    send_timeout_seconds=settings.WS_SEND_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,112 @@
+# file: api/db_routing.py
+
+"""
+Чтение с реплики PostgreSQL (DATABASE_REPLICA_URL).
+
+GET-эндпоинты, которые только читают (списки, карточки, поиск, выгрузка),
+берут сессию через get_read_db, остальные — через get_db (основная БД).
+Реплика не используется, если:
+  * клиент недавно что-то записал: после успешного изменяющего запроса
+    ReadYourWritesMiddleware ставит короткоживущую cookie, и следующие
+    READ_YOUR_WRITES_SECONDS секунд чтения этого клиента идут в основную БД;
+  * реплика отстает больше чем на REPLICA_MAX_LAG_SECONDS или недоступна.
+Куда ушли чтения, видно в /metrics как db.reads.primary / db.reads.replica.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from db.database import ReplicaSessionLocal, SessionLocal, replica_engine
+from core.config import settings
+from core.metrics import metrics
+
+PRIMARY_COOKIE = "db_primary"
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Отставание реплики: ноль, если она применила весь полученный WAL
+_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class _ReplicaLag:
+    """Последнее измеренное отставание реплики; перепроверяется не чаще раза в REPLICA_LAG_CHECK_SECONDS."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._lag: Optional[float] = None
+        if replica_engine is not None:
+            metrics.register_gauge("db.replica.lag_seconds", lambda: self._lag if self._lag is not None else -1)
+
+    def current(self) -> Optional[float]:
+        """Отставание в секундах или None, если реплика не отвечает."""
+        with self._lock:
+            if time.monotonic() - self._checked_at < settings.REPLICA_LAG_CHECK_SECONDS:
+                return self._lag
+            self._checked_at = time.monotonic()
+        try:
+            with replica_engine.connect() as connection:
+                lag = float(connection.execute(_LAG_QUERY).scalar() or 0.0)
+        except Exception as e:
+            print(f"--- WARNING: replica lag check failed: {e} ---")
+            metrics.inc("db.replica.check_errors")
+            lag = None
+        with self._lock:
+            self._lag = lag
+        return lag
+
+
+replica_lag = _ReplicaLag()
+
+
+def read_session_factory(request: Request) -> sessionmaker:
+    """Фабрика сессий для чтения: реплика или основная БД (см. описание модуля)."""
+    if ReplicaSessionLocal is not None and PRIMARY_COOKIE not in request.cookies:
+        lag = replica_lag.current()
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+            metrics.inc("db.reads.replica")
+            return ReplicaSessionLocal
+    metrics.inc("db.reads.primary")
+    return SessionLocal
+
+
+def get_read_db(request: Request):
+    """Как get_db, но для эндпоинтов, которые только читают."""
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class ReadYourWritesMiddleware:
+    """
+    После успешного изменяющего запроса (POST/PUT/PATCH/DELETE со статусом < 400)
+    ставит cookie, которая на READ_YOUR_WRITES_SECONDS отправляет чтения клиента
+    в основную БД, чтобы он сразу видел свои изменения. Без реплики ничего не делает.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.cookie = (
+            f"{PRIMARY_COOKIE}=1; Max-Age={settings.READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or ReplicaSessionLocal is None or scope["method"] in _SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("Set-Cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,137 @@
+# file: api/exports.py
+
+import zipfile
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import sessionmaker
+
+from db import crud, models
+from core.config import settings
+from core.metrics import metrics
+from .auth_dependency import get_current_user
+from .db_routing import read_session_factory
+from .responses import ai_content_to_dict, ndjson_line, note_to_dict
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+_SINCE_DESCRIPTION = (
+    "Инкрементальная выгрузка: только изменения начиная с этого момента "
+    "(значение watermark из предыдущей выгрузки)"
+)
+
+
+def _export_lines(session_factory: sessionmaker, user_id: int, since: Optional[datetime]) -> Iterator[bytes]:
+    """
+    Все данные пользователя строками NDJSON: заголовок, папки, заметки с блоками,
+    AI-контент, при since — удаленные заметки, и итоговая строка "done".
+
+    Генератор синхронный: StreamingResponse выполняет его в пуле потоков, а строки
+    читаются из БД серверным курсором пачками по EXPORT_BATCH_SIZE, поэтому память
+    не зависит от объема данных. Сессия своя — она живет, пока идет ответ
+    (по возможности на реплике: выгрузка — самое долгое чтение в приложении).
+    """
+    batch_size = settings.EXPORT_BATCH_SIZE
+    db = session_factory()
+    try:
+        watermark = crud.get_export_watermark(db, settings.EXPORT_WATERMARK_MARGIN_SECONDS)
+        yield ndjson_line({"record": "export", "since": since, "watermark": watermark})
+
+        # Папок немного, поэтому они выгружаются всегда целиком: удаленные
+        # клиент определяет по отсутствию в списке
+        for folder in crud.get_all_folders_by_user(db, user_id=user_id):
+            yield ndjson_line({"record": "folder", "id": folder.id, "name": folder.name, "created_at": folder.created_at})
+
+        counts = {"notes": 0, "ai_content": 0, "deleted_notes": 0}
+        for notes in crud.iter_notes_for_export(db, user_id, batch_size, since=since):
+            for db_note in notes:
+                yield ndjson_line({"record": "note", **note_to_dict(db_note)})
+            counts["notes"] += len(notes)
+        for contents in crud.iter_ai_content_for_export(db, user_id, batch_size, since=since):
+            for db_content in contents:
+                yield ndjson_line({"record": "ai_content", **ai_content_to_dict(db_content)})
+            counts["ai_content"] += len(contents)
+        if since is not None:
+            for rows in crud.iter_note_tombstones(db, user_id, since, batch_size):
+                for row in rows:
+                    yield ndjson_line({"record": "note_deleted", "id": row.id, "deleted_at": row.deleted_at})
+                counts["deleted_notes"] += len(rows)
+
+        metrics.inc("export.notes", counts["notes"])
+        metrics.inc("export.ai_content", counts["ai_content"])
+        yield ndjson_line({"record": "done", "watermark": watermark, **counts})
+    finally:
+        db.close()
+
+
+class _ZipOutput:
+    """
+    Файлоподобный приемник для zipfile: накапливает записанные байты до выдачи.
+    Метода tell нет, поэтому zipfile пишет архив последовательно (без seek).
+    """
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _export_zip(session_factory: sessionmaker, user_id: int, since: Optional[datetime]) -> Iterator[bytes]:
+    """Та же выгрузка, сжатая в zip-архив с одним файлом export.ndjson, — потоком."""
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # Размер заранее неизвестен: zip64 снимает ограничение в 4 ГБ
+        with archive.open("export.ndjson", "w", force_zip64=True) as member:
+            for line in _export_lines(session_factory, user_id, since):
+                member.write(line)
+                chunk = output.take()
+                if chunk:
+                    yield chunk
+    yield output.take()
+
+
+def _attachment(extension: str) -> dict:
+    filename = f"ainotea-export-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+@router.get("/ndjson")
+def export_ndjson(
+    request: Request,
+    since: Optional[datetime] = Query(None, description=_SINCE_DESCRIPTION),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Полная выгрузка заметок, папок и AI-контента потоком NDJSON.
+    Каждая строка — объект с полем record: export, folder, note, ai_content,
+    note_deleted (только при since) и итоговый done с watermark для следующей выгрузки.
+    Строки, измененные во время выгрузки, могут прийти повторно — применять их нужно по id.
+    """
+    return StreamingResponse(
+        _export_lines(read_session_factory(request), current_user.id, since),
+        media_type="application/x-ndjson", headers=_attachment("ndjson"),
+    )
+
+
+@router.get("/zip")
+def export_zip(
+    request: Request,
+    since: Optional[datetime] = Query(None, description=_SINCE_DESCRIPTION),
+    current_user: models.User = Depends(get_current_user)
+):
+    """То же, что /export/ndjson, но в zip-архиве (export.ndjson внутри) — в несколько раз меньше на проводе."""
+    return StreamingResponse(
+        _export_zip(read_session_factory(request), current_user.id, since),
+        media_type="application/zip", headers=_attachment("zip"),
+    )
@@ -1,6 +1,6 @@
 # file: api/folders.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -8,6 +8,8 @@ from typing import List
 from db import crud, schemas, models
 from db.database import get_db
 from .auth_dependency import get_current_user
+from .db_routing import get_read_db
+from .conditional import etag_matches, not_modified, set_etag, weak_etag
 
 router = APIRouter(prefix="/folders", tags=["Folders"])
 
@@ -30,12 +32,20 @@ def create_new_folder(
 
 @router.get("/", response_model=List[schemas.Folder])
 def get_all_user_folders(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Возвращает список всех папок, принадлежащих текущему пользователю.
+    Поддерживает If-None-Match: без изменений у пользователя ответ — 304 без тела.
     """
+    content_version = crud.get_user_content_version(db, user_id=current_user.id)
+    etag = weak_etag("folders", current_user.id, content_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return crud.get_all_folders_by_user(db=db, user_id=current_user.id)
 
 
@@ -0,0 +1,374 @@
+# file: api/imports.py
+
+import asyncio
+import os
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from db import crud, schemas, models
+from db.database import SessionLocal
+from core.config import settings
+from core.executors import io_executor, embedding_executor
+from core.metrics import metrics
+from .auth_dependency import get_current_user
+from .responses import ndjson_line
+from .notes import (ContentBlock, default_note_title, extract_blocks_from_data,
+                    extract_blocks_from_stored_file, index_notes_batch, release_stored_files)
+from services.file_references import file_references
+from services.storage import StoredFile, UploadTooLargeError, file_storage, max_upload_bytes
+
+router = APIRouter(prefix="/import", tags=["Import"])
+
+_MB = 1024 * 1024
+
+# Тип источника по расширению файла внутри архива
+_ZIP_SOURCE_TYPES = {
+    ".pdf": schemas.AddTextSourceType.PDF,
+    ".docx": schemas.AddTextSourceType.DOCX,
+    ".txt": schemas.AddTextSourceType.TEXT,
+    ".md": schemas.AddTextSourceType.TEXT,
+    **{ext: schemas.AddTextSourceType.AUDIO for ext in (".mp3", ".m4a", ".wav", ".ogg", ".oga", ".webm", ".mp4", ".mpeg", ".mpga", ".flac")},
+    **{ext: schemas.AddTextSourceType.PHOTO for ext in (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")},
+}
+_NDJSON_EXTENSIONS = {".ndjson", ".jsonl"}
+_FILE_SOURCE_TYPES = {
+    schemas.AddTextSourceType.PDF, schemas.AddTextSourceType.DOCX, schemas.AddTextSourceType.AUDIO,
+    schemas.AddTextSourceType.RECORD, schemas.AddTextSourceType.PHOTO,
+}
+
+
+class _ImportItemError(Exception):
+    """Ошибка одного элемента импорта: попадает в отчет, импорт продолжается."""
+
+
+@dataclass
+class _ImportItem:
+    """Элемент импорта и результат его извлечения."""
+    source: str
+    source_type: Optional[schemas.AddTextSourceType] = None
+    data: Optional[str] = None
+    zip_member: Optional[zipfile.ZipInfo] = None
+    title: Optional[str] = None
+    folder_id: Optional[int] = None
+    index: int = -1
+    blocks: List[ContentBlock] = field(default_factory=list)
+    stored_file: Optional[StoredFile] = None
+    error: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(block.text for block in self.blocks)
+
+
+# --- Чтение входных данных ---
+
+async def _spool_to_temp(chunks: AsyncIterator[bytes], suffix: str) -> str:
+    """
+    Сохраняет тело запроса во временный файл (порциями, через пул io).
+    Импорт идет уже после ответа клиенту потоком, поэтому входные данные
+    должны пережить сам запрос.
+    """
+    max_bytes = settings.IMPORT_MAX_UPLOAD_MB * _MB
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        f"Импорт превышает допустимый размер {settings.IMPORT_MAX_UPLOAD_MB} МБ."
+                    )
+                await io_executor.run(buffer.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+async def _upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(_MB):
+        yield chunk
+
+
+def _readline_limited(fileobj) -> Optional[bytes]:
+    """
+    Читает строку не длиннее IMPORT_MAX_LINE_BYTES (b"" — конец файла).
+    Слишком длинная строка пропускается до конца, а вместо нее возвращается None.
+    """
+    line = fileobj.readline(settings.IMPORT_MAX_LINE_BYTES + 1)
+    if len(line) <= settings.IMPORT_MAX_LINE_BYTES or line.endswith(b"\n"):
+        return line
+    while (rest := fileobj.readline(_MB)) and not rest.endswith(b"\n"):
+        pass
+    return None
+
+
+def _parse_ndjson_line(line: Optional[bytes]) -> _ImportItem:
+    if line is None:
+        return _ImportItem(source="", error="Строка длиннее допустимого размера.")
+    try:
+        parsed = schemas.ImportItem.model_validate_json(line)
+    except ValidationError as e:
+        return _ImportItem(source=line[:100].decode("utf-8", "replace"), error=f"Некорректная строка: {e.errors()[0]['msg']}")
+    return _ImportItem(
+        source=parsed.data[:100], source_type=parsed.type, data=parsed.data,
+        title=parsed.title, folder_id=parsed.folder_id,
+    )
+
+
+async def _ndjson_items(fileobj) -> AsyncIterator[_ImportItem]:
+    """Элементы из NDJSON: по одному JSON-объекту на строку, пустые строки пропускаются."""
+    while True:
+        line = await io_executor.run(_readline_limited, fileobj)
+        if line == b"":
+            return
+        if line is not None and not line.strip():
+            continue
+        yield _parse_ndjson_line(line)
+
+
+async def _zip_items(archive: zipfile.ZipFile) -> AsyncIterator[_ImportItem]:
+    """
+    Элементы из zip-архива: файлы PDF/DOCX/аудио/фото/текст становятся заметками,
+    а файлы .ndjson/.jsonl внутри архива читаются как списки ссылок и текстов.
+    """
+    for info in archive.infolist():
+        name = info.filename
+        basename = os.path.basename(name)
+        if info.is_dir() or name.startswith("__MACOSX/") or basename.startswith("."):
+            continue
+        extension = os.path.splitext(basename)[1].lower()
+        if extension in _NDJSON_EXTENSIONS:
+            with archive.open(info) as member:
+                async for item in _ndjson_items(member):
+                    yield item
+        elif extension in _ZIP_SOURCE_TYPES:
+            yield _ImportItem(source=name, source_type=_ZIP_SOURCE_TYPES[extension], zip_member=info)
+        else:
+            yield _ImportItem(source=name, error="Неподдерживаемый тип файла.")
+
+
+# --- Извлечение и сохранение ---
+
+def _read_member_text(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    if info.file_size > settings.IMPORT_MAX_LINE_BYTES:
+        raise _ImportItemError("Текстовый файл слишком большой.")
+    with archive.open(info) as member:
+        return member.read(settings.IMPORT_MAX_LINE_BYTES).decode("utf-8", errors="replace")
+
+
+def _store_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int) -> StoredFile:
+    # Заявленный размер проверяем сразу, фактический — при копировании (защита от zip-бомб)
+    if info.file_size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+    with archive.open(info) as member:
+        return file_storage.save_fileobj(
+            member, os.path.basename(info.filename), max_bytes=max_bytes, commit=file_references.commit_and_reference
+        )
+
+
+async def _extract_item(item: _ImportItem, archive: Optional[zipfile.ZipFile], folder_ids: set):
+    """Извлекает текст элемента; ошибка записывается в item.error."""
+    if item.error:
+        return
+    try:
+        if item.folder_id is not None and item.folder_id not in folder_ids:
+            raise _ImportItemError(f"Папка с ID {item.folder_id} не найдена.")
+        if item.zip_member is not None and item.source_type == schemas.AddTextSourceType.TEXT:
+            text = await io_executor.run(_read_member_text, archive, item.zip_member)
+            item.blocks = [schemas.TextBlock(text=text)]
+        elif item.zip_member is not None:
+            item.stored_file = await io_executor.run(
+                _store_member, archive, item.zip_member, max_upload_bytes(item.source_type.value)
+            )
+            item.blocks = await extract_blocks_from_stored_file(item.source_type, item.stored_file) or []
+        elif item.source_type in _FILE_SOURCE_TYPES:
+            raise _ImportItemError("Файлы импортируются только в составе zip-архива.")
+        else:
+            item.blocks = await extract_blocks_from_data(item.source_type, item.data) or []
+        if not item.text.strip():
+            raise _ImportItemError(f"Не удалось извлечь текст из источника типа '{item.source_type.value}'.")
+    except (_ImportItemError, UploadTooLargeError) as e:
+        item.error = str(e)
+    except Exception as e:
+        print(f"Import of {item.source} failed: {e}")
+        item.error = f"Ошибка обработки: {e}"
+
+
+def _note_for_item(item: _ImportItem) -> schemas.NoteCreate:
+    note_type = models.NoteType(item.source_type.value)
+    filename = os.path.basename(item.zip_member.filename) if item.zip_member is not None else None
+    if item.stored_file:
+        source_uri = file_storage.get_file_url(item.stored_file.path)
+    elif note_type in (models.NoteType.LINK, models.NoteType.YOUTUBE):
+        source_uri = item.data
+    else:
+        source_uri = None
+    return schemas.NoteCreate(
+        title=item.title or default_note_title(note_type, data=item.data, filename=filename),
+        type=note_type,
+        content=[block.model_dump() for block in item.blocks],
+        source_uri=source_uri,
+        folder_id=item.folder_id,
+    )
+
+
+async def _process_batch(db, user_id: int, batch: List[_ImportItem], archive, folder_ids: set) -> List[dict]:
+    """
+    Обрабатывает пакет: извлечение параллельно (не больше IMPORT_CONCURRENCY одновременно),
+    затем один INSERT на все заметки пакета и одна векторизация на все их чанки.
+    """
+    semaphore = asyncio.Semaphore(settings.IMPORT_CONCURRENCY)
+
+    async def _extract(item: _ImportItem):
+        async with semaphore:
+            await _extract_item(item, archive, folder_ids)
+
+    await asyncio.gather(*(_extract(item) for item in batch))
+
+    ready = [item for item in batch if not item.error]
+    note_ids = {}
+    if ready:
+        notes = [_note_for_item(item) for item in ready]
+        file_refs = [
+            [schemas.FileReference(sha256=item.stored_file.sha256, path=item.stored_file.path, size=item.stored_file.size)]
+            if item.stored_file else []
+            for item in ready
+        ]
+        try:
+            created_ids = await run_in_threadpool(crud.create_notes_bulk, db, notes, user_id, file_refs)
+        except Exception as e:
+            print(f"Import batch insert failed: {e}")
+            await run_in_threadpool(db.rollback)
+            for item in ready:
+                item.error = "Не удалось сохранить заметку."
+        else:
+            note_ids = {item.index: note_id for item, note_id in zip(ready, created_ids)}
+            entries = [
+                (note_ids[item.index], user_id, item.text, item.stored_file.sha256 if item.stored_file else None)
+                for item in ready
+            ]
+            try:
+                await embedding_executor.run(index_notes_batch, entries)
+            except Exception as e:
+                # Заметки уже сохранены; без векторов они не находятся поиском, но доступны
+                print(f"Import batch indexing failed: {e}")
+                metrics.inc("import.index_failures")
+
+    # Созданные заметки держат свои ссылки на файлы, ссылки на время извлечения больше не нужны
+    await release_stored_files(item.stored_file for item in batch)
+
+    events = []
+    for item in batch:
+        if item.index in note_ids:
+            events.append({"event": "item", "index": item.index, "source": item.source, "status": "created", "note_id": note_ids[item.index]})
+        else:
+            events.append({"event": "item", "index": item.index, "source": item.source, "status": "failed", "error": item.error})
+    metrics.inc("import.notes_created", len(note_ids))
+    metrics.inc("import.items_failed", len(batch) - len(note_ids))
+    return events
+
+
+async def _run_import(user_id: int, input_path: str, is_zip: bool) -> AsyncIterator[bytes]:
+    """
+    Выполняет импорт и отдает отчет в NDJSON: строка на каждый элемент,
+    строка прогресса после каждого пакета и итоговая строка "done".
+    Сессия БД своя: импорт продолжается после того, как обработчик запроса вернул ответ.
+    """
+    started = time.perf_counter()
+    processed = created = 0
+    db = SessionLocal()
+    source = open(input_path, "rb")
+    archive = None
+    try:
+        if is_zip:
+            try:
+                archive = await io_executor.run(zipfile.ZipFile, source)
+            except zipfile.BadZipFile:
+                yield ndjson_line({"event": "error", "error": "Файл не является zip-архивом."})
+                return
+            items = _zip_items(archive)
+        else:
+            items = _ndjson_items(source)
+
+        folders = await run_in_threadpool(crud.get_all_folders_by_user, db, user_id=user_id)
+        folder_ids = {folder.id for folder in folders}
+
+        def _progress(event: str) -> dict:
+            elapsed = time.perf_counter() - started
+            return {
+                "event": event, "processed": processed, "created": created, "failed": processed - created,
+                "elapsed_seconds": round(elapsed, 3),
+                "notes_per_second": round(created / elapsed, 2) if elapsed > 0 else 0.0,
+            }
+
+        batch: List[_ImportItem] = []
+        index = 0
+        truncated = False
+        async for item in items:
+            if index >= settings.IMPORT_MAX_ITEMS:
+                truncated = True
+                break
+            item.index = index
+            index += 1
+            batch.append(item)
+            if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                for event in await _process_batch(db, user_id, batch, archive, folder_ids):
+                    created += event["status"] == "created"
+                    yield ndjson_line(event)
+                processed += len(batch)
+                batch = []
+                yield ndjson_line(_progress("progress"))
+        if batch:
+            for event in await _process_batch(db, user_id, batch, archive, folder_ids):
+                created += event["status"] == "created"
+                yield ndjson_line(event)
+            processed += len(batch)
+
+        if truncated:
+            yield ndjson_line({"event": "error", "error": f"Импортированы только первые {settings.IMPORT_MAX_ITEMS} элементов."})
+        yield ndjson_line(_progress("done"))
+    finally:
+        if archive is not None:
+            archive.close()
+        source.close()
+        os.remove(input_path)
+        db.close()
+
+
+@router.post("/ndjson")
+async def import_ndjson(request: Request, current_user: models.User = Depends(get_current_user)):
+    """
+    Массовый импорт из NDJSON (тело запроса — строки вида
+    {"type": "link", "data": "https://...", "title": "...", "folder_id": 1}).
+    Поддерживаются типы text, link и youtube; файлы импортируются через /import/zip.
+
+    Ответ — поток NDJSON: результат по каждой строке (created / failed) и прогресс
+    с текущей скоростью в заметках в секунду.
+    """
+    input_path = await _spool_to_temp(request.stream(), ".ndjson")
+    return StreamingResponse(_run_import(current_user.id, input_path, is_zip=False), media_type="application/x-ndjson")
+
+
+@router.post("/zip")
+async def import_zip(file: UploadFile = File(...), current_user: models.User = Depends(get_current_user)):
+    """
+    Массовый импорт из zip-архива: PDF, DOCX, аудио, фото, .txt/.md становятся
+    отдельными заметками, а .ndjson внутри архива — списками ссылок и текстов
+    (в формате /import/ndjson). Ответ — такой же поток NDJSON с результатами.
+    """
+    try:
+        input_path = await _spool_to_temp(_upload_chunks(file), ".zip")
+    finally:
+        await file.close()
+    return StreamingResponse(_run_import(current_user.id, input_path, is_zip=True), media_type="application/x-ndjson")
@@ -1,82 +1,327 @@
 # file: api/notes.py
 
+import asyncio
+import base64
+from datetime import datetime
 from fastapi import (APIRouter, Depends, HTTPException, status,
-                     UploadFile, File, Form, Query, Response)
-from sqlalchemy.orm import Session
-from typing import List, Optional
+                     UploadFile, File, Form, Query, Request, Response)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
 
 # Импортируем все зависимости
 from db import crud, schemas, models
 from db.database import get_db
 from api.auth_dependency import get_current_user
-from services import content_processor, ai_processor
-from services.storage import file_storage
-from services.vector_store import vector_store
+from api.db_routing import get_read_db
+from api.conditional import etag_matches, not_modified, set_etag, weak_etag
+from api.responses import FastJSONResponse, ai_content_to_dict, note_to_dict, notes_response
+from core import text_stats
+from core.executors import io_executor, parsing_executor, embedding_executor
+from core.singleflight import SingleFlight
+from core.config import settings
+from services import content_processor, ai_processor, youtube_helper, ocr
+from services.http_fetcher import normalize_url
+from services.storage import file_storage, StoredFile, UploadTooLargeError, max_upload_bytes
+from services.file_references import file_references
+from services.extraction_cache import extraction_cache
+from services.vector_store import vector_store, EMBEDDING_MODEL_NAME
 from services import url_reader_helper
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
 # --- Внутренние функции-помощники ---
 
-def _extract_text_from_source(
+# Блок содержимого заметки: обычный текст или фрагмент транскрипции с временем
+ContentBlock = Union[schemas.TextBlock, schemas.TranscriptBlock]
+
+
+def _blocks_text(blocks: List[ContentBlock]) -> str:
+    return text_stats.plain_text(block.text for block in blocks)
+
+
+@dataclass
+class _ExtractedSource:
+    """Результат извлечения: блоки текста и, для файловых источников, сохраненный файл."""
+    blocks: List[ContentBlock]
+    stored_file: Optional[StoredFile] = None
+
+    @property
+    def text(self) -> str:
+        return _blocks_text(self.blocks)
+
+
+# Одновременные извлечения одного и того же источника (вирусная ссылка, видео,
+# одинаковый файл) выполняются один раз, а результат делится между запросами.
+# Заметку при этом каждый пользователь получает свою.
+_extraction_flights = SingleFlight("extraction")
+
+
+def _source_identity(source_type: schemas.AddTextSourceType, data: str) -> str:
+    """Ключ источника для объединения одинаковых извлечений."""
+    if source_type == schemas.AddTextSourceType.LINK:
+        return f"link:{normalize_url(data)}"
+    if source_type == schemas.AddTextSourceType.YOUTUBE:
+        video_id = youtube_helper.extract_video_id(data)
+        return f"youtube:{video_id or data.strip()}"
+    return f"{source_type.value}:{data}"
+
+
+async def _extract_from_data(source_type: schemas.AddTextSourceType, data: str) -> Optional[List[ContentBlock]]:
+    if source_type == schemas.AddTextSourceType.YOUTUBE:
+        transcript = await content_processor.get_transcript_from_youtube(data)
+        return [schemas.TranscriptBlock(**block) for block in transcript] if transcript else None
+    if source_type == schemas.AddTextSourceType.LINK:
+        text = await url_reader_helper.get_text_from_url(data)
+    else:
+        text = data
+    return [schemas.TextBlock(text=text)] if text else None
+
+
+async def _extract_from_file(source_type: schemas.AddTextSourceType, file_path: str) -> Optional[List[schemas.TextBlock]]:
+    if source_type == schemas.AddTextSourceType.PDF:
+        pages = await parsing_executor.run(content_processor.get_pages_from_pdf, file_path)
+        if not pages:
+            return None
+        return [schemas.TextBlock(text=text, page=number) for number, text in pages]
+    if source_type == schemas.AddTextSourceType.DOCX:
+        text = await parsing_executor.run(content_processor.get_text_from_docx, file_path)
+    elif source_type == schemas.AddTextSourceType.PHOTO:
+        text = await parsing_executor.run(ocr.recognize_image_file, file_path)
+    else:
+        text = await ai_processor.transcribe_audio_with_whisper(file_path)
+    return [schemas.TextBlock(text=text)] if text else None
+
+
+# Способ извлечения для ключа кэша: аудио и запись с микрофона транскрибируются одинаково.
+# PDF хранится постранично, поэтому у него свой ключ, не пересекающийся со старыми записями.
+_EXTRACTION_KIND = {
+    schemas.AddTextSourceType.PDF: "pdf_pages",
+    schemas.AddTextSourceType.DOCX: "docx",
+    schemas.AddTextSourceType.AUDIO: "transcript",
+    schemas.AddTextSourceType.RECORD: "transcript",
+}
+
+
+def _extraction_kind(source_type: schemas.AddTextSourceType) -> str:
+    if source_type == schemas.AddTextSourceType.PHOTO:
+        # Результаты разных OCR-движков (в том числе заглушки) не должны смешиваться
+        return f"ocr_{settings.OCR_BACKEND.lower()}"
+    return _EXTRACTION_KIND[source_type]
+
+
+async def _extract_from_file_cached(source_type: schemas.AddTextSourceType, stored: StoredFile) -> Optional[List[schemas.TextBlock]]:
+    """Извлекает текст из файла, переиспользуя результат для того же содержимого."""
+    kind = _extraction_kind(source_type)
+    cached_blocks = await io_executor.run(extraction_cache.get_blocks, stored.sha256, kind)
+    if cached_blocks is not None:
+        return [schemas.TextBlock(**block) for block in cached_blocks]
+
+    blocks = await _extract_from_file(source_type, stored.path)
+    if blocks and _blocks_text(blocks).strip() and not ai_processor.is_transcription_error(blocks[0].text):
+        await io_executor.run(
+            extraction_cache.put_blocks, stored.sha256, kind,
+            [block.model_dump(exclude_none=True) for block in blocks]
+        )
+    return blocks
+
+
+def _index_note(note_id: int, user_id: int, text_content: str, content_sha256: Optional[str] = None):
+    """
+    Векторизует заметку (выполняется в пуле embedding).
+    Для заметок из файлов эмбеддинги берутся из кэша по хэшу файла или сохраняются в него.
+    """
+    precomputed = None
+    if content_sha256:
+        precomputed = extraction_cache.get_embeddings(content_sha256, EMBEDDING_MODEL_NAME)
+    if precomputed is None:
+        precomputed = vector_store.embed_text(text_content)
+        if content_sha256:
+            extraction_cache.put_embeddings(content_sha256, EMBEDDING_MODEL_NAME, *precomputed)
+    vector_store.upsert_note_chunks(
+        note_id=note_id, user_id=user_id, text_content=text_content, precomputed=precomputed
+    )
+
+
+def index_notes_batch(entries: List[tuple]):
+    """
+    Векторизует сразу много новых заметок (выполняется в пуле embedding).
+    entries — список (note_id, user_id, текст, sha256 файла или None). Чанки всех заметок,
+    которых нет в кэше эмбеддингов, кодируются одним вызовом модели и сохраняются
+    в векторную базу одним запросом.
+    """
+    precomputed = [
+        extraction_cache.get_embeddings(content_sha256, EMBEDDING_MODEL_NAME) if content_sha256 else None
+        for _, _, _, content_sha256 in entries
+    ]
+    missing = [i for i, cached in enumerate(precomputed) if cached is None]
+    for i, computed in zip(missing, vector_store.embed_texts([entries[i][2] for i in missing])):
+        precomputed[i] = computed
+        if entries[i][3]:
+            extraction_cache.put_embeddings(entries[i][3], EMBEDDING_MODEL_NAME, *computed)
+    vector_store.add_notes_chunks([
+        (note_id, user_id, chunks, embeddings)
+        for (note_id, user_id, _, _), (chunks, embeddings) in zip(entries, precomputed)
+    ])
+
+
+def reindex_notes_batch(entries: List[tuple]):
+    """
+    Заново векторизует существующие заметки (выполняется в пуле embedding).
+    entries — список (note_id, user_id, текст). Новые эмбеддинги считаются одним
+    вызовом модели до удаления старых чанков, поэтому при ошибке модели индекс не пустеет;
+    старые чанки всех заметок удаляются одним запросом.
+    """
+    embedded = vector_store.embed_texts([text_content for _, _, text_content in entries])
+    vector_store.delete_notes([note_id for note_id, _, _ in entries])
+    vector_store.add_notes_chunks([
+        (note_id, user_id, chunks, embeddings)
+        for (note_id, user_id, _), (chunks, embeddings) in zip(entries, embedded)
+    ])
+
+
+async def extract_blocks_from_data(source_type: schemas.AddTextSourceType, data: str) -> Optional[List[ContentBlock]]:
+    """Извлекает текст из текста, ссылки или YouTube (одинаковые одновременные запросы объединяются)."""
+    if source_type == schemas.AddTextSourceType.TEXT:
+        return [schemas.TextBlock(text=data)]
+    return await _extraction_flights.do(
+        _source_identity(source_type, data),
+        lambda: _extract_from_data(source_type, data),
+    )
+
+
+async def extract_blocks_from_stored_file(source_type: schemas.AddTextSourceType, stored: StoredFile) -> Optional[List[schemas.TextBlock]]:
+    """Извлекает текст из уже сохраненного файла (с объединением одинаковых запросов и кэшем)."""
+    return await _extraction_flights.do(
+        f"file:{_extraction_kind(source_type)}:{stored.sha256}",
+        lambda: _extract_from_file_cached(source_type, stored),
+    )
+
+
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_background_extractions: set = set()
+
+
+def start_extraction_in_background(source_type: schemas.AddTextSourceType, stored: StoredFile):
+    """
+    Запускает извлечение текста, не дожидаясь результата. Используется, когда файл
+    уже получен, а заметка будет создана следующим запросом: к этому моменту
+    результат будет готов (или его можно будет дождаться через single-flight).
+    """
+    async def _run():
+        try:
+            await extract_blocks_from_stored_file(source_type, stored)
+        except Exception as e:
+            print(f"Background extraction failed for {stored.path}: {e}")
+
+    task = asyncio.ensure_future(_run())
+    _background_extractions.add(task)
+    task.add_done_callback(_background_extractions.discard)
+
+
+async def release_stored_files(stored_files):
+    """
+    Снимает ссылки запроса на сохраненные файлы (None пропускаются); файлы, которые
+    больше никому не нужны, удаляются. Ошибка только логируется: ссылка останется,
+    и файл не удалится, но и исходная ошибка запроса не потеряется.
+    """
+    stored_files = [stored for stored in stored_files if stored is not None]
+    if not stored_files:
+        return
+    try:
+        await io_executor.run(file_references.release, stored_files)
+    except Exception as e:
+        print(f"Failed to release stored files {[stored.path for stored in stored_files]}: {e}")
+
+
+async def _extract_text_from_source(
     source_type: schemas.AddTextSourceType,
     data: Optional[str] = None,
     file: Optional[UploadFile] = None
-) -> str:
-    """Извлекает текст из различных источников (текст, ссылка, файл)."""
-    extracted_text = ""
+) -> _ExtractedSource:
+    """
+    Извлекает текст из различных источников (текст, ссылка, файл).
+    Сетевые вызовы выполняются асинхронно, а разбор файлов уходит
+    в отдельные пулы (core.executors), чтобы не блокировать event loop.
+
+    На сохраненный файл берется ссылка: вызывающий снимает ее через
+    release_stored_files, когда файл больше не нужен (заметка держит свою).
+    При ошибке извлечения ссылка снимается здесь же.
+    """
+    blocks: List[ContentBlock] = []
+    stored = None
     
     # --- Блок для источников, использующих 'data' (текст/ссылка) ---
     if source_type in [schemas.AddTextSourceType.TEXT, schemas.AddTextSourceType.LINK, schemas.AddTextSourceType.YOUTUBE]:
         if not data:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "Для этого типа источника необходимо поле 'data'.")
-        if source_type == schemas.AddTextSourceType.TEXT:
-            extracted_text = data
-        elif source_type == schemas.AddTextSourceType.LINK:
-            extracted_text = url_reader_helper.get_text_from_url(data)
-        elif source_type == schemas.AddTextSourceType.YOUTUBE:
-            extracted_text = content_processor.get_text_from_youtube(data)
+        blocks = await extract_blocks_from_data(source_type, data) or []
 
     # --- Блок для источников, использующих 'file' ---
-    elif source_type in [schemas.AddTextSourceType.PDF, schemas.AddTextSourceType.DOCX, schemas.AddTextSourceType.AUDIO, schemas.AddTextSourceType.RECORD]:
+    elif source_type in [schemas.AddTextSourceType.PDF, schemas.AddTextSourceType.DOCX, schemas.AddTextSourceType.AUDIO, schemas.AddTextSourceType.RECORD, schemas.AddTextSourceType.PHOTO]:
         # 👇 ИЗМЕНЕНИЕ ЗДЕСЬ: Проверяем не только 'file', но и 'file.filename'
         if not file or not file.filename:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "Для этого типа источника необходимо прикрепить файл.")
         
-        file_path = file_storage.save_file(file)
-        if source_type == schemas.AddTextSourceType.PDF:
-            extracted_text = content_processor.get_text_from_pdf(file_path)
-        elif source_type == schemas.AddTextSourceType.DOCX:
-            extracted_text = content_processor.get_text_from_docx(file_path)
-        elif source_type in [schemas.AddTextSourceType.AUDIO, schemas.AddTextSourceType.RECORD]:
-            extracted_text = ai_processor.transcribe_audio_with_whisper(file_path)
-
-    if not extracted_text or not extracted_text.strip():
+        try:
+            stored = await file_storage.save_upload(
+                file, max_bytes=max_upload_bytes(source_type.value), commit=file_references.commit_and_reference
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, str(e))
+        try:
+            blocks = await extract_blocks_from_stored_file(source_type, stored) or []
+        except BaseException:
+            await release_stored_files([stored])
+            raise
+
+    if not _blocks_text(blocks).strip():
+        await release_stored_files([stored])
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Не удалось извлечь текст из источника типа '{source_type.value}'.")
         
-    return extracted_text
+    return _ExtractedSource(blocks=blocks, stored_file=stored)
 
 
-def _create_and_save_note(
+def default_note_title(source_type: models.NoteType, data: Optional[str] = None, filename: Optional[str] = None) -> str:
+    """Название заметки по умолчанию: по началу текста, по ссылке или по имени файла."""
+    if filename:
+        return f"Заметка из файла: {filename}"
+    title_map = {
+        models.NoteType.TEXT: f"Текстовая заметка: {data[:30]}...",
+        models.NoteType.LINK: f"Заметка с веб-страницы: {data[:40]}...",
+        models.NoteType.YOUTUBE: f"Заметка из YouTube: {data[:40]}...",
+    }
+    return title_map.get(source_type)
+
+async def _create_and_save_note(
     db: Session, user: models.User, title: str, source_type: models.NoteType,
-    structured_content: list, text_for_vector: str, source_uri: Optional[str] = None
+    structured_content: list, text_for_vector: str, source_uri: Optional[str] = None,
+    stored_files: Optional[List[StoredFile]] = None
 ) -> models.Note:
     """Внутренняя функция, которая создает, сохраняет и векторизует заметку."""
     note_to_create = schemas.NoteCreate(
         title=title, type=source_type, content=[item.model_dump() for item in structured_content],
         source_uri=source_uri
     )
-    db_note = crud.create_note(db, note=note_to_create, user_id=user.id)
+    stored_files = stored_files or []
+    file_refs = [
+        schemas.FileReference(sha256=stored.sha256, path=stored.path, size=stored.size)
+        for stored in stored_files
+    ]
+    db_note = await run_in_threadpool(crud.create_note, db, note=note_to_create, user_id=user.id, file_refs=file_refs)
     if text_for_vector:
-        vector_store.upsert_note_chunks(
-            note_id=db_note.id, user_id=user.id, text_content=text_for_vector
+        # Эмбеддинги кэшируются по хэшу файла, только если текст заметки целиком взят из одного файла
+        await embedding_executor.run(
+            _index_note, db_note.id, user.id, text_for_vector,
+            stored_files[0].sha256 if len(stored_files) == 1 else None
         )
     return db_note
 
 # --- ЭНДПОИНТЫ CRUD ---
 
 @router.post("/new/from_data", response_model=schemas.Note, status_code=status.HTTP_201_CREATED)
-def create_note_from_data(
+async def create_note_from_data(
     source_type: models.NoteType = Form(...),
     data: str = Form(...),
     db: Session = Depends(get_db),
@@ -84,42 +329,105 @@ def create_note_from_data(
 ):
     """Создает новую заметку из текста, обычной ссылки или YouTube URL."""
     add_text_source_type = schemas.AddTextSourceType(source_type.value)
-    extracted_text = _extract_text_from_source(source_type=add_text_source_type, data=data)
+    extracted = await _extract_text_from_source(source_type=add_text_source_type, data=data)
     
-    title_map = {
-        models.NoteType.TEXT: f"Текстовая заметка: {data[:30]}...",
-        models.NoteType.LINK: f"Заметка с веб-страницы: {data[:40]}...",
-        models.NoteType.YOUTUBE: f"Заметка из YouTube: {data[:40]}...",
-    }
-    title = title_map.get(source_type)
+    title = default_note_title(source_type, data=data)
     source_uri = data if source_type != models.NoteType.TEXT else None
 
-    return _create_and_save_note(
+    return await _create_and_save_note(
         db, current_user, title, source_type, 
-        [schemas.TextBlock(text=extracted_text)], extracted_text, source_uri
+        extracted.blocks, extracted.text, source_uri
+    )
+
+async def create_note_from_stored_file(
+    db: Session, user: models.User, source_type: models.NoteType,
+    stored: StoredFile, filename: str, extracted_blocks: Optional[List[schemas.TextBlock]] = None
+) -> models.Note:
+    """Создает заметку из файла, который уже лежит в хранилище."""
+    if extracted_blocks is None:
+        extracted_blocks = await extract_blocks_from_stored_file(schemas.AddTextSourceType(source_type.value), stored) or []
+    extracted_text = _blocks_text(extracted_blocks)
+    if not extracted_text.strip():
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Не удалось извлечь текст из источника типа '{source_type.value}'.")
+
+    title = default_note_title(source_type, filename=filename)
+    source_uri = file_storage.get_file_url(stored.path)
+
+    return await _create_and_save_note(
+        db, user, title, source_type, 
+        extracted_blocks, extracted_text, source_uri,
+        stored_files=[stored]
     )
 
 @router.post("/new/from_file", response_model=schemas.Note, status_code=status.HTTP_201_CREATED)
-def create_note_from_file(
+async def create_note_from_file(
     source_type: models.NoteType = Form(...), 
     file: UploadFile = File(...),
     db: Session = Depends(get_db), 
     current_user: models.User = Depends(get_current_user)
 ):
-    """Создает новую заметку из загруженного файла (PDF, DOCX, аудио)."""
+    """
+    Создает новую заметку из загруженного файла (PDF, DOCX, аудио).
+    Для больших файлов и нестабильной связи используйте загрузку по частям (/upload-sessions).
+    """
     add_text_source_type = schemas.AddTextSourceType(source_type.value)
-    extracted_text = _extract_text_from_source(source_type=add_text_source_type, file=file)
-    
-    title = f"Заметка из файла: {file.filename}"
-    source_uri = file_storage.get_file_url(file_storage.get_path_from_filename(file.filename))
+    extracted = await _extract_text_from_source(source_type=add_text_source_type, file=file)
 
-    return _create_and_save_note(
-        db, current_user, title, source_type, 
-        [schemas.TextBlock(text=extracted_text)], extracted_text, source_uri
-    )
+    try:
+        return await create_note_from_stored_file(
+            db, current_user, source_type, extracted.stored_file, file.filename,
+            extracted_blocks=extracted.blocks
+        )
+    finally:
+        await release_stored_files([extracted.stored_file])
+
+@router.post("/new/from_photos", response_model=schemas.Note, status_code=status.HTTP_201_CREATED)
+async def create_note_from_photos(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Создает заметку из одной или нескольких фотографий (конспект, доска, страницы книги).
+    Фото распознаются параллельно; каждое становится отдельным блоком заметки
+    в порядке загрузки. Повторно присланное фото не распознается заново.
+    """
+    files = [file for file in files if file.filename]
+    if not files:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Необходимо прикрепить хотя бы одно фото.")
+    if len(files) > settings.MAX_PHOTOS_PER_NOTE:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Можно прикрепить не больше {settings.MAX_PHOTOS_PER_NOTE} фото.")
+
+    results = await asyncio.gather(*(
+        _extract_text_from_source(source_type=schemas.AddTextSourceType.PHOTO, file=file)
+        for file in files
+    ), return_exceptions=True)
+    # Если хоть одно фото не распозналось, ссылки на уже сохраненные остальные снимаются
+    failure = next((result for result in results if isinstance(result, BaseException)), None)
+    if failure is not None:
+        await release_stored_files(result.stored_file for result in results if not isinstance(result, BaseException))
+        raise failure
+    extracted: List[_ExtractedSource] = results
+
+    blocks = []
+    for file, photo in zip(files, extracted):
+        blocks.extend(block.model_copy(update={"sub_header": file.filename}) for block in photo.blocks)
+    title = f"Заметка из фото: {files[0].filename}"
+    if len(files) > 1:
+        title += f" и еще {len(files) - 1}"
+    stored_files = [photo.stored_file for photo in extracted]
+
+    try:
+        return await _create_and_save_note(
+            db, current_user, title, models.NoteType.PHOTO,
+            blocks, _blocks_text(blocks), file_storage.get_file_url(stored_files[0].path),
+            stored_files=stored_files
+        )
+    finally:
+        await release_stored_files(stored_files)
 
-@router.post("/{note_id}/add-text", response_model=schemas.Note)
-def add_text_to_note(
+@router.post("/{note_id}/add-text", response_model=schemas.NoteAppendResult)
+async def add_text_to_note(
     note_id: int,
     source_type: schemas.AddTextSourceType = Form(...),
     data: Optional[str] = Form(None),
@@ -127,32 +435,102 @@ def add_text_to_note(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Добавляет новый текстовый блок в существующую заметку из источника."""
-    db_note = crud.get_note_by_id(db, note_id=note_id, user_id=current_user.id)
+    """
+    Добавляет новый текстовый блок в существующую заметку из источника.
+    В ответе только добавленные блоки с позициями (start_position и дальше) —
+    стоимость не зависит от размера заметки. Остальные блоки читаются
+    через GET /notes/{note_id}/blocks.
+    """
+    db_note = await run_in_threadpool(crud.get_note_by_id, db, note_id=note_id, user_id=current_user.id)
     if not db_note:
         raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
 
-    extracted_text = _extract_text_from_source(source_type=source_type, data=data, file=file)
-    new_text_block = schemas.TextBlock(
-        header=f"Добавлено из '{source_type.value}'",
-        text=extracted_text
+    extracted = await _extract_text_from_source(source_type=source_type, data=data, file=file)
+    # Файл к заметке не прикрепляется: после извлечения текста ссылка на него не нужна
+    await release_stored_files([extracted.stored_file])
+    # Список блоков может быть общим с параллельными запросами (single-flight) — не меняем его на месте
+    header = f"Добавлено из '{source_type.value}'"
+    if isinstance(extracted.blocks[0], schemas.TextBlock):
+        new_blocks = [extracted.blocks[0].model_copy(update={"header": header}), *extracted.blocks[1:]]
+    else:
+        # У фрагментов транскрипции нет заголовка — добавляем его отдельным блоком
+        new_blocks = [schemas.TextBlock(header=header, text=""), *extracted.blocks]
+
+    start_position, block_count, updated_at = await run_in_threadpool(
+        crud.append_text_blocks_to_note, db, db_note=db_note, text_blocks=new_blocks
+    )
+    # Векторизуем только добавленный текст: стоимость не зависит от размера заметки
+    await embedding_executor.run(
+        vector_store.append_note_chunks,
+        note_id=note_id, user_id=current_user.id,
+        text_content=_blocks_text(new_blocks), chunk_prefix=f"b{start_position}"
     )
 
-    updated_note = crud.append_text_block_to_note(db, db_note=db_note, text_block=new_text_block)
-    
-    full_text_content = " ".join([block.get("text", "") for block in updated_note.content if isinstance(block, dict)])
-    vector_store.delete_note(note_id=note_id)
-    vector_store.upsert_note_chunks(
-        note_id=note_id, user_id=current_user.id, text_content=full_text_content
+    return schemas.NoteAppendResult(
+        note_id=note_id,
+        start_position=start_position,
+        block_count=block_count,
+        updated_at=updated_at,
+        items=[
+            schemas.NoteBlockOut(
+                position=start_position + offset,
+                kind="transcript" if isinstance(block, schemas.TranscriptBlock) else "text",
+                **block.model_dump(),
+            )
+            for offset, block in enumerate(new_blocks)
+        ],
     )
-    
-    return updated_note
 
 
-@router.get("/", response_model=List[schemas.Note])
-def get_all_user_notes(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Возвращает список всех заметок текущего пользователя."""
-    return crud.get_all_notes_by_user(db=db, user_id=current_user.id)
+def _encode_cursor(updated_at: datetime, note_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{note_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, note_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(note_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Некорректный курсор.")
+
+@router.get("/", response_model=schemas.NoteListPage)
+def get_all_user_notes(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="Сколько заметок вернуть"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    folder_id: Optional[int] = Query(None, description="Только заметки из этой папки"),
+    type: Optional[models.NoteType] = Query(None, description="Только заметки этого типа"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Возвращает страницу заметок текущего пользователя, от недавно измененных к старым.
+    В списке нет содержимого заметок — полную заметку отдает GET /notes/{note_id}.
+
+    Ответ помечается ETag; если данные пользователя не менялись, на запрос
+    с If-None-Match приходит 304 без тела.
+    """
+    content_version = crud.get_user_content_version(db, user_id=current_user.id)
+    etag = weak_etag("notes", current_user.id, content_version, request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    after = _decode_cursor(cursor) if cursor else None
+    rows = crud.list_note_summaries(
+        db, user_id=current_user.id, limit=limit + 1, after=after, folder_id=folder_id, note_type=type
+    )
+    # Лишняя строка показывает, есть ли следующая страница
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return schemas.NoteListPage(
+        items=[schemas.NoteSummary.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
 
 @router.put("/{note_id}", response_model=schemas.Note)
 def update_note(
@@ -178,19 +556,84 @@ def delete_note(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Удаляет заметку, а также все связанные с ней векторные данные."""
-    vector_store.delete_note(note_id=note_id)
-    deleted_note = crud.delete_note_by_id(db, note_id=note_id, user_id=current_user.id)
-    if not deleted_note:
+    """
+    Помечает заметку удаленной и сразу отвечает. Векторы, AI-контент и файлы,
+    на которые больше не ссылается ни одна заметка, удаляет фоновая очистка (services/purger.py).
+    """
+    deleted = crud.soft_delete_notes(db, note_ids=[note_id], user_id=current_user.id)
+    if not deleted:
         raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+# --- МАССОВЫЕ ОПЕРАЦИИ ---
+
+# Сколько заметок переиндексируется одним вызовом модели
+_REINDEX_BATCH_SIZE = 50
+
+
+def _bulk_result(note_ids: List[int], statuses: dict) -> schemas.BulkResult:
+    """Ответ по каждому запрошенному ID (повторы схлопываются); кого нет в statuses — not_found."""
+    results = [
+        schemas.BulkItemResult(note_id=note_id, status=statuses.get(note_id, "not_found"))
+        for note_id in dict.fromkeys(note_ids)
+    ]
+    succeeded = sum(1 for result in results if result.status == "ok")
+    return schemas.BulkResult(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+@router.post("/bulk/move", response_model=schemas.BulkResult)
+def move_notes_bulk(
+    bulk_in: schemas.BulkMoveNotes,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Переносит много заметок в папку (или убирает из папки при folder_id = null) одним запросом."""
+    if bulk_in.folder_id is not None:
+        folder = crud.get_folder_by_id(db, folder_id=bulk_in.folder_id, user_id=current_user.id)
+        if not folder:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, f"Папка с ID {bulk_in.folder_id} не найдена.")
+    moved = crud.move_notes_bulk(db, note_ids=bulk_in.note_ids, folder_id=bulk_in.folder_id, user_id=current_user.id)
+    return _bulk_result(bulk_in.note_ids, {note_id: "ok" for note_id in moved})
+
+@router.post("/bulk/delete", response_model=schemas.BulkResult)
+def delete_notes_bulk(
+    bulk_in: schemas.BulkNoteIds,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Помечает много заметок удаленными одним запросом. Векторы и файлы
+    удаляет фоновая очистка — пачками, не задерживая ответ.
+    """
+    deleted = crud.soft_delete_notes(db, note_ids=bulk_in.note_ids, user_id=current_user.id)
+    return _bulk_result(bulk_in.note_ids, {note_id: "ok" for note_id in deleted})
+
+@router.post("/bulk/reindex", response_model=schemas.BulkResult)
+async def reindex_notes_bulk(
+    bulk_in: schemas.BulkNoteIds,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Заново строит векторный индекс для заметок (пачками, по одному вызову модели на пачку)."""
+    # Текст собирается из текстов блоков двумя запросами на весь список
+    rows = await run_in_threadpool(crud.get_note_texts, db, note_ids=bulk_in.note_ids, user_id=current_user.id)
+    entries = [(row.id, current_user.id, row.plain_text) for row in rows]
+    statuses = {}
+    for start in range(0, len(entries), _REINDEX_BATCH_SIZE):
+        batch = entries[start:start + _REINDEX_BATCH_SIZE]
+        try:
+            await embedding_executor.run(reindex_notes_batch, batch)
+            statuses.update({note_id: "ok" for note_id, _, _ in batch})
+        except Exception as e:
+            print(f"Failed to reindex notes {[note_id for note_id, _, _ in batch]}: {e}")
+            statuses.update({note_id: "failed" for note_id, _, _ in batch})
+    return _bulk_result(bulk_in.note_ids, statuses)
+
 # --- ЭНДПОИНТ ДЛЯ ПОИСКА ---
 
 @router.get("/search", response_model=List[schemas.Note])
 def find_notes_by_semantic_search(
     q: str = Query(..., min_length=3, description="Поисковый запрос для семантического поиска"),
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+    db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_user)
 ):
     """Выполняет качественный семантический поиск по содержимому заметок."""
     if not q.strip(): return []
@@ -202,7 +645,125 @@ def find_notes_by_semantic_search(
         if res['note_id'] not in ordered_unique_ids:
             ordered_unique_ids.append(res['note_id'])
             
-    notes = db.query(models.Note).filter(models.Note.id.in_(ordered_unique_ids)).all()
+    notes = db.query(models.Note).options(selectinload(models.Note.blocks)).filter(
+        models.Note.id.in_(ordered_unique_ids), models.Note.user_id == current_user.id, crud.NOTE_IS_LIVE
+    ).all()
     notes_map = {note.id: note for note in notes}
     sorted_notes = [notes_map[id] for id in ordered_unique_ids if id in notes_map]
-    return sorted_notes
\ No newline at end of file
+    return notes_response(sorted_notes)
+
+@router.get("/{note_id}", response_model=schemas.NoteDetail)
+def get_note(
+    note_id: int,
+    request: Request,
+    embed: Optional[str] = Query(
+        None, pattern="^ai$", description="ai — добавить последний AI-контент каждого типа (поле ai_content)"
+    ),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Возвращает заметку целиком, вместе с содержимым.
+    ETag строится по updated_at заметки: неизмененная заметка не загружается вовсе (304).
+    """
+    version = crud.get_note_version(db, note_id=note_id, user_id=current_user.id)
+    if not version:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
+    etag_parts = ["note", note_id, *version]
+    if embed:
+        # Новый AI-контент не меняет саму заметку, но меняет счетчик изменений пользователя
+        etag_parts += [embed, crud.get_user_content_version(db, user_id=current_user.id)]
+    etag = weak_etag(*etag_parts)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    db_note = crud.get_note_by_id(db, note_id=note_id, user_id=current_user.id)
+    if not db_note:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
+    payload = note_to_dict(db_note)
+    if embed:
+        latest = crud.get_latest_ai_content(db, note_id=note_id, user_id=current_user.id)
+        payload["ai_content"] = [ai_content_to_dict(db_content) for db_content in latest]
+    fast_response = FastJSONResponse(payload)
+    set_etag(fast_response, etag)
+    return fast_response
+
+@router.get("/{note_id}/blocks", response_model=schemas.NoteBlocksPage)
+def get_note_blocks(
+    note_id: int,
+    start: int = Query(0, ge=0, description="Позиция первого блока"),
+    limit: int = Query(100, ge=1, le=1000, description="Сколько блоков вернуть"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Возвращает блоки заметки диапазоном — для постраничного чтения больших заметок."""
+    db_note = crud.get_note_by_id(db, note_id=note_id, user_id=current_user.id)
+    if not db_note:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
+    blocks = crud.get_note_blocks(db, note_id=note_id, start=start, limit=limit)
+    next_start = blocks[-1].position + 1 if blocks and blocks[-1].position + 1 < db_note.block_count else None
+    return schemas.NoteBlocksPage(
+        items=[schemas.NoteBlockOut.model_validate(block) for block in blocks],
+        total=db_note.block_count,
+        next_start=next_start,
+    )
+
+# --- СОХРАНЕННЫЙ AI-КОНТЕНТ ---
+
+def _ai_content_etag(db: Session, user: models.User, note_id: int, content_type: str) -> str:
+    """
+    ETag AI-контента заметки. Сначала проверяется, что заметка есть, принадлежит
+    пользователю и не удалена (404) — одно обращение по индексу, как в get_note.
+    Любое сохранение AI-контента увеличивает счетчик изменений пользователя, а
+    updated_at заметки меняется и при ее удалении — оба входят в ETag.
+    """
+    version = crud.get_note_version(db, note_id=note_id, user_id=user.id)
+    if not version:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Заметка с ID {note_id} не найдена.")
+    content_version = crud.get_user_content_version(db, user_id=user.id)
+    return weak_etag("ai", note_id, version.updated_at, content_type, content_version)
+
+@router.get("/{note_id}/ai", response_model=List[schemas.AIGeneratedContent])
+def get_note_ai_content(
+    note_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Возвращает последний сохраненный AI-контент каждого типа (summary, flashcards, quiz).
+    Показать уже готовый результат можно без повторного вызова /ai/generate.
+    """
+    etag = _ai_content_etag(db, current_user, note_id, "*")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    latest = crud.get_latest_ai_content(db, note_id=note_id, user_id=current_user.id)
+    fast_response = FastJSONResponse([ai_content_to_dict(db_content) for db_content in latest])
+    set_etag(fast_response, etag)
+    return fast_response
+
+@router.get("/{note_id}/ai/{content_type}", response_model=schemas.AIGeneratedContent)
+def get_note_ai_content_by_type(
+    note_id: int,
+    content_type: schemas.AITaskType,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Возвращает последний сохраненный AI-контент указанного типа."""
+    etag = _ai_content_etag(db, current_user, note_id, content_type.value)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    latest = crud.get_latest_ai_content(
+        db, note_id=note_id, user_id=current_user.id, content_type=content_type.value
+    )
+    if not latest:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Для заметки {note_id} еще нет AI-контента типа '{content_type.value}'."
+        )
+    fast_response = FastJSONResponse(ai_content_to_dict(latest[0]))
+    set_etag(fast_response, etag)
+    return fast_response
+
@@ -0,0 +1,70 @@
+# file: api/responses.py
+
+"""
+Быстрая отдача больших ответов (заметки с полным текстом PDF и транскрипциями).
+
+Вместо пути по умолчанию (проверка ORM-объекта через response_model,
+jsonable_encoder, стандартный json) тяжелые эндпоинты собирают словарь прямо
+из ORM-объекта и сериализуют его orjson. Данные из нашей же БД уже
+соответствуют схеме, поэтому повторная проверка Pydantic не нужна;
+response_model на таких маршрутах остается только для документации.
+"""
+
+import json
+from typing import Any, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from db import models, schemas
+
+try:
+    import orjson
+except ImportError:  # без orjson работает обычная сериализация JSONResponse
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый orjson (datetime и UUID он понимает сам)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def ndjson_line(payload: dict) -> bytes:
+    """Одна строка NDJSON (для потоковых ответов импорта и выгрузки)."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(jsonable_encoder(payload), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def note_to_dict(db_note: models.Note) -> dict:
+    """Заметка в виде schemas.Note, без валидации (блоки уже загружены или подгрузятся одним запросом)."""
+    return {
+        "id": db_note.id,
+        "title": db_note.title,
+        "type": db_note.type.value,
+        "content": db_note.content,
+        "source_uri": db_note.source_uri,
+        "folder_id": db_note.folder_id,
+        "user_id": db_note.user_id,
+        "created_at": db_note.created_at,
+        "updated_at": db_note.updated_at,
+    }
+
+
+def notes_response(db_notes: List[models.Note]) -> FastJSONResponse:
+    return FastJSONResponse([note_to_dict(db_note) for db_note in db_notes])
+
+
+def ai_content_to_dict(db_content: models.AIGeneratedContent) -> dict:
+    """AI-контент в виде schemas.AIGeneratedContent."""
+    return {
+        "id": db_content.id,
+        "note_id": db_content.note_id,
+        "content_type": schemas.AITaskType(db_content.content_type).value,
+        "data": db_content.data,
+        "created_at": db_content.created_at,
+    }
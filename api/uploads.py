@@ -0,0 +1,231 @@
+# file: api/uploads.py
+
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from db import crud, schemas, models
+from db.database import get_db
+from core.config import settings
+from .auth_dependency import get_current_user
+from .notes import create_note_from_stored_file, release_stored_files, start_extraction_in_background
+from services.chunked_uploads import chunked_uploads
+from services.storage import StoredFile, UploadTooLargeError, max_upload_bytes
+
+router = APIRouter(prefix="/upload-sessions", tags=["Uploads"])
+
+# Источники, которые загружаются файлом
+_FILE_SOURCE_TYPES = {
+    schemas.AddTextSourceType.PDF,
+    schemas.AddTextSourceType.DOCX,
+    schemas.AddTextSourceType.AUDIO,
+    schemas.AddTextSourceType.RECORD,
+    schemas.AddTextSourceType.PHOTO,
+}
+
+
+def _to_schema(db_upload: models.UploadSession) -> schemas.UploadSession:
+    received = db_upload.received_bytes
+    if db_upload.status == "active":
+        # Для активной загрузки источник истины — размер временного файла на диске
+        received = chunked_uploads.received_bytes(db_upload.id)
+    return schemas.UploadSession(
+        id=db_upload.id,
+        filename=db_upload.filename,
+        source_type=db_upload.source_type,
+        total_size=db_upload.total_size,
+        received_bytes=received,
+        status=db_upload.status,
+        part_size=settings.UPLOAD_PART_SIZE_BYTES,
+        note_id=db_upload.note_id,
+    )
+
+
+# Статусы, в которых загрузка держит ссылку на файл в хранилище
+_HOLDS_FILE_STATUSES = ("uploaded", "completing")
+
+
+def _stored_file(db_upload: models.UploadSession) -> StoredFile:
+    return StoredFile(path=db_upload.file_path, sha256=db_upload.file_sha256, size=db_upload.total_size)
+
+
+async def _discard_upload_data(db_upload: models.UploadSession):
+    """
+    Удаляет данные незавершенной загрузки: временный файл, а для полностью
+    полученной — снимает ее ссылку на файл в хранилище. Сам файл удаляется, только
+    если его больше никто не держит (заметки, другие загрузки того же содержимого).
+    """
+    await chunked_uploads.discard(db_upload.id)
+    if db_upload.status in _HOLDS_FILE_STATUSES and db_upload.file_sha256:
+        await release_stored_files([_stored_file(db_upload)])
+
+
+async def _cleanup_stale_sessions(db: Session):
+    """Удаляет заброшенные загрузки вместе с их файлами."""
+    stale = await run_in_threadpool(crud.pop_stale_upload_sessions, db, ttl_hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    for db_upload in stale:
+        await _discard_upload_data(db_upload)
+
+
+async def _get_upload_or_404(db: Session, upload_id: str, user: models.User) -> models.UploadSession:
+    db_upload = await run_in_threadpool(crud.get_upload_session, db, upload_id=upload_id, user_id=user.id)
+    if not db_upload:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Загрузка с ID {upload_id} не найдена.")
+    return db_upload
+
+
+@router.post("/", response_model=schemas.UploadSession, status_code=status.HTTP_201_CREATED)
+async def initiate_upload(
+    upload_in: schemas.UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Начинает загрузку файла по частям.
+
+    Дальше клиент отправляет части через PUT /upload-sessions/{id}?offset=N
+    (тело запроса — сырые байты), а в конце вызывает POST /upload-sessions/{id}/complete.
+    После обрыва связи текущее смещение можно узнать через GET /upload-sessions/{id}.
+    """
+    if upload_in.source_type not in _FILE_SOURCE_TYPES:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Загрузка по частям доступна только для файловых источников.")
+    limit = max_upload_bytes(upload_in.source_type.value)
+    if upload_in.total_size > limit:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Файл превышает допустимый размер {limit // (1024 * 1024)} МБ."
+        )
+
+    await _cleanup_stale_sessions(db)
+    db_upload = await run_in_threadpool(
+        crud.create_upload_session, db, upload_id=uuid.uuid4().hex, user_id=current_user.id, upload=upload_in
+    )
+    return _to_schema(db_upload)
+
+
+@router.get("/{upload_id}", response_model=schemas.UploadSession)
+async def get_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Возвращает состояние загрузки; received_bytes — смещение, с которого продолжать."""
+    db_upload = await _get_upload_or_404(db, upload_id, current_user)
+    return _to_schema(db_upload)
+
+
+@router.put("/{upload_id}", response_model=schemas.UploadSession)
+async def upload_part(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Смещение части от начала файла"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Принимает очередную часть файла (тело запроса — сырые байты).
+    Части записываются на диск потоково, поэтому память не зависит от их размера.
+    Как только получен последний байт, файл переносится в хранилище и сразу
+    запускается извлечение текста.
+    """
+    db_upload = await _get_upload_or_404(db, upload_id, current_user)
+
+    async with chunked_uploads.lock(upload_id):
+        # Статус перечитываем под блокировкой: параллельный запрос мог только что дописать файл
+        await run_in_threadpool(db.refresh, db_upload)
+        if db_upload.status != "active":
+            raise HTTPException(status.HTTP_409_CONFLICT, "Файл уже загружен полностью.")
+        received = chunked_uploads.received_bytes(upload_id)
+        if offset != received:
+            raise HTTPException(
+                status.HTTP_409_CONFLICT,
+                f"Неверное смещение {offset}: уже получено {received} байт.",
+                headers={"Upload-Offset": str(received)},
+            )
+        try:
+            received = await chunked_uploads.append(upload_id, request.stream(), db_upload.total_size)
+        except UploadTooLargeError:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Данные выходят за заявленный размер файла.")
+        except ClientDisconnect:
+            # Записанное до обрыва сохранено; клиент продолжит с нового смещения
+            received = chunked_uploads.received_bytes(upload_id)
+
+        fields = {"received_bytes": received}
+        if received == db_upload.total_size:
+            stored = await chunked_uploads.finalize(upload_id, db_upload.filename)
+            fields.update(status="uploaded", file_sha256=stored.sha256, file_path=stored.path)
+            start_extraction_in_background(schemas.AddTextSourceType(db_upload.source_type), stored)
+        db_upload = await run_in_threadpool(crud.update_upload_session, db, db_upload, **fields)
+
+    return _to_schema(db_upload)
+
+
+@router.post("/{upload_id}/complete", response_model=schemas.Note, status_code=status.HTTP_201_CREATED)
+async def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Создает заметку из полностью загруженного файла.
+    Повторный или параллельный вызов получает 409 и не создает вторую заметку.
+    """
+    await _get_upload_or_404(db, upload_id, current_user)
+
+    async with chunked_uploads.lock(upload_id):
+        # Загрузку забирает ровно один запрос: условный UPDATE сработает и при
+        # параллельном вызове в другом процессе, где блокировка выше не действует
+        db_upload = await run_in_threadpool(
+            crud.transition_upload_session, db, upload_id, current_user.id, ("uploaded",), status="completing"
+        )
+        if db_upload is None:
+            db_upload = await _get_upload_or_404(db, upload_id, current_user)
+            if db_upload.status == "active":
+                raise HTTPException(
+                    status.HTTP_409_CONFLICT,
+                    f"Файл загружен не полностью: получено {chunked_uploads.received_bytes(upload_id)} из {db_upload.total_size} байт.",
+                )
+            if db_upload.status == "completed":
+                raise HTTPException(status.HTTP_409_CONFLICT, f"Заметка уже создана (ID {db_upload.note_id}).")
+            raise HTTPException(status.HTTP_409_CONFLICT, "Заметка по этой загрузке уже создается.")
+
+        try:
+            db_note = await create_note_from_stored_file(
+                db, current_user, models.NoteType(db_upload.source_type), _stored_file(db_upload), db_upload.filename
+            )
+        except BaseException:
+            # Возвращаем загрузку, чтобы завершение можно было повторить
+            await run_in_threadpool(db.rollback)
+            await run_in_threadpool(
+                crud.transition_upload_session, db, upload_id, current_user.id, ("completing",), status="uploaded"
+            )
+            raise
+        await run_in_threadpool(crud.update_upload_session, db, db_upload, status="completed", note_id=db_note.id)
+    chunked_uploads.forget(upload_id)
+
+    # Заметка держит свою ссылку на файл — ссылка загрузки больше не нужна
+    await release_stored_files([_stored_file(db_upload)])
+    return db_note
+
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Отменяет незавершенную загрузку и удаляет полученные части."""
+    await _get_upload_or_404(db, upload_id, current_user)
+    async with chunked_uploads.lock(upload_id):
+        # Удаляется только загрузка, по которой не создается и не создана заметка:
+        # идущий complete сменил статус на completing, и файл у него не пропадет
+        removed = await run_in_threadpool(
+            crud.delete_upload_session, db, upload_id, current_user.id, ("active", "uploaded")
+        )
+        if removed is None:
+            raise HTTPException(status.HTTP_409_CONFLICT, "Загрузка уже завершена.")
+        await _discard_upload_data(removed)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
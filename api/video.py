@@ -56,17 +56,15 @@ def create_video_from_note(
         )
 
     # 2. Находим заметку в БД и проверяем, что она принадлежит пользователю
-    note = crud.get_note_by_id(db, note_id=video_request.note_id, user_id=current_user.id)
+    note = crud.get_note_text(db, note_id=video_request.note_id, user_id=current_user.id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Note with id {video_request.note_id} not found."
         )
 
-    # 3. Собираем весь текст из контента заметки
-    full_text = ""
-    if note.content and isinstance(note.content, list):
-        full_text = " ".join([block.get("text", "") for block in note.content])
+    # 3. Берем текст заметки, собранный из ее блоков
+    full_text = note.plain_text
 
     if not full_text.strip():
         raise HTTPException(
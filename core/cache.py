@@ -0,0 +1,91 @@
+# file: core/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from .metrics import metrics
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением по количеству записей, по суммарному
+    размеру и по времени жизни записи.
+
+    Попадания, промахи и вытеснения пишутся в метрики под префиксом cache.<name>.
+    """
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl_seconds: float,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        metrics.register_gauge(f"cache.{name}.entries", lambda: len(self._data))
+        if max_bytes is not None:
+            metrics.register_gauge(f"cache.{name}.bytes", lambda: self._bytes)
+
+    def get(self, key: Hashable) -> Any:
+        """Возвращает значение или None, если записи нет или она устарела."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                metrics.inc(f"cache.{self.name}.misses")
+                return None
+            expires_at, _, value = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                metrics.inc(f"cache.{self.name}.misses")
+                metrics.inc(f"cache.{self.name}.expired")
+                return None
+            self._data.move_to_end(key)
+            metrics.inc(f"cache.{self.name}.hits")
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Кладет значение в кэш, вытесняя самые старые записи при переполнении."""
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.maxsize
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                metrics.inc(f"cache.{self.name}.evictions")
+
+    def pop(self, key: Hashable):
+        """Удаляет запись, если она есть."""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
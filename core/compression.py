@@ -0,0 +1,121 @@
+# file: core/compression.py
+
+import gzip
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него сжимаем только gzip
+    brotli = None
+
+# Сжимаем только текстовые ответы; картинки, видео и архивы уже сжаты
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript", "image/svg+xml")
+# Тела больше этого размера сжимаются в пуле потоков, чтобы не задерживать event loop
+_THREAD_MIN_BYTES = 256 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Выбирает кодировку по Accept-Encoding с учетом q-значений: br предпочтительнее gzip."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for name in supported:
+        if weights.get(name, wildcard) > 0:
+            return name
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip или brotli (по Accept-Encoding) начиная с minimum_size байт.
+
+    Сжимается только ответ, отданный одним куском. Потоковые ответы
+    (StreamingResponse, файлы) проходят как есть: буферизация задержала бы
+    построчный отчет импорта, а файлы раздаются без копирования в память.
+    Сжатые байты и их доля видны в /metrics как compression.<encoding>.*.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            compressible = self._compressible_type(start_message["status"], headers)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body", False) or not compressible or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= _THREAD_MIN_BYTES:
+                compressed = await run_in_threadpool(self._compress, encoding, body)
+            else:
+                compressed = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            metrics.inc(f"compression.{encoding}.responses")
+            metrics.inc(f"compression.{encoding}.bytes_in", len(body))
+            metrics.inc(f"compression.{encoding}.bytes_out", len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible_type(status_code: int, headers: MutableHeaders) -> bool:
+        if status_code < 200 or status_code in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0: одинаковое тело дает одинаковые байты
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
@@ -16,6 +16,160 @@ class Settings(BaseSettings):
 
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 30
+    # Кэш пользователей для проверки токенов без запроса к БД (api/auth_dependency.py).
+    # TTL ограничивает, как долго другой процесс может не знать об отзыве токенов.
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: int = 300
+
+    # --- База данных ---
+    # URL для асинхронного движка (asyncpg). Если не задан, выводится из DATABASE_URL.
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Пул соединений; настройки одинаковы для синхронного и асинхронного движков
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    # Сколько ждать свободное соединение, прежде чем запрос упадет с ошибкой
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    # Соединения старше этого срока переоткрываются (обходит таймауты простоя у прокси)
+    DB_POOL_RECYCLE_SECONDS: int = 30 * 60
+    # Реплика PostgreSQL для чтения (api/db_routing.py). Если не задана, все идет в основную БД
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # Сколько секунд после записи клиент читает из основной БД (read-your-writes, по cookie)
+    READ_YOUR_WRITES_SECONDS: int = 5
+    # Реплика, отставшая сильнее, не используется; отставание проверяется не чаще раза в REPLICA_LAG_CHECK_SECONDS
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_SECONDS: float = 1.0
+
+    # --- Метрики процесса (GET /metrics) ---
+    # Без токена эндпоинт выключен (404); с токеном — доступен только с заголовком X-Metrics-Token
+    METRICS_TOKEN: Optional[str] = None
+
+    # --- Сжатие ответов (core/compression.py) ---
+    # Ответы меньше этого размера не сжимаются: выигрыш меньше накладных расходов
+    COMPRESSION_MIN_BYTES: int = 1024
+    GZIP_LEVEL: int = 6
+    # Для ответов на лету выгоднее низкое качество brotli: почти как gzip -9, но быстрее
+    BROTLI_QUALITY: int = 4
+
+    # --- LLM-провайдер ---
+    # "openai" — настоящий OpenAI API, "fake" — встроенная детерминированная заглушка
+    # (services/fake_openai.py), которая работает прямо внутри процесса.
+    LLM_PROVIDER: str = "openai"
+    # Необязательный адрес совместимого API (например, отдельно запущенной заглушки:
+    # http://localhost:8001/v1). Если не задан, используется адрес по умолчанию.
+    LLM_BASE_URL: Optional[str] = None
+    # Сколько токенов текста заметки максимум отправляется в модель (контекст gpt-4o — 128k,
+    # остаток — на инструкцию и ответ); более длинный текст обрезается
+    AI_MAX_INPUT_TOKENS: int = 100_000
+
+    # --- Параметры заглушки (LLM_PROVIDER=fake) ---
+    FAKE_LLM_SEED: int = 42
+    # Распределение задержки ответа: fixed | uniform | normal | lognormal
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "fixed"
+    FAKE_LLM_LATENCY_MS: float = 0.0
+    FAKE_LLM_LATENCY_JITTER_MS: float = 0.0
+    # Доля запросов (0..1), на которые заглушка отвечает ошибкой 429/500
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    # Размер и пауза между чанками при stream=true
+    FAKE_LLM_STREAM_CHUNK_CHARS: int = 16
+    FAKE_LLM_STREAM_CHUNK_DELAY_MS: float = 0.0
+
+    # --- Извлечение контента со ссылок ---
+    # Минимальная уверенность локального экстрактора, при которой GPT не вызывается
+    LINK_LOCAL_MIN_CONFIDENCE: float = 0.6
+    # Сколько символов области-кандидата максимум отправляем в GPT на очистку
+    LINK_GPT_MAX_INPUT_CHARS: int = 24000
+
+    # --- Загрузка веб-страниц и кэши ---
+    HTTP_TIMEOUT_SECONDS: float = 15.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    # Кэш ответов по нормализованному URL
+    HTTP_CACHE_MAX_ENTRIES: int = 512
+    HTTP_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    HTTP_CACHE_MAX_ITEM_BYTES: int = 5 * 1024 * 1024
+    # Сколько секунд ответ считается свежим (без перепроверки на сервере)
+    HTTP_CACHE_FRESH_SECONDS: int = 300
+    # Сколько секунд ответ хранится для условной перепроверки (ETag / Last-Modified)
+    HTTP_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    # Кэш очищенного текста по хэшу загруженного тела страницы
+    LINK_TEXT_CACHE_MAX_ENTRIES: int = 2048
+    LINK_TEXT_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+
+    # --- Пулы для блокирующей работы в async-эндпоинтах ---
+    IO_EXECUTOR_WORKERS: int = 16
+    PARSING_EXECUTOR_WORKERS: int = 4
+    EMBEDDING_EXECUTOR_WORKERS: int = 2
+    # Пул процессов для постраничного разбора PDF (0 — по числу ядер)
+    PDF_PROCESS_WORKERS: int = 0
+    # Сколько страниц PDF обрабатывает один процесс за задачу
+    PDF_PAGES_PER_TASK: int = 16
+    # Сколько страниц проверять, чтобы распознать скан без текстового слоя
+    PDF_SCAN_SAMPLE_PAGES: int = 8
+
+    # --- Загрузка файлов ---
+    # Лимиты размера по типам источника, в мегабайтах
+    MAX_UPLOAD_MB_PDF: int = 100
+    MAX_UPLOAD_MB_DOCX: int = 50
+    MAX_UPLOAD_MB_AUDIO: int = 300
+    MAX_UPLOAD_MB_PHOTO: int = 25
+    MAX_UPLOAD_MB_DEFAULT: int = 50
+    # Рекомендуемый клиентам размер части при загрузке по частям
+    UPLOAD_PART_SIZE_BYTES: int = 8 * 1024 * 1024
+    # Незавершенные загрузки по частям старше этого срока удаляются
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+
+    # --- Распознавание текста на фото (services/ocr.py) ---
+    # "tesseract" — локальный движок, "fake" — детерминированная заглушка
+    OCR_BACKEND: str = "tesseract"
+    OCR_LANGUAGES: str = "rus+eng"
+    # Перед распознаванием фото уменьшается до этой длины большей стороны
+    OCR_MAX_IMAGE_SIDE: int = 2000
+    # Сколько фотографий можно прислать в одну заметку
+    MAX_PHOTOS_PER_NOTE: int = 20
+
+    # --- Массовый импорт заметок (api/imports.py) ---
+    # Сколько источников извлекается одновременно
+    IMPORT_CONCURRENCY: int = 8
+    # Сколько заметок вставляется одним INSERT и векторизуется одним батчем
+    IMPORT_BATCH_SIZE: int = 50
+    IMPORT_MAX_ITEMS: int = 5000
+    # Максимальный размер тела импорта (NDJSON или zip)
+    IMPORT_MAX_UPLOAD_MB: int = 1024
+    # Максимальная длина одной строки NDJSON
+    IMPORT_MAX_LINE_BYTES: int = 5 * 1024 * 1024
+
+    # --- Сжатие текста блоков заметок в БД (db/types.py) ---
+    # Блоки короче этого размера хранятся как есть
+    NOTE_BLOCK_COMPRESSION_MIN_BYTES: int = 512
+    NOTE_BLOCK_ZSTD_LEVEL: int = 3
+    # Фоновый перенос блоков, записанных до включения сжатия (services/block_compactor.py);
+    # законченный проход отмечен в maintenance_checkpoints и больше не запускается
+    BLOCK_COMPACTION_ENABLED: bool = True
+    BLOCK_COMPACTION_BATCH_SIZE: int = 500
+    # Пауза, пока пачку делает другой процесс или после ошибки
+    BLOCK_COMPACTION_INTERVAL_SECONDS: float = 30.0
+
+    # --- Совместное редактирование по WebSocket (api/connection_manager.py) ---
+    # Сколько исходящих сообщений может ждать отправки одному клиенту
+    WS_SEND_QUEUE_SIZE: int = 100
+    # Что делать при переполнении очереди: drop_oldest | coalesce | disconnect
+    WS_QUEUE_FULL_POLICY: str = "drop_oldest"
+    # Клиент, не принявший сообщение за это время, отключается
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+
+    # --- Выгрузка всех данных пользователя (api/exports.py) ---
+    # Сколько строк читается из БД одной пачкой (серверный курсор)
+    EXPORT_BATCH_SIZE: int = 200
+    # На сколько watermark отстает от начала выгрузки: больше самой долгой пишущей
+    # транзакции и отставания реплики. Изменения за это время придут повторно
+    EXPORT_WATERMARK_MARGIN_SECONDS: float = 15 * 60
+
+    # --- Фоновая очистка удаленных заметок (services/purger.py) ---
+    PURGE_INTERVAL_SECONDS: float = 30.0
+    # Сколько заметок очищается одной транзакцией и одним запросом к ChromaDB
+    PURGE_BATCH_SIZE: int = 200
+    # Сколько дней хранить надгробия очищенных заметок (для синхронизации клиентов)
+    PURGE_TOMBSTONE_RETENTION_DAYS: int = 30
 
     model_config = SettingsConfigDict(env_file=".env", extra='ignore')
 
@@ -28,4 +182,5 @@ print("--- Configuration Loaded ---")
 print(f"DATABASE_URL is set: {settings.DATABASE_URL is not None}")
 print(f"SECRET_KEY is set: {settings.SECRET_KEY is not None}")
 print(f"OPENAI_API_KEY is set: {settings.OPENAI_API_KEY is not None}")
-print("--------------------------")
\ No newline at end of file
+print(f"LLM_PROVIDER: {settings.LLM_PROVIDER}")
+print("--------------------------")
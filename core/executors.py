@@ -0,0 +1,132 @@
+# file: core/executors.py
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from .config import settings
+from .metrics import metrics
+
+
+class BoundedExecutor:
+    """
+    Именованный пул потоков фиксированного размера для блокирующей работы.
+
+    Async-эндпоинты отправляют сюда все, что блокирует (разбор файлов, эмбеддинги,
+    синхронные сетевые библиотеки), чтобы не занимать общий threadpool Starlette
+    и не останавливать event loop. У каждого пула свой размер, а глубина очереди
+    и число занятых потоков видны в /metrics как executor.<name>.*.
+    """
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+
+        metrics.register_gauge(f"executor.{name}.queue_depth", lambda: self._queued)
+        metrics.register_gauge(f"executor.{name}.active", lambda: self._active)
+        metrics.register_gauge(f"executor.{name}.max_workers", lambda: self.max_workers)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполняет fn(*args, **kwargs) в пуле и дожидается результата."""
+        loop = asyncio.get_running_loop()
+        state = {"dequeued": False}
+
+        def _dequeue():
+            # Вызывается ровно один раз: либо при старте задачи, либо при ее отмене
+            with self._lock:
+                if state["dequeued"]:
+                    return False
+                state["dequeued"] = True
+                self._queued -= 1
+                return True
+
+        def _call():
+            _dequeue()
+            with self._lock:
+                self._active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        with self._lock:
+            self._queued += 1
+        metrics.inc(f"executor.{self.name}.submitted")
+        try:
+            return await loop.run_in_executor(self._executor, _call)
+        finally:
+            _dequeue()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BoundedProcessPool:
+    """
+    Именованный пул процессов для CPU-нагрузки, которая упирается в GIL
+    (например, постраничный разбор больших PDF).
+
+    Процессы создаются лениво, при первой задаче, и запускаются через spawn:
+    fork из многопоточного сервера небезопасен. Задачи отправляются из потоков
+    BoundedExecutor, поэтому интерфейс синхронный (concurrent.futures.Future).
+    """
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        metrics.register_gauge(f"process_pool.{name}.pending", lambda: self._pending)
+        metrics.register_gauge(f"process_pool.{name}.max_workers", lambda: self.max_workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Отправляет fn(*args) в пул; fn и аргументы должны сериализоваться pickle."""
+        future = self._get_executor().submit(fn, *args)
+        with self._lock:
+            self._pending += 1
+        metrics.inc(f"process_pool.{self.name}.submitted")
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Блокирующий ввод-вывод: синхронные сетевые клиенты, запись файлов
+io_executor = BoundedExecutor("io", settings.IO_EXECUTOR_WORKERS)
+# CPU-нагрузка: разбор PDF/DOCX/HTML
+parsing_executor = BoundedExecutor("parsing", settings.PARSING_EXECUTOR_WORKERS)
+# Построение эмбеддингов и запись в векторную базу
+embedding_executor = BoundedExecutor("embedding", settings.EMBEDDING_EXECUTOR_WORKERS)
+# Постраничный разбор PDF на всех ядрах
+pdf_process_pool = BoundedProcessPool("pdf", settings.PDF_PROCESS_WORKERS)
+
+
+def shutdown_all():
+    """Останавливает все пулы (вызывается при остановке приложения)."""
+    for executor in (io_executor, parsing_executor, embedding_executor, pdf_process_pool):
+        executor.shutdown()
@@ -0,0 +1,55 @@
+# file: core/metrics.py
+
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+
+class MetricsRegistry:
+    """
+    Простейший реестр метрик внутри процесса.
+
+    Счетчики (counters) только растут, датчики (gauges) хранят текущее значение.
+    Датчик можно задать функцией — она вызывается в момент снятия снимка,
+    что удобно для размеров очередей и кэшей. Снимок отдает эндпоинт GET /metrics.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], float]] = {}
+
+    def inc(self, name: str, value: float = 1.0):
+        """Увеличивает счетчик."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        """Устанавливает текущее значение датчика."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], float]):
+        """Регистрирует датчик, значение которого вычисляется при снятии снимка."""
+        with self._lock:
+            self._gauge_callbacks[name] = callback
+
+    def snapshot(self) -> dict:
+        """Возвращает текущие значения всех метрик."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                print(f"Failed to collect gauge '{name}': {e}")
+        return {
+            "counters": dict(sorted(counters.items())),
+            "gauges": dict(sorted(gauges.items())),
+        }
+
+
+# Один глобальный реестр на процесс
+metrics = MetricsRegistry()
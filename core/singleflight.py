@@ -0,0 +1,41 @@
+# file: core/singleflight.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from .metrics import metrics
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вычислений ("single flight").
+
+    Если вычисление с таким ключом уже выполняется, новый вызывающий не запускает
+    его повторно, а дожидается того же результата (или той же ошибки).
+    Общая задача защищена от отмены: если один из клиентов отключился,
+    остальные все равно получат результат.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+        metrics.register_gauge(f"singleflight.{name}.in_flight", lambda: len(self._calls))
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Возвращает результат fn() — общий для всех одновременных вызовов с этим ключом."""
+        task = self._calls.get(key)
+        if task is not None:
+            metrics.inc(f"singleflight.{self.name}.shared")
+            return await asyncio.shield(task)
+
+        metrics.inc(f"singleflight.{self.name}.executed")
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda finished: self._forget(key, finished))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Помечаем исключение как полученное, даже если все ожидающие уже ушли
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,71 @@
+# file: core/text_stats.py
+
+"""
+Характеристики текста заметки, которые хранятся в notes: хэш содержимого и число
+токенов. Сам текст живет только в блоках (note_blocks). Характеристики
+считаются при записи и при дописывании блоков обновляются только по новым блокам,
+поэтому цена добавления не зависит от размера заметки.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Iterable
+
+try:
+    import tiktoken
+except ImportError:  # без tiktoken число токенов оценивается по длине текста
+    tiktoken = None
+
+# Кодировка токенизатора gpt-4o (services/ai_processor.py)
+TOKEN_ENCODING = "o200k_base"
+# Разделитель блоков в тексте заметки — тот же, что при векторизации заметки
+BLOCK_SEPARATOR = "\n\n"
+# content_hash заметки без блоков
+EMPTY_CONTENT_HASH = hashlib.sha256(b"").hexdigest()
+
+
+def plain_text(block_texts: Iterable[str]) -> str:
+    return BLOCK_SEPARATOR.join(block_texts)
+
+
+def content_hash(block_texts: Iterable[str], previous: str = EMPTY_CONTENT_HASH) -> str:
+    """
+    Цепочечный SHA-256 текстов блоков в hex: хэш очередного блока берется от хэша
+    всех предыдущих и текста блока. previous — хэш уже имеющихся блоков, поэтому
+    при дописывании хэшируются только новые блоки.
+    """
+    digest = previous
+    for text in block_texts:
+        digest = hashlib.sha256((digest + text).encode("utf-8")).hexdigest()
+    return digest
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:  # словарь кодировки скачивается при первом обращении
+        print(f"--- WARNING: tiktoken encoding '{TOKEN_ENCODING}' unavailable, token counts are estimated: {e} ---")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов текста; без tiktoken — грубая оценка (около 3 символов на токен для русского текста)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 2) // 3
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def trim_to_token_budget(text: str, token_count: int, max_tokens: int) -> str:
+    """
+    Обрезает текст до примерно max_tokens токенов по уже известному token_count,
+    не токенизируя текст заново (доля символов пропорциональна доле токенов).
+    """
+    if token_count <= max_tokens:
+        return text
+    return text[:len(text) * max_tokens // token_count]
@@ -1,10 +1,16 @@
 # file: db/crud.py
 
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
-from typing import List, Optional
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import TIMESTAMP, LargeBinary, bindparam, cast, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import distinct_on, insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
 
+from core import text_stats
+from core.config import settings
 from . import models, schemas
+from .types import pack_text, unpack_legacy_text
 
 # --- Функции для работы с Пользователями (User) ---
 
@@ -12,6 +18,45 @@ def get_user_by_device_id(db: Session, device_id: str) -> Optional[models.User]:
     """Находит пользователя по его уникальному device_id."""
     return db.query(models.User).filter(models.User.device_id == device_id).first()
 
+def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
+    """Находит пользователя по первичному ключу."""
+    return db.get(models.User, user_id)
+
+def increment_token_version(db: Session, user_id: int) -> Optional[int]:
+    """Увеличивает версию токенов пользователя (все выданные токены отзываются); возвращает новую версию."""
+    new_version = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(token_version=models.User.token_version + 1)
+        .returning(models.User.token_version)
+    ).scalar_one_or_none()
+    db.commit()
+    return new_version
+
+def get_user_content_version(db: Session, user_id: int) -> Optional[int]:
+    """Текущее значение счетчика изменений пользователя (один запрос по первичному ключу)."""
+    return db.execute(
+        select(models.User.content_version).where(models.User.id == user_id)
+    ).scalar_one_or_none()
+
+def touch_user_content_statement(user_id):
+    """
+    UPDATE, увеличивающий счетчик изменений пользователя, чтобы сменились ETag
+    его списков (общий для crud и crud_async). user_id может быть и SQL-выражением (подзапросом).
+    """
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(content_version=models.User.content_version + 1)
+    )
+
+def _touch_user_content(db: Session, user_id):
+    """
+    Увеличивает счетчик изменений пользователя (без commit).
+    Вызывается в той же транзакции, что и само изменение.
+    """
+    db.execute(touch_user_content_statement(user_id))
+
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     """Создает нового пользователя в базе данных."""
     db_user = models.User(device_id=user.device_id)
@@ -22,22 +67,213 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
 
 # --- Функции для работы с Заметками (Note) ---
 
+# Условие "заметка не удалена" — входит во все запросы чтения и изменения заметок
+NOTE_IS_LIVE = models.Note.deleted_at.is_(None)
+
+# Колонки TIMESTAMP заполняются func.now() и хранят время в часовом поясе сессии БД
+# (не обязательно UTC), поэтому сроки отсчитываются от времени самой БД
+def _database_time_ago(delta: timedelta):
+    return func.localtimestamp() - delta
+
+def _as_database_time(value: datetime):
+    """
+    Момент времени в том же виде, что и колонки TIMESTAMP. Значение с часовым поясом
+    переводится в пояс сессии БД, значение без пояса считается уже временем БД.
+    """
+    return func.timezone(func.current_setting("TimeZone"), cast(value, TIMESTAMP(timezone=True)))
+
 def get_note_by_id(db: Session, note_id: int, user_id: int) -> Optional[models.Note]:
     """Находит заметку по ID, но только если она принадлежит указанному пользователю."""
-    return db.query(models.Note).filter(models.Note.id == note_id, models.Note.user_id == user_id).first()
+    return db.query(models.Note).filter(
+        models.Note.id == note_id, models.Note.user_id == user_id, NOTE_IS_LIVE
+    ).first()
+
+def get_note_version(db: Session, note_id: int, user_id: int) -> Optional[tuple]:
+    """
+    (updated_at, folder_id) заметки для ETag — без загрузки содержимого.
+    """
+    return db.query(models.Note.updated_at, models.Note.folder_id).filter(
+        models.Note.id == note_id, models.Note.user_id == user_id, NOTE_IS_LIVE
+    ).first()
 
-def get_all_notes_by_user(db: Session, user_id: int) -> List[models.Note]:
-    """Возвращает список всех заметок для указанного пользователя."""
-    return db.query(models.Note).filter(models.Note.user_id == user_id).order_by(models.Note.updated_at.desc()).all()
+class NoteText(NamedTuple):
+    """Текст заметки, собранный из ее блоков, и сохраненные характеристики текста."""
+    id: int
+    block_count: int
+    block_texts: List[str]
+    plain_text: str
+    content_hash: Optional[str]
+    token_count: Optional[int]
 
-def create_note(db: Session, note: schemas.NoteCreate, user_id: int) -> models.Note:
-    """Создает новую заметку для пользователя."""
-    db_note = models.Note(**note.model_dump(), user_id=user_id)
+def _note_text_query(note_ids: List[int], user_id: int):
+    return select(
+        models.Note.id, models.Note.block_count, models.Note.content_hash, models.Note.token_count
+    ).where(models.Note.id.in_(note_ids), models.Note.user_id == user_id, NOTE_IS_LIVE)
+
+def _block_texts_query(note_ids: List[int]):
+    return select(
+        models.NoteBlock.note_id, models.NoteBlock.position,
+        models.NoteBlock.body, models.NoteBlock.legacy_text.label("legacy_text"),
+    ).where(
+        models.NoteBlock.note_id.in_(note_ids)
+    ).order_by(models.NoteBlock.note_id, models.NoteBlock.position)
+
+def _note_texts(notes: list, block_rows) -> List[NoteText]:
+    """
+    Собирает текст заметок из блоков по порядку. Берутся только блоки в пределах
+    прочитанного block_count: параллельно дописанные блоки не смешиваются
+    с сохраненными до них хэшем и числом токенов.
+    """
+    block_counts = {note.id: note.block_count for note in notes}
+    texts = {note.id: [] for note in notes}
+    for row in block_rows:
+        if row.position < block_counts[row.note_id]:
+            texts[row.note_id].append(
+                row.body if row.body is not None else unpack_legacy_text(row.legacy_text or "")
+            )
+    return [
+        NoteText(
+            note.id, note.block_count, texts[note.id], text_stats.plain_text(texts[note.id]),
+            note.content_hash, note.token_count,
+        )
+        for note in notes
+    ]
+
+def get_note_texts(db: Session, note_ids: List[int], user_id: int) -> List[NoteText]:
+    """
+    Тексты заметок пользователя по списку ID: текст собирается из блоков через
+    BLOCK_SEPARATOR (отдельной копии всего текста в notes нет). Два запроса на весь список.
+    """
+    notes = db.execute(_note_text_query(note_ids, user_id)).all()
+    if not any(note.block_count for note in notes):
+        return _note_texts(notes, [])
+    return _note_texts(notes, db.execute(_block_texts_query([note.id for note in notes])))
+
+def get_note_text(db: Session, note_id: int, user_id: int) -> Optional[NoteText]:
+    """Текст заметки пользователя (см. get_note_texts) или None."""
+    notes = get_note_texts(db, [note_id], user_id)
+    return notes[0] if notes else None
+
+def list_note_summaries(
+    db: Session, user_id: int, limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    folder_id: Optional[int] = None,
+    note_type: Optional[models.NoteType] = None,
+) -> list:
+    """
+    Возвращает страницу заметок пользователя от новых к старым — только колонки
+    для списка, без content. Пагинация по ключу (updated_at, id): after — ключ
+    последней заметки предыдущей страницы, поэтому стоимость запроса не зависит
+    от номера страницы (в отличие от OFFSET).
+    """
+    query = db.query(
+        models.Note.id, models.Note.title, models.Note.type, models.Note.source_uri,
+        models.Note.folder_id, models.Note.created_at, models.Note.updated_at,
+    ).filter(models.Note.user_id == user_id, NOTE_IS_LIVE)
+    if folder_id is not None:
+        query = query.filter(models.Note.folder_id == folder_id)
+    if note_type is not None:
+        query = query.filter(models.Note.type == note_type)
+    if after is not None:
+        query = query.filter(tuple_(models.Note.updated_at, models.Note.id) < tuple_(*after))
+    return query.order_by(models.Note.updated_at.desc(), models.Note.id.desc()).limit(limit).all()
+
+def _text_columns(blocks: List[dict]) -> dict:
+    """content_hash и token_count для заметки из блоков-словарей."""
+    texts = [block.get("text") or "" for block in blocks]
+    return {
+        "content_hash": text_stats.content_hash(texts),
+        "token_count": text_stats.count_tokens(text_stats.plain_text(texts)),
+    }
+
+def _block_rows(note_id: int, start_position: int, blocks: List[dict]) -> List[dict]:
+    """Строки note_blocks для блоков-словарей (TextBlock / TranscriptBlock), начиная с позиции start_position."""
+    rows = []
+    for offset, block in enumerate(blocks):
+        is_transcript = block.get("time_start") is not None
+        rows.append({
+            "note_id": note_id,
+            "position": start_position + offset,
+            "kind": "transcript" if is_transcript else "text",
+            "header": block.get("header"),
+            "sub_header": block.get("sub_header"),
+            "body": block.get("text") or "",
+            "time_start": block.get("time_start"),
+            "page": block.get("page"),
+        })
+    return rows
+
+def create_note(
+    db: Session, note: schemas.NoteCreate, user_id: int,
+    file_refs: Optional[List[schemas.FileReference]] = None
+) -> models.Note:
+    """
+    Создает новую заметку для пользователя.
+    Если заметка сделана из файлов, в той же транзакции увеличиваются счетчики ссылок на них.
+    """
+    note_data = note.model_dump()
+    blocks = note_data.pop("content") or []
+    db_note = models.Note(**note_data, **_text_columns(blocks), user_id=user_id, block_count=len(blocks))
+    # Один и тот же файл, присланный дважды, держит одну ссылку
+    unique_refs = list({file_ref.sha256: file_ref for file_ref in file_refs or []}.values())
+    if unique_refs:
+        db_note.file_sha256 = unique_refs[0].sha256
     db.add(db_note)
+    db.flush()
+    if blocks:
+        db.execute(insert(models.NoteBlock), _block_rows(db_note.id, 0, blocks))
+    _add_file_references(db, unique_refs)
+    for file_ref in unique_refs:
+        db.add(models.NoteFile(note_id=db_note.id, sha256=file_ref.sha256))
+    _touch_user_content(db, user_id)
     db.commit()
     db.refresh(db_note)
     return db_note
 
+def create_notes_bulk(
+    db: Session, notes: List[schemas.NoteCreate], user_id: int,
+    file_refs: List[List[schemas.FileReference]]
+) -> List[int]:
+    """
+    Создает много заметок одной транзакцией (для импорта).
+    Заметки вставляются одним многострочным INSERT ... RETURNING, ссылки на файлы —
+    еще двумя запросами на весь пакет. Возвращает ID заметок в порядке notes.
+    """
+    if not notes:
+        return []
+    rows = []
+    blocks_per_note = []
+    unique_refs_per_note = []
+    for note, note_file_refs in zip(notes, file_refs):
+        unique_refs = list({file_ref.sha256: file_ref for file_ref in note_file_refs}.values())
+        unique_refs_per_note.append(unique_refs)
+        note_data = note.model_dump()
+        blocks = note_data.pop("content") or []
+        blocks_per_note.append(blocks)
+        rows.append({
+            **note_data, **_text_columns(blocks), "user_id": user_id, "block_count": len(blocks),
+            "file_sha256": unique_refs[0].sha256 if unique_refs else None,
+        })
+    note_ids = list(db.scalars(
+        insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True), rows
+    ))
+    block_rows = [
+        row for note_id, blocks in zip(note_ids, blocks_per_note) for row in _block_rows(note_id, 0, blocks)
+    ]
+    if block_rows:
+        db.execute(insert(models.NoteBlock), block_rows)
+
+    _add_file_references(db, [file_ref for refs in unique_refs_per_note for file_ref in refs])
+    note_files = [
+        {"note_id": note_id, "sha256": file_ref.sha256}
+        for note_id, refs in zip(note_ids, unique_refs_per_note) for file_ref in refs
+    ]
+    if note_files:
+        db.execute(insert(models.NoteFile), note_files)
+    _touch_user_content(db, user_id)
+    db.commit()
+    return note_ids
+
 def update_note(db: Session, note_id: int, user_id: int, note_update: schemas.NoteUpdate) -> Optional[models.Note]:
     """Обновляет заметку (название, папка) для пользователя."""
     db_note = get_note_by_id(db, note_id=note_id, user_id=user_id)
@@ -51,25 +287,113 @@ def update_note(db: Session, note_id: int, user_id: int, note_update: schemas.No
     if 'title' in update_data:
         db_note.title = update_data['title']
 
+    _touch_user_content(db, user_id)
     db.commit()
     db.refresh(db_note)
     return db_note
 
-def append_text_block_to_note(db: Session, db_note: models.Note, text_block: schemas.TextBlock) -> models.Note:
-    """Добавляет новый текстовый блок в content заметки."""
-    if not db_note.content:
-        db_note.content = []
-    
-    # Добавляем новый блок как словарь
-    db_note.content.append(text_block.model_dump())
-    
-    # Явно указываем SQLAlchemy, что JSON-поле было изменено
-    flag_modified(db_note, "content")
-    
+def append_text_blocks_to_note(
+    db: Session, db_note: models.Note, text_blocks: List[Union[schemas.TextBlock, schemas.TranscriptBlock]]
+) -> Tuple[int, int, datetime]:
+    """
+    Дописывает блоки в конец заметки, не читая и не перезаписывая уже имеющиеся.
+    Строка заметки блокируется до commit (SELECT ... FOR UPDATE), поэтому параллельные
+    добавления получают разные позиции и ничего не теряют. Хэш продолжается от
+    сохраненного по новым блокам, а число токенов увеличивается на токены нового текста
+    (с разделителем, если блоки уже были) — старый текст не читается. Не подсчитанные
+    еще хэш и число токенов остаются NULL.
+
+    :return: (позиция первого добавленного блока, новое число блоков, новый updated_at).
+    """
+    start_position, previous_hash = db.execute(
+        select(models.Note.block_count, models.Note.content_hash)
+        .where(models.Note.id == db_note.id)
+        .with_for_update()
+    ).one()
+    new_texts = [block.text for block in text_blocks]
+    new_text = text_stats.plain_text(new_texts)
+    if start_position > 0:
+        new_text = text_stats.BLOCK_SEPARATOR + new_text
+    end_position = start_position + len(text_blocks)
+    updated_at = db.execute(
+        update(models.Note)
+        .where(models.Note.id == db_note.id)
+        .values(
+            block_count=end_position,
+            content_hash=text_stats.content_hash(new_texts, previous_hash) if previous_hash is not None else None,
+            token_count=models.Note.token_count + text_stats.count_tokens(new_text),
+            updated_at=func.now(),
+        )
+        .returning(models.Note.updated_at)
+    ).scalar_one()
+    db.execute(
+        insert(models.NoteBlock),
+        _block_rows(db_note.id, start_position, [block.model_dump() for block in text_blocks]),
+    )
+    _touch_user_content(db, db_note.user_id)
     db.commit()
-    db.refresh(db_note)
-    return db_note
+    return start_position, end_position, updated_at
+
+def get_note_blocks(db: Session, note_id: int, start: int, limit: int) -> List[models.NoteBlock]:
+    """Возвращает блоки заметки с позиции start (диапазон по первичному ключу)."""
+    return db.query(models.NoteBlock).filter(
+        models.NoteBlock.note_id == note_id, models.NoteBlock.position >= start
+    ).order_by(models.NoteBlock.position).limit(limit).all()
 
+# Проход services/block_compactor.py: перенос текста блоков из прежней колонки text в body
+NOTE_BLOCKS_BODY_CHECKPOINT = "note_blocks.body"
+
+def compact_note_blocks(db: Session, limit: int) -> Optional[Tuple[bool, int, int, int]]:
+    """
+    Переносит пачку блоков из прежней колонки text в body (сжатый BYTEA), продолжая
+    с ключа, сохраненного в maintenance_checkpoints; новый ключ сохраняется в той же
+    транзакции, что и сами блоки. Строка положения блокируется FOR UPDATE SKIP LOCKED:
+    пока пачку делает один процесс, остальные ее пропускают.
+
+    :return: (проход закончен, сколько блоков перенесено, байт текста до, байт после)
+             или None, если пачку сейчас делает другой процесс.
+    """
+    checkpoint = db.execute(
+        select(models.MaintenanceCheckpoint)
+        .where(models.MaintenanceCheckpoint.name == NOTE_BLOCKS_BODY_CHECKPOINT)
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if checkpoint is None:
+        db.rollback()
+        return None
+    if checkpoint.finished_at is not None:
+        db.rollback()
+        return True, 0, 0, 0
+
+    key = tuple_(models.NoteBlock.note_id, models.NoteBlock.position)
+    query = select(
+        models.NoteBlock.note_id, models.NoteBlock.position, models.NoteBlock.legacy_text.label("legacy_text")
+    ).where(models.NoteBlock.legacy_text.isnot(None))
+    if checkpoint.last_key is not None:
+        query = query.where(key > tuple_(*checkpoint.last_key))
+    rows = db.execute(query.order_by(models.NoteBlock.note_id, models.NoteBlock.position).limit(limit)).all()
+
+    updates = []
+    bytes_before = bytes_after = 0
+    for row in rows:
+        packed = pack_text(unpack_legacy_text(row.legacy_text))
+        updates.append({"b_note_id": row.note_id, "b_position": row.position, "b_body": packed})
+        bytes_before += len(row.legacy_text.encode("utf-8"))
+        bytes_after += len(packed)
+    if updates:
+        table = models.NoteBlock.__table__
+        db.execute(
+            update(table)
+            .where(table.c.note_id == bindparam("b_note_id"), table.c.position == bindparam("b_position"))
+            .values(body=bindparam("b_body", type_=LargeBinary()), text=None),
+            updates,
+        )
+        checkpoint.last_key = [rows[-1].note_id, rows[-1].position]
+    finished = len(rows) < limit
+    if finished:
+        checkpoint.finished_at = func.now()
+    db.commit()
+    return finished, len(updates), bytes_before, bytes_after
 
 def add_note_to_folder(db: Session, note_id: int, folder_id: int, user_id: int) -> Optional[models.Note]:
     """Добавляет заметку в папку, проверяя, что и папка, и заметка принадлежат пользователю."""
@@ -77,34 +401,274 @@ def add_note_to_folder(db: Session, note_id: int, folder_id: int, user_id: int)
     db_folder = get_folder_by_id(db, folder_id, user_id)
     if db_note and db_folder:
         db_note.folder_id = folder_id
+        _touch_user_content(db, user_id)
         db.commit()
         db.refresh(db_note)
         return db_note
     return None
 
-def delete_note_by_id(db: Session, note_id: int, user_id: int) -> Optional[models.Note]:
-    """Удаляет заметку по ID, если она принадлежит пользователю."""
-    db_note = get_note_by_id(db, note_id=note_id, user_id=user_id)
-    if db_note:
-        db.delete(db_note)
-        db.commit()
-        return db_note
-    return None
+def move_notes_bulk(db: Session, note_ids: List[int], folder_id: Optional[int], user_id: int) -> List[int]:
+    """
+    Переносит заметки пользователя в папку одним UPDATE ... RETURNING (папку проверяет вызывающий).
+    Чужие и несуществующие ID просто не попадают в результат. Возвращает ID перенесенных заметок.
+    """
+    moved = list(db.scalars(
+        update(models.Note)
+        .where(models.Note.id.in_(note_ids), models.Note.user_id == user_id, NOTE_IS_LIVE)
+        .values(folder_id=folder_id, updated_at=func.now())
+        .returning(models.Note.id)
+        .execution_options(synchronize_session=False)
+    ))
+    if moved:
+        _touch_user_content(db, user_id)
+    db.commit()
+    return moved
+
+def soft_delete_notes(db: Session, note_ids: List[int], user_id: int) -> List[int]:
+    """
+    Помечает заметки пользователя удаленными одним UPDATE ... RETURNING.
+    Заметки сразу пропадают из всех запросов; векторы, блоки, AI-контент и файлы
+    удаляет фоновая очистка (services/purger.py). Возвращает ID удаленных заметок.
+    """
+    deleted = list(db.scalars(
+        update(models.Note)
+        .where(models.Note.id.in_(note_ids), models.Note.user_id == user_id, NOTE_IS_LIVE)
+        .values(deleted_at=func.now(), updated_at=func.now())
+        .returning(models.Note.id)
+        .execution_options(synchronize_session=False)
+    ))
+    if deleted:
+        _touch_user_content(db, user_id)
+    db.commit()
+    return deleted
+
+def lock_notes_pending_purge(db: Session, limit: int) -> List[int]:
+    """
+    Выбирает и блокирует (без commit) пачку удаленных, но еще не очищенных заметок.
+    SKIP LOCKED позволяет нескольким процессам чистить параллельно, не мешая друг другу.
+    """
+    return list(db.scalars(
+        select(models.Note.id)
+        .where(models.Note.deleted_at.isnot(None), models.Note.purged_at.is_(None))
+        .order_by(models.Note.deleted_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ))
+
+def purge_notes(db: Session, note_ids: List[int]) -> Tuple[int, List[models.UploadedFile]]:
+    """
+    Удаляет содержимое удаленных заметок пакетом: AI-контент, блоки, ссылки на файлы
+    (со снятием счетчиков ссылок) — и ставит purged_at. Строки заметок остаются
+    надгробиями для синхронизации клиентов.
+
+    :return: (сколько записей AI-контента удалено, файлы без ссылок — их можно удалять с диска).
+    """
+    file_hashes = [row.sha256 for row in db.query(models.NoteFile.sha256).filter(models.NoteFile.note_id.in_(note_ids))]
+    ai_deleted = db.execute(
+        delete(models.AIGeneratedContent).where(models.AIGeneratedContent.note_id.in_(note_ids))
+    ).rowcount
+    db.execute(delete(models.NoteBlock).where(models.NoteBlock.note_id.in_(note_ids)))
+    db.execute(delete(models.NoteFile).where(models.NoteFile.note_id.in_(note_ids)))
+    orphans = _release_file_references(db, file_hashes)
+    db.execute(
+        update(models.Note)
+        .where(models.Note.id.in_(note_ids))
+        # Ссылки заметки на файлы сняты выше, поэтому file_sha256 тоже очищается (иначе
+        # миграция note_files вернула бы надгробию ссылку без refcount). Очистка
+        # не меняет заметку для пользователя — updated_at остается прежним
+        .values(
+            purged_at=func.now(), block_count=0, content_hash=text_stats.EMPTY_CONTENT_HASH, token_count=0,
+            file_sha256=None, updated_at=models.Note.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return ai_deleted, orphans
+
+def count_notes_pending_purge(db: Session) -> int:
+    """Сколько удаленных заметок ждут очистки (по частичному индексу ix_notes_purge_pending)."""
+    return db.query(func.count(models.Note.id)).filter(
+        models.Note.deleted_at.isnot(None), models.Note.purged_at.is_(None)
+    ).scalar()
+
+def delete_purged_tombstones(db: Session, retention_days: int, limit: int) -> int:
+    """Окончательно удаляет строки очищенных заметок, удаленных больше retention_days дней назад."""
+    expired = select(models.Note.id).where(
+        models.Note.purged_at.isnot(None),
+        models.Note.deleted_at < _database_time_ago(timedelta(days=retention_days)),
+    ).limit(limit).scalar_subquery()
+    deleted = db.execute(
+        delete(models.Note).where(models.Note.id.in_(expired)).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
+
+# --- Функции для работы с загруженными файлами (UploadedFile) ---
+
+def _add_file_references(db: Session, file_refs: List[schemas.FileReference]):
+    """
+    Регистрирует файлы или увеличивает их счетчики ссылок (без commit).
+    Каждый элемент file_refs — одна ссылка; повторы одного файла складываются.
+    """
+    if not file_refs:
+        return
+    counts = Counter(file_ref.sha256 for file_ref in file_refs)
+    by_hash = {file_ref.sha256: file_ref for file_ref in file_refs}
+    stmt = pg_insert(models.UploadedFile).values([
+        {"sha256": sha256, "path": by_hash[sha256].path, "size": by_hash[sha256].size, "refcount": count}
+        for sha256, count in counts.items()
+    ])
+    # Один INSERT на весь набор: строка с одним sha256 в нем встречается ровно один раз
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.UploadedFile.sha256],
+        set_={"refcount": models.UploadedFile.refcount + stmt.excluded.refcount},
+    )
+    db.execute(stmt)
+
+def _release_file_references(db: Session, file_hashes: List[str]) -> List[models.UploadedFile]:
+    """
+    Уменьшает счетчики ссылок на файлы (без commit): каждый элемент file_hashes —
+    одна снимаемая ссылка. Строки блокируются в порядке sha256, чтобы параллельные
+    пакеты не взаимоблокировались. Возвращает файлы, на которые больше никто не ссылается.
+    """
+    if not file_hashes:
+        return []
+    counts = Counter(file_hashes)
+    db_files = db.query(models.UploadedFile).filter(
+        models.UploadedFile.sha256.in_(list(counts))
+    ).order_by(models.UploadedFile.sha256).with_for_update().all()
+    orphans = []
+    for db_file in db_files:
+        db_file.refcount -= counts[db_file.sha256]
+        if db_file.refcount <= 0:
+            db.delete(db_file)
+            orphans.append(db_file)
+    return orphans
+
+def is_file_referenced(db: Session, sha256: str) -> bool:
+    """Проверяет, держит ли файл хоть кто-то: заметка, загрузка по частям или запрос."""
+    return db.query(models.UploadedFile.sha256).filter(models.UploadedFile.sha256 == sha256).first() is not None
+
+def lock_stored_file(db: Session, sha256: str):
+    """
+    Блокирует файл с этим хэшем до конца транзакции (advisory lock, без commit).
+    Под ней файл кладется в хранилище вместе со взятием ссылки и удаляется с диска
+    только после проверки, что ссылок нет, — иначе удаление могло бы попасть между
+    дедупликацией и увеличением счетчика.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(sha256, 0))))
+
+def add_file_reference(db: Session, file_ref: schemas.FileReference):
+    """Берет одну ссылку на файл (без commit; вызывать под lock_stored_file)."""
+    _add_file_references(db, [file_ref])
+
+def release_file_reference(db: Session, sha256: str) -> Optional[models.UploadedFile]:
+    """
+    Снимает одну ссылку на файл (без commit; вызывать под lock_stored_file).
+    Возвращает файл, если ссылок на него больше не осталось.
+    """
+    orphans = _release_file_references(db, [sha256])
+    return orphans[0] if orphans else None
+
+# --- Функции для работы с загрузками по частям (UploadSession) ---
+
+def create_upload_session(db: Session, upload_id: str, user_id: int, upload: schemas.UploadSessionCreate) -> models.UploadSession:
+    """Создает новую загрузку по частям."""
+    db_upload = models.UploadSession(
+        id=upload_id, user_id=user_id, filename=upload.filename,
+        source_type=upload.source_type.value, total_size=upload.total_size,
+        received_bytes=0, status="active",
+    )
+    db.add(db_upload)
+    db.commit()
+    db.refresh(db_upload)
+    return db_upload
+
+def get_upload_session(db: Session, upload_id: str, user_id: int) -> Optional[models.UploadSession]:
+    """Находит загрузку по ID, но только если она принадлежит указанному пользователю."""
+    return db.query(models.UploadSession).filter(
+        models.UploadSession.id == upload_id, models.UploadSession.user_id == user_id
+    ).first()
+
+def update_upload_session(db: Session, db_upload: models.UploadSession, **fields) -> models.UploadSession:
+    """Обновляет прогресс или статус загрузки."""
+    for name, value in fields.items():
+        setattr(db_upload, name, value)
+    db.commit()
+    db.refresh(db_upload)
+    return db_upload
+
+def transition_upload_session(
+    db: Session, upload_id: str, user_id: int, from_statuses: Tuple[str, ...], **fields
+) -> Optional[models.UploadSession]:
+    """
+    Атомарно обновляет загрузку, только если ее статус — один из from_statuses
+    (UPDATE ... WHERE status IN ... RETURNING). Возвращает загрузку или None,
+    если ее уже забрал другой запрос (в том числе в другом процессе).
+    """
+    db_upload = db.execute(
+        update(models.UploadSession)
+        .where(
+            models.UploadSession.id == upload_id,
+            models.UploadSession.user_id == user_id,
+            models.UploadSession.status.in_(from_statuses),
+        )
+        .values(**fields, updated_at=func.now())
+        .returning(models.UploadSession)
+    ).scalar_one_or_none()
+    db.commit()
+    return db_upload
+
+def delete_upload_session(db: Session, upload_id: str, user_id: int, statuses: Tuple[str, ...]):
+    """
+    Удаляет загрузку, только если ее статус — один из statuses.
+    Возвращает (id, status, file_sha256, file_path, total_size) удаленной загрузки или None.
+    """
+    row = db.execute(
+        delete(models.UploadSession)
+        .where(
+            models.UploadSession.id == upload_id,
+            models.UploadSession.user_id == user_id,
+            models.UploadSession.status.in_(statuses),
+        )
+        .returning(
+            models.UploadSession.id, models.UploadSession.status, models.UploadSession.file_sha256,
+            models.UploadSession.file_path, models.UploadSession.total_size,
+        )
+    ).first()
+    db.commit()
+    return row
+
+def pop_stale_upload_sessions(db: Session, ttl_hours: int, limit: int = 50) -> List[models.UploadSession]:
+    """Удаляет незавершенные загрузки, которые не обновлялись дольше ttl_hours часов, и возвращает их."""
+    stale = db.query(models.UploadSession).filter(
+        models.UploadSession.status != "completed",
+        models.UploadSession.updated_at < _database_time_ago(timedelta(hours=ttl_hours)),
+    ).limit(limit).all()
+    for db_upload in stale:
+        db.delete(db_upload)
+    db.commit()
+    return stale
 
 # --- Функции для работы с Папками (Folder) ---
 
 def get_folder_by_id(db: Session, folder_id: int, user_id: int) -> Optional[models.Folder]:
     """Находит папку по ID, но только если она принадлежит указанному пользователю."""
-    return db.query(models.Folder).filter(models.Folder.id == folder_id, models.Folder.user_id == user_id).first()
+    return db.query(models.Folder).filter(
+        models.Folder.id == folder_id, models.Folder.user_id == user_id, models.Folder.deleted_at.is_(None)
+    ).first()
 
 def get_all_folders_by_user(db: Session, user_id: int) -> List[models.Folder]:
     """Возвращает список всех папок для указанного пользователя."""
-    return db.query(models.Folder).filter(models.Folder.user_id == user_id).order_by(models.Folder.name).all()
+    return db.query(models.Folder).filter(
+        models.Folder.user_id == user_id, models.Folder.deleted_at.is_(None)
+    ).order_by(models.Folder.name).all()
 
 def create_folder(db: Session, folder: schemas.FolderCreate, user_id: int) -> models.Folder:
     """Создает новую папку для пользователя."""
     db_folder = models.Folder(name=folder.name, user_id=user_id)
     db.add(db_folder)
+    _touch_user_content(db, user_id)
     db.commit()
     db.refresh(db_folder)
     return db_folder
@@ -118,20 +682,43 @@ def update_folder(db: Session, folder_id: int, user_id: int, folder_update: sche
     update_data = folder_update.model_dump(exclude_unset=True)
     if 'name' in update_data:
         db_folder.name = update_data['name']
-    
+
+    _touch_user_content(db, user_id)
     db.commit()
     db.refresh(db_folder)
     return db_folder
 
 def delete_folder_by_id(db: Session, folder_id: int, user_id: int) -> Optional[models.Folder]:
-    """Удаляет папку по ID, если она принадлежит пользователю."""
+    """
+    Помечает папку пользователя удаленной. Заметки открепляются сразу, в той же
+    транзакции, чтобы не ссылаться на невидимую папку; строку папки удалит фоновая очистка.
+    """
     db_folder = get_folder_by_id(db, folder_id=folder_id, user_id=user_id)
     if db_folder:
-        db.delete(db_folder)
+        db_folder.deleted_at = func.now()
+        # updated_at меняется, чтобы открепление попало в инкрементальную выгрузку
+        db.execute(
+            update(models.Note)
+            .where(models.Note.folder_id == folder_id)
+            .values(folder_id=None, updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        _touch_user_content(db, user_id)
         db.commit()
         return db_folder
     return None
 
+def purge_deleted_folders(db: Session, limit: int) -> int:
+    """Окончательно удаляет пачку папок, помеченных удаленными."""
+    deleted_ids = select(models.Folder.id).where(
+        models.Folder.deleted_at.isnot(None)
+    ).limit(limit).scalar_subquery()
+    deleted = db.execute(
+        delete(models.Folder).where(models.Folder.id.in_(deleted_ids)).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
+
 # --- Функция для сохранения AI-контента ---
 def create_ai_content(db: Session, content: schemas.AIGeneratedContentCreate, note_id: int) -> models.AIGeneratedContent:
     """Сохраняет сгенерированный AI-контент в базу данных, привязывая его к заметке."""
@@ -140,6 +727,71 @@ def create_ai_content(db: Session, content: schemas.AIGeneratedContentCreate, no
         note_id=note_id
     )
     db.add(db_content)
+    _touch_user_content(db, select(models.Note.user_id).where(models.Note.id == note_id).scalar_subquery())
     db.commit()
     db.refresh(db_content)
-    return db_content
\ No newline at end of file
+    return db_content
+
+def get_latest_ai_content(
+    db: Session, note_id: int, user_id: int, content_type: Optional[str] = None
+) -> List[models.AIGeneratedContent]:
+    """
+    Последний сохраненный AI-контент каждого типа для заметки пользователя — одним запросом
+    (DISTINCT ON по индексу (note_id, content_type, created_at desc)).
+    Пустой список — контента нет или заметка не принадлежит пользователю.
+    """
+    query = db.query(models.AIGeneratedContent).join(
+        models.Note, models.Note.id == models.AIGeneratedContent.note_id
+    ).filter(models.AIGeneratedContent.note_id == note_id, models.Note.user_id == user_id, NOTE_IS_LIVE)
+    if content_type is not None:
+        query = query.filter(models.AIGeneratedContent.content_type == content_type)
+    return query.ext(distinct_on(models.AIGeneratedContent.content_type)).order_by(
+        models.AIGeneratedContent.content_type,
+        models.AIGeneratedContent.created_at.desc(),
+        models.AIGeneratedContent.id.desc(),
+    ).all()
+
+# --- Выгрузка всех данных пользователя (api/exports.py) ---
+# Запросы читаются серверным курсором (yield_per): в памяти одновременно только одна пачка строк
+
+def get_export_watermark(db: Session, margin_seconds: float) -> datetime:
+    """
+    Отметка для следующей инкрементальной выгрузки (since): время БД на начало
+    выгрузки минус запас. updated_at — время начала пишущей транзакции, поэтому
+    строка, закоммиченная уже после начала выгрузки, может получить время раньше
+    него; без запаса ее не увидела бы ни эта выгрузка, ни следующая.
+    """
+    return db.scalar(select(_database_time_ago(timedelta(seconds=margin_seconds))))
+
+def iter_notes_for_export(
+    db: Session, user_id: int, batch_size: int, since: Optional[datetime] = None
+) -> Iterator[List[models.Note]]:
+    """Неудаленные заметки пользователя (измененные начиная с since) пачками вместе с блоками."""
+    query = select(models.Note).options(selectinload(models.Note.blocks)).where(
+        models.Note.user_id == user_id, NOTE_IS_LIVE
+    )
+    if since is not None:
+        query = query.where(models.Note.updated_at >= _as_database_time(since))
+    query = query.order_by(models.Note.id).execution_options(yield_per=batch_size)
+    yield from db.scalars(query).partitions()
+
+def iter_ai_content_for_export(
+    db: Session, user_id: int, batch_size: int, since: Optional[datetime] = None
+) -> Iterator[List[models.AIGeneratedContent]]:
+    """AI-контент неудаленных заметок пользователя (созданный начиная с since) пачками."""
+    query = select(models.AIGeneratedContent).join(
+        models.Note, models.Note.id == models.AIGeneratedContent.note_id
+    ).where(models.Note.user_id == user_id, NOTE_IS_LIVE)
+    if since is not None:
+        query = query.where(models.AIGeneratedContent.created_at >= _as_database_time(since))
+    query = query.order_by(models.AIGeneratedContent.id).execution_options(yield_per=batch_size)
+    yield from db.scalars(query).partitions()
+
+def iter_note_tombstones(
+    db: Session, user_id: int, since: datetime, batch_size: int
+) -> Iterator[list]:
+    """(id, deleted_at) заметок, удаленных начиная с since, пачками."""
+    query = select(models.Note.id, models.Note.deleted_at).where(
+        models.Note.user_id == user_id, models.Note.deleted_at >= _as_database_time(since)
+    ).order_by(models.Note.id).execution_options(yield_per=batch_size)
+    yield from db.execute(query).partitions()
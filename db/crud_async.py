@@ -0,0 +1,77 @@
+# file: db/crud_async.py
+
+"""
+Асинхронные версии функций crud для async-эндпоинтов (сессия из get_async_db).
+
+Поведение то же, что у одноименных функций в db/crud.py. Ленивой подгрузки
+связей в async-коде нет, поэтому все, что понадобится после запроса
+(например, блоки заметки), загружается сразу через selectinload.
+"""
+
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models, schemas
+from .crud import (NOTE_IS_LIVE, NoteText, _block_texts_query, _note_text_query, _note_texts,
+                   touch_user_content_statement)
+
+# --- Пользователи (User) ---
+
+async def get_user_by_device_id(db: AsyncSession, device_id: str) -> Optional[models.User]:
+    """Находит пользователя по его уникальному device_id."""
+    result = await db.execute(select(models.User).where(models.User.device_id == device_id))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    """Находит пользователя по первичному ключу."""
+    return await db.get(models.User, user_id)
+
+# --- Заметки (Note) ---
+
+async def get_note_by_id(db: AsyncSession, note_id: int, user_id: int, with_blocks: bool = True) -> Optional[models.Note]:
+    """Находит заметку пользователя по ID; блоки содержимого загружаются тем же обращением."""
+    query = select(models.Note).where(
+        models.Note.id == note_id, models.Note.user_id == user_id, NOTE_IS_LIVE
+    )
+    if with_blocks:
+        query = query.options(selectinload(models.Note.blocks))
+    result = await db.execute(query)
+    return result.scalars().first()
+
+async def get_note_text(db: AsyncSession, note_id: int, user_id: int) -> Optional[NoteText]:
+    """Текст заметки пользователя, собранный из блоков (как crud.get_note_text), или None."""
+    notes = (await db.execute(_note_text_query([note_id], user_id))).all()
+    if not notes:
+        return None
+    block_rows = (await db.execute(_block_texts_query([note_id]))).all() if notes[0].block_count else []
+    return _note_texts(notes, block_rows)[0]
+
+async def set_note_text_stats(db: AsyncSession, note: NoteText, content_hash: str, token_count: int):
+    """
+    Сохраняет подсчитанные хэш и число токенов (для заметок, созданных до появления колонок).
+    Записывается, только если с момента чтения note к заметке не дописали блоков.
+    """
+    await db.execute(
+        update(models.Note)
+        .where(models.Note.id == note.id, models.Note.block_count == note.block_count)
+        # Характеристики текста не меняют заметку для пользователя: updated_at
+        # (порядок списков, ETag, курсоры) остается прежним, onupdate не срабатывает
+        .values(content_hash=content_hash, token_count=token_count, updated_at=models.Note.updated_at)
+    )
+    await db.commit()
+
+# --- AI-контент ---
+
+async def create_ai_content(db: AsyncSession, content: schemas.AIGeneratedContentCreate, note_id: int) -> models.AIGeneratedContent:
+    """Сохраняет сгенерированный AI-контент, привязывая его к заметке."""
+    db_content = models.AIGeneratedContent(**content.model_dump(), note_id=note_id)
+    db.add(db_content)
+    # Меняется ETag данных владельца заметки
+    owner_id = select(models.Note.user_id).where(models.Note.id == note_id).scalar_subquery()
+    await db.execute(touch_user_content_statement(owner_id))
+    await db.commit()
+    await db.refresh(db_content)
+    return db_content
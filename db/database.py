@@ -1,24 +1,112 @@
 # file: db/database.py
 
-from sqlalchemy import create_engine
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Импортируем наш объект с настройками, чтобы взять URL базы данных
 from core.config import settings
+from core.metrics import metrics
+
+
+def _pool_options() -> dict:
+    """Общие настройки пула соединений для обоих движков."""
+    return dict(
+        # Рекомендуется для серверных приложений, чтобы избежать проблем
+        # с соединениями, которые закрылись по таймауту.
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+
+
+def sync_database_url(url: Optional[str]) -> Optional[str]:
+    """
+    Закрепляет за URL без явного драйвера (postgresql://, postgres://) psycopg2 из
+    requirements.txt: SQLAlchemy 2.1 по умолчанию берет для них psycopg (v3).
+    URL с явным драйвером и другие СУБД не меняются.
+    """
+    if not url:
+        return url
+    parsed = make_url(url)
+    if parsed.drivername not in ("postgresql", "postgres"):
+        return url
+    return parsed.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False)
+
+
+def async_database_url(url: Optional[str]) -> Optional[str]:
+    """
+    Переводит URL синхронного драйвера (postgresql://, postgres://, postgresql+psycopg2://)
+    на asyncpg. asyncpg не понимает параметр sslmode, поэтому он передается как ssl.
+    """
+    if not url:
+        return url
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql" and parsed.drivername != "postgres":
+        return url
+    query = dict(parsed.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+def register_pool_metrics(name: str, engine: Engine):
+    """
+    Выводит состояние пула в /metrics как db.<name>.pool.*: сколько соединений
+    занято, сколько сверх pool_size и предельное число. in_use == capacity —
+    пул исчерпан, и новые запросы ждут соединение до DB_POOL_TIMEOUT_SECONDS.
+    """
+    pool = engine.pool
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    metrics.register_gauge(f"db.{name}.pool.in_use", pool.checkedout)
+    metrics.register_gauge(f"db.{name}.pool.idle", pool.checkedin)
+    metrics.register_gauge(f"db.{name}.pool.overflow", lambda: max(pool.overflow(), 0))
+    metrics.register_gauge(f"db.{name}.pool.capacity", lambda: capacity)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc(f"db.{name}.pool.checkouts")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.inc(f"db.{name}.pool.connects")
+
 
 # Создаем "движок" SQLAlchemy.
 # Он является точкой входа к базе данных и управляет пулом соединений.
 # Мы используем URL из нашего файла конфигурации.
-engine = create_engine(
-    settings.DATABASE_URL,
-    # Рекомендуется для серверных приложений, чтобы избежать проблем
-    # с соединениями, которые закрылись по таймауту.
-    pool_pre_ping=True
+# Синхронный движок остается для миграций, фоновых задач и sync-эндпоинтов.
+engine = create_engine(sync_database_url(settings.DATABASE_URL), **_pool_options())
+register_pool_metrics("sync", engine)
+
+# Асинхронный движок (asyncpg) для async-эндпоинтов: запросы не блокируют event loop.
+# Соединение открывается только при первом запросе.
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL), **_pool_options()
 )
+register_pool_metrics("async", async_engine.sync_engine)
+
+# Необязательная реплика для чтения (выбор между ней и основной БД — в api/db_routing.py)
+replica_engine: Optional[Engine] = None
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(sync_database_url(settings.DATABASE_REPLICA_URL), **_pool_options())
+    register_pool_metrics("replica", replica_engine)
 
 # Создаем "фабрику сессий". Каждая сессия, созданная с помощью SessionLocal,
 # будет отдельным сеансом работы с базой данных.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) if replica_engine is not None else None
+)
+
+# Асинхронные сессии не сбрасывают объекты после commit: ленивой подгрузки
+# атрибутов в async-коде нет, и обращение к ним после commit упало бы.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Создаем базовый класс для наших декларативных моделей.
 # Все наши классы-модели (User, Note, Folder) будут наследоваться от него.
@@ -36,4 +124,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Асинхронный вариант get_db: сессия на запрос поверх asyncpg."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,102 @@
+# file: db/migrations.py
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Base.metadata.create_all создает только отсутствующие таблицы и не трогает
+# существующие. Новые колонки и индексы уже созданных таблиц добавляются здесь
+# идемпотентными DDL-командами (PostgreSQL), которые безопасно выполнять
+# при каждом старте приложения. Новые команды дописываем в конец списка.
+MIGRATIONS = [
+    # Хранилище файлов по содержимому: ссылка заметки на файл
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS file_sha256 TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_notes_file_sha256 ON notes (file_sha256)",
+    # Заметки с несколькими файлами: переносим существующие ссылки в note_files
+    # (кроме удаленных — их ссылки снимает фоновая очистка; колонка deleted_at
+    # добавляется здесь заранее, чтобы команда работала и на базе до мягкого удаления)
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP",
+    "INSERT INTO note_files (note_id, sha256) SELECT id, file_sha256 FROM notes "
+    "WHERE file_sha256 IS NOT NULL AND deleted_at IS NULL ON CONFLICT DO NOTHING",
+    # Курсорная пагинация списков заметок по (updated_at, id)
+    "CREATE INDEX IF NOT EXISTS ix_notes_user_updated_id ON notes (user_id, updated_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_notes_user_folder_updated_id "
+    "ON notes (user_id, folder_id, updated_at DESC, id DESC)",
+    # Содержимое заметок в note_blocks: переносим блоки из старой JSON-колонки content
+    # и переименовываем ее, чтобы новые INSERT без content не упирались в NOT NULL
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS block_count INTEGER NOT NULL DEFAULT 0",
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'notes' AND column_name = 'content') THEN
+            INSERT INTO note_blocks (note_id, position, kind, header, sub_header, text, time_start, page)
+            SELECT n.id, b.ordinality - 1,
+                   CASE WHEN (b.value::jsonb) ? 'time_start' THEN 'transcript' ELSE 'text' END,
+                   b.value->>'header', b.value->>'sub_header', COALESCE(b.value->>'text', ''),
+                   (b.value->>'time_start')::double precision, (b.value->>'page')::integer
+            FROM notes n
+            CROSS JOIN LATERAL json_array_elements(
+                CASE WHEN json_typeof(n.content::json) = 'array' THEN n.content::json ELSE '[]'::json END
+            ) WITH ORDINALITY AS b(value, ordinality)
+            ON CONFLICT DO NOTHING;
+            UPDATE notes SET block_count = (SELECT count(*) FROM note_blocks WHERE note_blocks.note_id = notes.id);
+            ALTER TABLE notes ALTER COLUMN content DROP NOT NULL;
+            ALTER TABLE notes RENAME COLUMN content TO content_legacy_json;
+        END IF;
+    END $$
+    """,
+    # Версия токенов пользователя (отзыв всех выданных токенов)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+    # Счетчик изменений данных пользователя для ETag (условные GET)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS content_version BIGINT NOT NULL DEFAULT 0",
+    # Чтение последнего AI-контента каждого типа для заметки
+    "CREATE INDEX IF NOT EXISTS ix_ai_content_note_type_created "
+    "ON ai_generated_content (note_id, content_type, created_at DESC)",
+    # Мягкое удаление заметок и папок с фоновой очисткой
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP",
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS purged_at TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS ix_notes_purge_pending ON notes (deleted_at) "
+    "WHERE deleted_at IS NOT NULL AND purged_at IS NULL",
+    "ALTER TABLE folders ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_folders_user_name_live ON folders (user_id, name) "
+    "WHERE deleted_at IS NULL",
+    "ALTER TABLE folders DROP CONSTRAINT IF EXISTS _user_folder_uc",
+    # Хэш текста заметки и число токенов; у старых заметок остаются NULL
+    # и считаются при первом обращении (api/ai_tasks.py)
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS content_hash TEXT",
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS token_count INTEGER",
+    # Копия всего текста в notes.plain_text больше не хранится (текст — только в note_blocks),
+    # а content_hash стал цепочечным: хэши, посчитанные по старой колонке, сбрасываются.
+    # Выполняется один раз — пока колонка еще есть
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'notes' AND column_name = 'plain_text'
+        ) THEN
+            UPDATE notes SET content_hash = NULL, token_count = NULL;
+            ALTER TABLE notes DROP COLUMN plain_text;
+        END IF;
+    END $$
+    """,
+    # Очищенные надгробия не держат файлов: убираем file_sha256 и строки note_files,
+    # которые возвращала им прежняя версия переноса ссылок (refcount за ними не стоял)
+    "UPDATE notes SET file_sha256 = NULL WHERE purged_at IS NOT NULL AND file_sha256 IS NOT NULL",
+    "DELETE FROM note_files USING notes WHERE notes.id = note_files.note_id AND notes.purged_at IS NOT NULL",
+    # Текст блоков — в BYTEA (db/types.CompressedText); прежняя колонка text остается
+    # для еще не перенесенных блоков (services/block_compactor.py). Уже сжатые значения
+    # PostgreSQL не пытается сжимать повторно (STORAGE EXTERNAL). Только метаданные —
+    # таблица не переписывается
+    "ALTER TABLE note_blocks ADD COLUMN IF NOT EXISTS body BYTEA",
+    "ALTER TABLE note_blocks ALTER COLUMN body SET STORAGE EXTERNAL",
+    "ALTER TABLE note_blocks ALTER COLUMN text DROP NOT NULL",
+    "INSERT INTO maintenance_checkpoints (name) VALUES ('note_blocks.body') ON CONFLICT DO NOTHING",
+]
+
+
+def run_migrations(engine: Engine):
+    """Применяет все миграции из списка MIGRATIONS."""
+    with engine.begin() as connection:
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
@@ -1,11 +1,12 @@
 # file: db/models.py
 
 import enum
-from sqlalchemy import (Column, Integer, Text, JSON, Enum as SQLAlchemyEnum,
-                        ForeignKey, TIMESTAMP, func, UniqueConstraint)
+from sqlalchemy import (Column, Integer, BigInteger, Float, Text, JSON, Enum as SQLAlchemyEnum,
+                        ForeignKey, TIMESTAMP, func, Index)
 from sqlalchemy.orm import relationship
 
 from .database import Base
+from .types import CompressedText, unpack_legacy_text
 
 class NoteType(str, enum.Enum):
     TEXT = "text"
@@ -21,6 +22,10 @@ class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Text, unique=True, index=True, nullable=False)
+    # Версия токенов: выданные раньше токены (с меньшим "ver") перестают приниматься
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Счетчик изменений заметок, папок и AI-контента пользователя — основа ETag списков
+    content_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     created_at = Column(TIMESTAMP, server_default=func.now())
     notes = relationship("Note", back_populates="owner", cascade="all, delete-orphan")
     folders = relationship("Folder", back_populates="owner", cascade="all, delete-orphan")
@@ -31,25 +36,141 @@ class Folder(Base):
     name = Column(Text, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    # Мягкое удаление: папка скрыта сразу, строку удаляет фоновая очистка (services/purger.py)
+    deleted_at = Column(TIMESTAMP, nullable=True)
     owner = relationship("User", back_populates="folders")
     notes = relationship("Note", back_populates="folder")
-    __table_args__ = (UniqueConstraint('user_id', 'name', name='_user_folder_uc'),)
+    __table_args__ = (
+        # Имя уникально только среди неудаленных папок: удаленное имя можно сразу занять снова
+        Index("uq_folders_user_name_live", "user_id", "name", unique=True,
+              postgresql_where=deleted_at.is_(None)),
+    )
 
 class Note(Base):
     __tablename__ = "notes"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(Text, nullable=False)
     type = Column(SQLAlchemyEnum(NoteType), nullable=False)
-    content = Column(JSON, nullable=True)
+    # Число блоков содержимого (сами блоки — в note_blocks); следующий блок получает эту позицию
+    block_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Цепочечный SHA-256 текстов блоков (core/text_stats.content_hash) и число токенов
+    # всего текста — поддерживаются при записи (db/crud.py) по одним только новым блокам.
+    # NULL — еще не подсчитано (заметки до появления колонок), считается при первом обращении
+    content_hash = Column(Text, nullable=True)
+    token_count = Column(Integer, nullable=True)
     source_uri = Column(Text, nullable=True)
+    # SHA-256 основного загруженного файла (для заметок из файлов) — ключ в uploaded_files.
+    # Полный список файлов заметки (например, нескольких фото) — в note_files
+    file_sha256 = Column(Text, nullable=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     folder_id = Column(Integer, ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, index=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+    # Мягкое удаление: заметка скрыта из всех запросов сразу, а векторы, блоки,
+    # AI-контент и ссылки на файлы фоновая очистка удаляет позже и ставит purged_at.
+    # Сама строка остается "надгробием" еще PURGE_TOMBSTONE_RETENTION_DAYS.
+    deleted_at = Column(TIMESTAMP, nullable=True)
+    purged_at = Column(TIMESTAMP, nullable=True)
     owner = relationship("User", back_populates="notes")
     folder = relationship("Folder", back_populates="notes")
     # --- ДОБАВЛЯЕМ СВЯЗЬ С НОВОЙ ТАБЛИЦЕЙ ---
     ai_content = relationship("AIGeneratedContent", back_populates="note", cascade="all, delete-orphan")
+    blocks = relationship(
+        "NoteBlock", order_by="NoteBlock.position",
+        cascade="all, delete-orphan", passive_deletes=True,
+    )
+
+    @property
+    def content(self) -> list:
+        """Содержимое заметки в виде списка блоков-словарей (собирается из note_blocks)."""
+        return [block.to_dict() for block in self.blocks]
+
+    __table_args__ = (
+        # Списки заметок постранично по (updated_at, id) — курсорная пагинация
+        Index("ix_notes_user_updated_id", "user_id", updated_at.desc(), id.desc()),
+        Index("ix_notes_user_folder_updated_id", "user_id", "folder_id", updated_at.desc(), id.desc()),
+        # Очередь фоновой очистки удаленных заметок
+        Index("ix_notes_purge_pending", "deleted_at",
+              postgresql_where=deleted_at.isnot(None) & purged_at.is_(None)),
+    )
+
+class NoteBlock(Base):
+    """
+    Блок содержимого заметки. Блоки только дописываются в конец: добавление —
+    это один INSERT, а не перезапись всего содержимого, и его цена не зависит
+    от размера заметки. Позиции идут подряд с нуля, поэтому большие заметки
+    можно читать диапазонами по первичному ключу.
+    """
+    __tablename__ = "note_blocks"
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    # "text" — обычный текст (TextBlock), "transcript" — фрагмент с временем (TranscriptBlock)
+    kind = Column(Text, nullable=False, default="text")
+    header = Column(Text, nullable=True)
+    sub_header = Column(Text, nullable=True)
+    # Текст блока (BYTEA; длинный текст — страницы PDF, транскрипции — сжат zstd, db/types.py).
+    # Блоки, записанные до этого, держат текст в прежней колонке text, пока фоновый
+    # перенос (services/block_compactor.py) не переложит его в body
+    legacy_text = Column("text", Text, nullable=True)
+    body = Column(CompressedText, nullable=True)
+    time_start = Column(Float, nullable=True)
+    page = Column(Integer, nullable=True)
+
+    @property
+    def text(self) -> str:
+        if self.body is not None:
+            return self.body
+        return unpack_legacy_text(self.legacy_text or "")
+
+    @text.setter
+    def text(self, value: str):
+        self.body = value
+        self.legacy_text = None
+
+    def to_dict(self) -> dict:
+        if self.kind == "transcript":
+            return {"time_start": self.time_start, "text": self.text}
+        return {"header": self.header, "sub_header": self.sub_header, "text": self.text, "page": self.page}
+
+class UploadedFile(Base):
+    """
+    Загруженный файл в хранилище, адресуемом по содержимому.
+    refcount — число ссылок на файл: заметок, полностью полученных загрузок по частям
+    и запросов, которые еще извлекают из него текст; при нуле файл можно удалить с диска.
+    """
+    __tablename__ = "uploaded_files"
+    sha256 = Column(Text, primary_key=True)
+    path = Column(Text, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+class NoteFile(Base):
+    """Файлы заметки: каждая строка держит одну ссылку в uploaded_files.refcount."""
+    __tablename__ = "note_files"
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    sha256 = Column(Text, primary_key=True)
+
+class UploadSession(Base):
+    """
+    Загрузка файла по частям (для больших аудио и PDF с мобильных клиентов).
+    Сами байты лежат во временном файле (services/chunked_uploads.py),
+    а здесь — параметры загрузки и ее статус: active -> uploaded -> completing -> completed.
+    В статусах uploaded и completing загрузка держит ссылку на файл в uploaded_files.
+    """
+    __tablename__ = "upload_sessions"
+    id = Column(Text, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(Text, nullable=False)
+    source_type = Column(Text, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    received_bytes = Column(BigInteger, nullable=False, default=0)
+    status = Column(Text, nullable=False, default="active")
+    file_sha256 = Column(Text, nullable=True)
+    file_path = Column(Text, nullable=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), index=True)
 
 # --- НОВАЯ ТАБЛИЦА ДЛЯ ХРАНЕНИЯ AI-КОНТЕНТА ---
 class AIGeneratedContent(Base):
@@ -67,4 +188,22 @@ class AIGeneratedContent(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     # Связь обратно к заметке
-    note = relationship("Note", back_populates="ai_content")
\ No newline at end of file
+    note = relationship("Note", back_populates="ai_content")
+
+    __table_args__ = (
+        # Последний результат каждого типа для заметки — чтение одним проходом по индексу
+        Index("ix_ai_content_note_type_created", "note_id", "content_type", created_at.desc()),
+    )
+
+class MaintenanceCheckpoint(Base):
+    """
+    Положение фонового прохода по большой таблице (например, переноса текста
+    блоков в сжатый формат): с какого ключа продолжать после перезапуска и
+    закончен ли проход. Строку блокирует тот процесс, который сейчас делает пачку.
+    """
+    __tablename__ = "maintenance_checkpoints"
+    name = Column(Text, primary_key=True)
+    # Ключ последней обработанной строки (JSON-список), NULL — проход еще не начинался
+    last_key = Column(JSON, nullable=True)
+    finished_at = Column(TIMESTAMP, nullable=True)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
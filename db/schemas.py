@@ -18,6 +18,7 @@ class AddTextSourceType(str, Enum):
     DOCX = "docx"
     AUDIO = "audio"
     RECORD = "record"
+    PHOTO = "photo"
 
 # --- Вспомогательные схемы (без изменений) ---
 
@@ -26,6 +27,8 @@ class TextBlock(BaseModel):
     header: Optional[str] = None
     sub_header: Optional[str] = None
     text: str
+    # Номер страницы исходного документа (для PDF)
+    page: Optional[int] = None
 
 class TranscriptBlock(BaseModel):
     """Схема для одного блока транскрипции аудио."""
@@ -85,6 +88,34 @@ class NoteCreate(NoteBase):
     """Схема для создания заметки (используется внутри кода)."""
     pass
 
+class FileReference(BaseModel):
+    """Ссылка заметки на файл в хранилище (используется внутри кода)."""
+    sha256: str
+    path: str
+    size: int
+
+# Сколько заметок можно обработать одним массовым запросом
+BULK_MAX_NOTE_IDS = 1000
+
+class BulkNoteIds(BaseModel):
+    """Список заметок для массовой операции (удаление, переиндексация)."""
+    note_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_NOTE_IDS)
+
+class BulkMoveNotes(BulkNoteIds):
+    """Массовый перенос заметок; folder_id = null убирает заметки из папки."""
+    folder_id: Optional[int] = None
+
+class BulkItemResult(BaseModel):
+    note_id: int
+    # "ok", "not_found" (нет такой заметки у пользователя) или "failed"
+    status: str
+
+class BulkResult(BaseModel):
+    """Результат массовой операции по каждому ID в порядке запроса."""
+    results: List[BulkItemResult]
+    succeeded: int
+    failed: int
+
 class NoteUpdate(BaseModel):
     """Схема для обновления заметки. Все поля опциональны."""
     title: Optional[str] = None
@@ -100,6 +131,82 @@ class Note(NoteBase):
     class Config:
         from_attributes = True
 
+class NoteSummary(BaseModel):
+    """Краткая информация о заметке для списков (без содержимого)."""
+    id: int
+    title: str
+    type: NoteType
+    source_uri: Optional[str] = None
+    folder_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+    class Config:
+        from_attributes = True
+
+class NoteListPage(BaseModel):
+    """Страница списка заметок; next_cursor передается в следующий запрос."""
+    items: List[NoteSummary]
+    next_cursor: Optional[str] = None
+
+class NoteBlockOut(BaseModel):
+    """Блок заметки при постраничном чтении: позиция и поля исходного блока."""
+    position: int
+    kind: str
+    header: Optional[str] = None
+    sub_header: Optional[str] = None
+    text: str
+    time_start: Optional[float] = None
+    page: Optional[int] = None
+    class Config:
+        from_attributes = True
+
+class NoteBlocksPage(BaseModel):
+    """Диапазон блоков заметки; next_start — позиция для следующего запроса."""
+    items: List[NoteBlockOut]
+    total: int
+    next_start: Optional[int] = None
+
+class NoteAppendResult(BaseModel):
+    """
+    Результат добавления текста в заметку: только новые блоки и их позиции.
+    Остальное содержимое клиент читает через GET /notes/{note_id}/blocks.
+    """
+    note_id: int
+    start_position: int
+    block_count: int
+    updated_at: datetime
+    items: List[NoteBlockOut]
+
+# --- Схемы для массового импорта ---
+
+class ImportItem(BaseModel):
+    """Одна строка NDJSON при импорте: текст, ссылка или YouTube URL."""
+    type: AddTextSourceType
+    data: str
+    title: Optional[str] = None
+    folder_id: Optional[int] = None
+
+# --- Схемы для загрузки файлов по частям ---
+
+class UploadSessionCreate(BaseModel):
+    """Схема для начала загрузки файла по частям."""
+    filename: str
+    source_type: AddTextSourceType
+    total_size: int = Field(..., gt=0, description="Полный размер файла в байтах")
+
+class UploadSession(BaseModel):
+    """Схема для отображения состояния загрузки по частям."""
+    id: str
+    filename: str
+    source_type: AddTextSourceType
+    total_size: int
+    received_bytes: int
+    status: str
+    part_size: int
+    note_id: Optional[int] = None
+    class Config:
+        from_attributes = True
+
 # --- Схемы для AI-задач ---
 
 class AITaskType(str, Enum):
@@ -127,6 +234,10 @@ class AIGeneratedContent(AIGeneratedContentBase):
     class Config:
         from_attributes = True
 
+class NoteDetail(Note):
+    """Заметка целиком; с ?embed=ai — вместе с последним AI-контентом каждого типа."""
+    ai_content: Optional[List[AIGeneratedContent]] = None
+
 # --- Схемы для Видео (без изменений) ---
 
 class VoiceName(str, Enum):
@@ -0,0 +1,97 @@
+# file: db/types.py
+
+import base64
+import threading
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # без zstandard новые значения пишутся несжатыми
+    zstandard = None
+
+# Первый байт значения — версия формата: 0 — текст в UTF-8 как есть, 1 — zstd-кадр
+_FORMAT_RAW = 0
+_FORMAT_ZSTD = 1
+
+# Контексты zstd не потокобезопасны — у каждого потока свои
+_local = threading.local()
+
+
+def _compressor():
+    if not hasattr(_local, "compressor"):
+        _local.compressor = zstandard.ZstdCompressor(level=settings.NOTE_BLOCK_ZSTD_LEVEL)
+    return _local.compressor
+
+
+def _decompressor():
+    if not hasattr(_local, "decompressor"):
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.decompressor
+
+
+def pack_text(value: str) -> bytes:
+    """
+    Представление текста в БД: байт версии формата и данные. Короче
+    NOTE_BLOCK_COMPRESSION_MIN_BYTES (или если сжатие не дает выигрыша) — сам
+    текст в UTF-8, длиннее — zstd.
+    """
+    raw = value.encode("utf-8")
+    if zstandard is not None and len(raw) >= settings.NOTE_BLOCK_COMPRESSION_MIN_BYTES:
+        compressed = _compressor().compress(raw)
+        if len(compressed) < len(raw):
+            return bytes([_FORMAT_ZSTD]) + compressed
+    return bytes([_FORMAT_RAW]) + raw
+
+
+def unpack_text(stored: bytes) -> str:
+    version, payload = stored[0], memoryview(stored)[1:]
+    if version == _FORMAT_RAW:
+        return str(payload, "utf-8")
+    if version == _FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Текст блока сжат zstd, но пакет zstandard не установлен.")
+        return str(_decompressor().decompress(payload), "utf-8")
+    raise ValueError(f"Неизвестная версия формата сжатого текста: {version!r}")
+
+
+# Прежний формат колонки note_blocks.text (TEXT): "\x01" + версия ("0" — как есть,
+# "1" — zstd в base64) + данные; значения без маркера — обычный текст
+_LEGACY_MARKER = "\x01"
+
+
+def unpack_legacy_text(stored: str) -> str:
+    """Текст блока из старой колонки note_blocks.text (до переноса в body)."""
+    if not stored.startswith(_LEGACY_MARKER):
+        return stored
+    version, payload = stored[1:2], stored[2:]
+    if version == "0":
+        return payload
+    if version == "1":
+        return unpack_text(bytes([_FORMAT_ZSTD]) + base64.b64decode(payload))
+    raise ValueError(f"Неизвестная версия формата сжатого текста: {version!r}")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Текст, который хранится в BYTEA сжатым zstd, если он достаточно длинный
+    (формат — pack_text). Встроенное сжатие TOAST (pglz) срабатывает только для
+    строк длиннее ~2 КБ и сжимает хуже zstd; уже сжатые значения колонку держат
+    со STORAGE EXTERNAL, чтобы PostgreSQL не пытался сжать их повторно.
+    Замеры против одного TOAST — scripts/bench_block_compression.py.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return pack_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return unpack_text(value)
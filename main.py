@@ -4,20 +4,32 @@
 print("--- Starting main.py ---")
 
 import os
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, Query, status, HTTPException
+import secrets
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Header, status, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
 
 # Импортируем наши модули и роутеры
-from db.database import engine, get_db
-from db import models, crud
-from api import auth, folders, notes, video, ai_tasks
+from db.database import AsyncSessionLocal, async_engine, engine
+from db import models, crud_async
+from db.migrations import run_migrations
+from api import auth, folders, notes, video, ai_tasks, uploads, imports, exports
 
 # --- НОВЫЕ ИМПОРТЫ ДЛЯ WEBSOCKET ---
 from api.connection_manager import manager
-from api.auth_dependency import get_current_user # Нам нужна эта функция для проверки токена
+from api.auth_dependency import authenticate_token # Нам нужна эта функция для проверки токена
 # ------------------------------------
+from core.metrics import metrics
+from core.compression import CompressionMiddleware
+from api.db_routing import ReadYourWritesMiddleware
+from core.config import settings
+from core import executors
+from services.http_fetcher import http_fetcher
+from services.purger import purger
+from services.block_compactor import block_compactor
 
 
 # --- Инициализация ---
@@ -26,12 +38,36 @@ print("--- Initializing application ---")
 # 1. Создаем таблицы в базе данных
 try:
     models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("--- Database tables checked/created successfully ---")
 except Exception as e:
     print(f"--- CRITICAL: Failed to connect to database or create tables. Error: {e} ---")
 
+
+# --- Запуск и остановка приложения ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Запускает фоновую очистку удаленных заметок и перенос старых блоков в сжатый
+    формат, а при остановке останавливает фоновые задачи, закрывает пулы HTTP-
+    и DB-соединений и пулы потоков.
+    """
+    purger.start()
+    if settings.BLOCK_COMPACTION_ENABLED:
+        block_compactor.start()
+    try:
+        yield
+    finally:
+        await purger.stop()
+        await block_compactor.stop()
+        await http_fetcher.aclose()
+        await async_engine.dispose()
+        executors.shutdown_all()
+
+
 # 2. Создаем основной объект приложения FastAPI
 app = FastAPI(
+    lifespan=lifespan,
     title="AI Note Taker API",
     description="Бэкэнд для умного приложения по ведению заметок с функциями OpenAI.",
     version="2.0.0",
@@ -60,6 +96,16 @@ app.add_middleware(
 )
 print("--- CORS middleware configured ---")
 
+# Сжатие больших ответов (gzip / brotli по Accept-Encoding); потоковые ответы не трогаются
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_BYTES,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+)
+# Чтения клиента сразу после его записи идут в основную БД, а не на реплику
+app.add_middleware(ReadYourWritesMiddleware)
+
 
 # --- Монтирование статических директорий ---
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -73,6 +119,9 @@ app.include_router(folders.router)
 app.include_router(notes.router)
 app.include_router(video.router)
 app.include_router(ai_tasks.router)
+app.include_router(uploads.router)
+app.include_router(imports.router)
+app.include_router(exports.router)
 print("--- REST API routers included ---")
 
 
@@ -88,44 +137,41 @@ async def websocket_endpoint(
     """
     Эндпоинт для совместного редактирования заметки в реальном времени.
     """
-    # Создаем сессию БД вручную для этого соединения
-    db = next(get_db())
-    user = None
-    try:
+    # Создаем асинхронную сессию БД вручную: проверки не блокируют event loop,
+    # а соединение возвращается в пул сразу после них, не дожидаясь конца сессии
+    async with AsyncSessionLocal() as db:
         # Шаг 1: Аутентификация пользователя по токену из query-параметра
-        user = get_current_user(token=token, db=db)
-    
-        if not user:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
+        user = await authenticate_token(db, token)
 
         # Шаг 2: Проверка, что заметка существует и принадлежит пользователю
-        note = crud.get_note_by_id(db, note_id=int(note_id), user_id=user.id)
-        if not note:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        # Шаг 3: Подключение к "комнате" для этой заметки
-        await manager.connect(websocket, note_id)
-        print(f"WebSocket connection established for user {user.id} to note {note_id}")
-        
-        try:
-            # Шаг 4: Бесконечный цикл для приема и отправки сообщений
-            while True:
-                data = await websocket.receive_text()
-                # Рассылаем полученные данные всем остальным участникам в "комнате"
-                await manager.broadcast(data, note_id, websocket)
-        except WebSocketDisconnect:
-            # Шаг 5: Отключение при разрыве соединения
-            manager.disconnect(websocket, note_id)
-            print(f"WebSocket connection closed for user {user.id} from note {note_id}")
-            
-    except HTTPException:
-        # Если токен невалиден, get_current_user вызовет HTTPException
+        note = None
+        if user and note_id.isdigit():
+            note = await crud_async.get_note_by_id(db, note_id=int(note_id), user_id=user.id, with_blocks=False)
+
+    if not user or not note:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Шаг 3: Подключение к "комнате" для этой заметки
+    await manager.connect(websocket, note_id)
+    print(f"WebSocket connection established for user {user.id} to note {note_id}")
+
+    try:
+        # Шаг 4: Бесконечный цикл для приема и отправки сообщений
+        while True:
+            data = await websocket.receive_text()
+            if not manager.is_connected(websocket, note_id):
+                # Менеджер отключил клиента как медленного и уже закрыл соединение
+                break
+            # Рассылаем полученные данные всем остальным участникам в "комнате"
+            # (сообщения встают в очереди участников, отправка идет в их собственных задачах)
+            manager.broadcast(data, note_id, websocket)
+    except WebSocketDisconnect:
+        pass
     finally:
-        # Убеждаемся, что сессия БД всегда закрывается
-        db.close()
+        # Шаг 5: Отключение при разрыве соединения
+        manager.disconnect(websocket, note_id)
+        print(f"WebSocket connection closed for user {user.id} from note {note_id}")
 
 
 # --- Корневой эндпоинт ---
@@ -134,4 +180,16 @@ def read_root():
     return {"status": "ok", "message": "Welcome to AI Note Taker API v2.0!"}
 
 
+# --- Метрики процесса (кэши, загрузки и т.д.) ---
+# Внутренние счетчики (пулы, очереди, объемы очистки и импорта) не публичны:
+# эндпоинт работает, только если задан METRICS_TOKEN, и требует его в заголовке
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+def read_metrics(x_metrics_token: Optional[str] = Header(None)):
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_metrics_token is None or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token")
+    return metrics.snapshot()
+
+
 print("--- main.py loaded successfully. Uvicorn will now start the server. ---")
\ No newline at end of file
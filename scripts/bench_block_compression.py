@@ -0,0 +1,127 @@
+# file: scripts/bench_block_compression.py
+
+"""
+Замер сжатия текста блоков (db/types.CompressedText) против встроенного сжатия
+PostgreSQL (TOAST): размер таблицы и чтение карточки заметки из БД.
+
+В указанной базе создаются две временные таблицы с колонками note_blocks: в одной
+текст лежит в TEXT и сжимается только TOAST, в другой — в BYTEA через
+CompressedText. Для каждой печатается pg_total_relation_size после VACUUM и
+медиана времени "прочитать блоки заметки + собрать ответ", как в GET /notes/{id}.
+Потом таблицы удаляются.
+
+Текст берется из файла (например, настоящей транскрипции или текста PDF), а без
+аргумента — синтетический, как в scripts/bench_serialization.py. Синтетический
+текст из небольшого словаря сжимается лучше настоящего, поэтому для выводов нужен
+реальный файл. Размер блока — 4000 символов (страница PDF) или, например, 500
+(30-секундный фрагмент транскрипции: такие строки TOAST не сжимает вовсе).
+
+Запуск из корня проекта, DATABASE_URL — отдельная (не рабочая) база PostgreSQL:
+    DATABASE_URL=postgresql://... python scripts/bench_block_compression.py [файл.txt] [символов_в_блоке] [повторов]
+"""
+
+import random
+import statistics
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, Text, func, insert, select, text
+
+from api.responses import FastJSONResponse, note_to_dict
+from core.config import settings
+from db import models
+from db.database import engine
+from db.types import CompressedText, zstandard
+
+WORDS = "конспект лекции транскрипция страница документа пример текста note page summary".split()
+# Блоки делятся на столько заметок; читается одна из них
+NOTES = 10
+
+metadata = MetaData()
+toast_table = Table(
+    "bench_blocks_toast", metadata,
+    Column("note_id", Integer, primary_key=True), Column("position", Integer, primary_key=True),
+    Column("kind", Text), Column("header", Text), Column("sub_header", Text),
+    Column("text", Text), Column("time_start", Float), Column("page", Integer),
+)
+zstd_table = Table(
+    "bench_blocks_zstd", metadata,
+    Column("note_id", Integer, primary_key=True), Column("position", Integer, primary_key=True),
+    Column("kind", Text), Column("header", Text), Column("sub_header", Text),
+    Column("text", CompressedText), Column("time_start", Float), Column("page", Integer),
+)
+
+
+def load_text(path: str) -> str:
+    if path:
+        with open(path, encoding="utf-8") as source:
+            return source.read()
+    rng = random.Random(42)
+    return " ".join(rng.choice(WORDS) for _ in range(150_000))
+
+
+def measure(fn, repeats: int) -> float:
+    """Медиана времени в миллисекундах."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def note_detail(connection, table: Table, note_id: int) -> bytes:
+    """Блоки заметки из БД + сборка ответа (ORM -> dict + orjson), как в GET /notes/{id}."""
+    rows = connection.execute(
+        select(table.c.position, table.c.text).where(table.c.note_id == note_id).order_by(table.c.position)
+    ).all()
+    blocks = [models.NoteBlock(position=row.position, kind="text", text=row.text) for row in rows]
+    note = models.Note(id=note_id, title="Заметка", type=models.NoteType.PDF, user_id=1, block_count=len(blocks), blocks=blocks)
+    return FastJSONResponse(note_to_dict(note)).body
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else ""
+    block_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    if zstandard is None:
+        print("Пакет zstandard не установлен — сжатие выключено.")
+        return
+
+    source = load_text(path)
+    texts = [source[start:start + block_chars] for start in range(0, len(source), block_chars)]
+    per_note = len(texts) // NOTES + 1
+    rows = [
+        {"note_id": index // per_note, "position": index % per_note, "kind": "text", "text": block}
+        for index, block in enumerate(texts)
+    ]
+    raw_bytes = sum(len(block.encode("utf-8")) for block in texts)
+
+    print(f"Текст: {'файл ' + path if path else 'синтетический'}, {len(texts)} блоков по {block_chars} символов, "
+          f"{raw_bytes} байт")
+    print(f"  порог сжатия {settings.NOTE_BLOCK_COMPRESSION_MIN_BYTES} байт, zstd уровня {settings.NOTE_BLOCK_ZSTD_LEVEL}")
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            # Как в db/migrations.py для note_blocks.body: уже сжатое TOAST повторно не сжимает
+            connection.execute(text("ALTER TABLE bench_blocks_zstd ALTER COLUMN text SET STORAGE EXTERNAL"))
+            connection.execute(insert(toast_table), rows)
+            connection.execute(insert(zstd_table), rows)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE bench_blocks_toast"))
+            connection.execute(text("VACUUM ANALYZE bench_blocks_zstd"))
+            for label, table in (("TEXT + TOAST", toast_table), ("BYTEA + zstd", zstd_table)):
+                size = connection.execute(select(func.pg_total_relation_size(table.name))).scalar_one()
+                detail_ms = measure(lambda: note_detail(connection, table, note_id=1), repeats)
+                print(f"  {label:13} таблица {size:>10} байт ({size / raw_bytes:6.1%} текста), "
+                      f"карточка заметки ({per_note} блоков) {detail_ms:7.2f} мс")
+    finally:
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
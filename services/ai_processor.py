@@ -1,37 +1,53 @@
 # file: services/ai_processor.py
 
-from openai import AsyncOpenAI, OpenAI # <-- ДОБАВЛЯЕМ СИНХРОННЫЙ OpenAI В ИМПОРТ
 from core.config import settings
+from core.executors import io_executor
+from services import llm_provider
 from typing import List, Dict, Any
 import os
 import json
 
 # --- Инициализация АСИНХРОННОГО клиента OpenAI ---
 try:
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    print("Async OpenAI client initialized successfully.")
+    client = llm_provider.create_async_client()
+    print(f"Async OpenAI client initialized successfully (provider: {settings.LLM_PROVIDER}).")
 except Exception as e:
     client = None
     print(f"CRITICAL: Could not initialize OpenAI client. Error: {e}")
 
 
-# --- Функция для транскрибации аудио (теперь работает правильно) ---
-def transcribe_audio_with_whisper(file_path: str) -> str:
-    # Для синхронной функции создаем временный синхронный клиент
+# --- Функция для транскрибации аудио ---
+# При ошибке транскрибация возвращает текст с этим префиксом (он попадает в заметку)
+TRANSCRIPTION_ERROR_PREFIX = "Ошибка транскрибации аудио:"
+
+
+def is_transcription_error(text: str) -> bool:
+    """Отличает сообщение об ошибке от настоящей транскрипции (например, чтобы не кэшировать его)."""
+    return text.startswith(TRANSCRIPTION_ERROR_PREFIX)
+
+
+def _read_file_bytes(file_path: str) -> bytes:
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+
+async def transcribe_audio_with_whisper(file_path: str) -> str:
+    # Используем общий асинхронный клиент: пока Whisper работает, поток не занят
     try:
-        # Используем импортированный синхронный клиент
-        sync_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        if not client:
+            raise ConnectionError("OpenAI client is not initialized.")
         print(f"--- Transcribing audio file: {file_path} with Whisper ---")
-        with open(file_path, "rb") as audio_file:
-            transcript = sync_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
+        # Чтение с диска — блокирующая операция, отправляем ее в пул ввода-вывода
+        audio_bytes = await io_executor.run(_read_file_bytes, file_path)
+        transcript = await client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(os.path.basename(file_path), audio_bytes),
+            response_format="text"
+        )
         return transcript
     except Exception as e:
         print(f"Error during Whisper transcription: {e}")
-        return f"Ошибка транскрибации аудио: {e}"
+        return f"{TRANSCRIPTION_ERROR_PREFIX} {e}"
 
 
 # --- Функции для генерации контента с помощью ChatGPT (без изменений) ---
@@ -0,0 +1,78 @@
+# file: services/block_compactor.py
+
+import asyncio
+from typing import Optional
+
+from core.config import settings
+from core.executors import io_executor
+from core.metrics import metrics
+from db import crud
+from db.database import SessionLocal
+
+
+class BlockCompactor:
+    """
+    Фоновый перенос текста блоков, записанных до CompressedText, из прежней
+    колонки note_blocks.text в сжатую колонку body.
+
+    Проход идет пачками по первичному ключу; ключ последней пачки сохраняется в
+    maintenance_checkpoints в той же транзакции, поэтому после перезапуска проход
+    продолжается с того же места, а законченный больше не запускается (при старте —
+    одно чтение строки положения). Пачку в каждый момент делает один процесс,
+    остальные ждут interval_seconds. Блоки неизменяемы, так что перенос не
+    конфликтует с запросами пользователей. Объем работы — в /metrics как block_compaction.*.
+    """
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def compact_batch(self) -> Optional[bool]:
+        """Одна пачка (блокирующая). True — проход закончен, None — пачку делает другой процесс."""
+        db = SessionLocal()
+        try:
+            result = crud.compact_note_blocks(db, limit=self.batch_size)
+        finally:
+            db.close()
+        if result is None:
+            return None
+        finished, rows, bytes_before, bytes_after = result
+        metrics.inc("block_compaction.rows_moved", rows)
+        metrics.inc("block_compaction.bytes_before", bytes_before)
+        metrics.inc("block_compaction.bytes_after", bytes_after)
+        return finished
+
+    async def run(self):
+        """Полная пачка — сразу следующая; занято другим процессом или ошибка — пауза interval_seconds."""
+        while True:
+            try:
+                finished = await io_executor.run(self.compact_batch)
+            except Exception as e:
+                metrics.inc("block_compaction.errors")
+                print(f"--- ERROR: note block compaction failed: {e} ---")
+                finished = None
+            if finished:
+                print("--- Note block compaction finished ---")
+                return
+            if finished is None:
+                await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+block_compactor = BlockCompactor(
+    interval_seconds=settings.BLOCK_COMPACTION_INTERVAL_SECONDS,
+    batch_size=settings.BLOCK_COMPACTION_BATCH_SIZE,
+)
@@ -0,0 +1,133 @@
+# file: services/chunked_uploads.py
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional
+
+from core.executors import io_executor
+from core.metrics import metrics
+from services.file_references import file_references
+from services.storage import StoredFile, UploadTooLargeError
+
+
+@dataclass
+class _UploadState:
+    """Состояние загрузки в памяти процесса: блокировка и накопленный хэш."""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    digest: Optional["hashlib._Hash"] = field(default_factory=hashlib.sha256)
+    # Сколько байт от начала файла уже учтено в digest
+    hashed_bytes: int = 0
+
+
+class ChunkedUploadManager:
+    """
+    Хранилище частично загруженных файлов для загрузки по частям.
+
+    Части дописываются в файл <base_path>/<upload_id>.part строго по порядку:
+    размер этого файла на диске и есть "сколько уже получено", поэтому после
+    обрыва связи клиент просто спрашивает текущее смещение и продолжает с него.
+    Хэш считается на лету; если процесс перезапускался и накопленный хэш
+    потерян, он пересчитывается одним проходом по файлу при завершении.
+    """
+    def __init__(self, base_path: str = "upload_parts"):
+        self.base_path = base_path
+        os.makedirs(self.base_path, exist_ok=True)
+        self._states: Dict[str, _UploadState] = {}
+        metrics.register_gauge("chunked_uploads.in_memory_sessions", lambda: len(self._states))
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.base_path, f"{upload_id}.part")
+
+    def received_bytes(self, upload_id: str) -> int:
+        try:
+            return os.path.getsize(self.part_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def _state(self, upload_id: str) -> _UploadState:
+        state = self._states.get(upload_id)
+        if state is None:
+            state = _UploadState()
+            self._states[upload_id] = state
+        return state
+
+    def lock(self, upload_id: str) -> asyncio.Lock:
+        """Блокировка, не дающая двум запросам писать в одну загрузку одновременно."""
+        return self._state(upload_id).lock
+
+    async def append(self, upload_id: str, chunks: AsyncIterator[bytes], total_size: int) -> int:
+        """
+        Дописывает поток байт в конец загрузки. Вызывать под lock(upload_id).
+        В памяти в каждый момент находится только одна порция потока.
+
+        :return: Новый размер полученных данных (в том числе после обрыва потока).
+        """
+        state = self._state(upload_id)
+        path = self.part_path(upload_id)
+        received = self.received_bytes(upload_id)
+        if state.digest is not None and state.hashed_bytes != received:
+            # Хэш не соответствует файлу на диске (например, после перезапуска) — посчитаем позже
+            state.digest = None
+
+        buffer = await io_executor.run(open, path, "ab")
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if received + len(chunk) > total_size:
+                    raise UploadTooLargeError(total_size)
+                await io_executor.run(_write_and_hash, buffer, state.digest, chunk)
+                received += len(chunk)
+                if state.digest is not None:
+                    state.hashed_bytes = received
+                metrics.inc("chunked_uploads.bytes_received", len(chunk))
+        finally:
+            await io_executor.run(buffer.close)
+        return received
+
+    async def finalize(self, upload_id: str, filename: str) -> StoredFile:
+        """
+        Переносит полностью полученный файл в основное хранилище (адресация по хэшу)
+        и берет на него ссылку — ее держит загрузка, пока по ней не создана заметка.
+        """
+        state = self._state(upload_id)
+        path = self.part_path(upload_id)
+        size = self.received_bytes(upload_id)
+        if state.digest is not None and state.hashed_bytes == size:
+            sha256 = state.digest.hexdigest()
+        else:
+            metrics.inc("chunked_uploads.rehashed")
+            sha256 = await io_executor.run(_hash_file, path)
+        stored = await io_executor.run(file_references.commit_and_reference, path, sha256, size, filename)
+        self.forget(upload_id)
+        return stored
+
+    async def discard(self, upload_id: str):
+        """Удаляет частично загруженный файл и состояние загрузки."""
+        path = self.part_path(upload_id)
+        if os.path.exists(path):
+            await io_executor.run(os.remove, path)
+        self.forget(upload_id)
+
+    def forget(self, upload_id: str):
+        self._states.pop(upload_id, None)
+
+
+def _write_and_hash(buffer, digest, chunk: bytes):
+    if digest is not None:
+        digest.update(chunk)
+    buffer.write(chunk)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Один экземпляр на процесс
+chunked_uploads = ChunkedUploadManager()
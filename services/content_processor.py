@@ -1,17 +1,23 @@
 import docx
-import fitz
-import os
+from typing import List, Optional, Tuple
 
-# Импортируем наш рабочий модуль-помощник
-from . import youtube_helper
+from core.config import settings
+from core.executors import io_executor, pdf_process_pool
 
-def get_text_from_youtube(url: str):
+# Импортируем наши рабочие модули-помощники
+from . import youtube_helper, pdf_extractor
+
+async def get_transcript_from_youtube(url: str) -> Optional[List[dict]]:
     """
     Эта функция вызывается из notes.py.
-    Она просто передает URL в наш отлаженный модуль youtube_helper.
+    Возвращает субтитры видео блоками {"time_start", "text"} через youtube_helper.
+    youtube-transcript-api работает только синхронно (через requests),
+    поэтому вызов уходит в пул ввода-вывода и не блокирует event loop.
     """
-    print("--- content_processor: Вызываю youtube_helper.fetch_transcript ---")
-    return youtube_helper.fetch_transcript(url)
+    segments = await io_executor.run(youtube_helper.fetch_transcript_segments, url)
+    if not segments:
+        return None
+    return youtube_helper.group_segments(segments)
 
 
 def get_text_from_docx(file_path: str):
@@ -25,19 +31,18 @@ def get_text_from_docx(file_path: str):
         return None
 
 
-def get_text_from_pdf(file_path: str):
-    """Извлекает текст из PDF-файла."""
+def get_pages_from_pdf(file_path: str) -> Optional[List[Tuple[int, str]]]:
+    """
+    Извлекает текст PDF постранично: [(номер страницы, текст), ...].
+    Большие документы разбираются параллельно в пуле процессов, сканы без
+    текстового слоя отсекаются до полного разбора.
+    """
     try:
-        doc = fitz.open(file_path)
-        full_text = ""
-        for page in doc:
-            full_text += page.get_text()
-
-        if len(full_text.strip()) < 100:
-            print(f"PDF at {file_path} contains little or no extractable text.")
-            return None
-
-        return full_text
+        return pdf_extractor.extract_pdf_pages(
+            file_path, pdf_process_pool,
+            pages_per_task=settings.PDF_PAGES_PER_TASK,
+            sample_size=settings.PDF_SCAN_SAMPLE_PAGES,
+        )
     except Exception as e:
         print(f"Failed to process PDF file at {file_path}: {e}")
-        return None
\ No newline at end of file
+        return None
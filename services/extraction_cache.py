@@ -0,0 +1,96 @@
+# file: services/extraction_cache.py
+
+import json
+import os
+import uuid
+from typing import List, Optional, Tuple
+
+from core.metrics import metrics
+
+
+def read_json(path: str) -> Optional[dict]:
+    """Читает JSON-запись кэша; None, если записи нет или она повреждена."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Corrupted cache entry {path}: {e}")
+        return None
+
+
+def write_json_atomic(path: str, payload: dict):
+    """Пишет JSON атомарно: параллельный читатель не должен увидеть половину файла."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+class ExtractionCache:
+    """
+    Кэш результатов обработки файлов, адресуемый SHA-256 исходного содержимого.
+
+    Для каждого хэша на диске хранятся извлеченный текст и эмбеддинги его чанков,
+    поэтому повторная загрузка того же файла стоит одного прохода хэширования:
+    без разбора PDF/DOCX, без Whisper и без построения эмбеддингов.
+    """
+    def __init__(self, base_path: str = "cache/extraction"):
+        self.base_path = base_path
+        os.makedirs(self.base_path, exist_ok=True)
+
+    def _path(self, sha256: str, name: str) -> str:
+        # Раскладываем по подпапкам, чтобы в одной директории не копились тысячи файлов
+        return os.path.join(self.base_path, sha256[:2], f"{sha256}.{name}.json")
+
+    # --- Извлеченный текст (блоками) ---
+
+    def get_blocks(self, sha256: str, kind: str) -> Optional[List[dict]]:
+        """Возвращает блоки текста, ранее извлеченные из файла с этим хэшем способом kind."""
+        payload = read_json(self._path(sha256, f"text.{kind}"))
+        if payload is None:
+            metrics.inc("extraction_cache.text.misses")
+            return None
+        metrics.inc("extraction_cache.text.hits")
+        if "blocks" not in payload:
+            # Записи старого формата хранили текст одной строкой
+            return [{"text": payload.get("text", "")}]
+        return payload["blocks"]
+
+    def put_blocks(self, sha256: str, kind: str, blocks: List[dict]):
+        write_json_atomic(self._path(sha256, f"text.{kind}"), {"kind": kind, "blocks": blocks})
+
+    # --- Эмбеддинги чанков ---
+
+    def get_embeddings(self, sha256: str, model_name: str) -> Optional[Tuple[List[str], List[List[float]]]]:
+        """Возвращает (чанки, эмбеддинги), если они посчитаны той же моделью."""
+        payload = read_json(self._path(sha256, "embeddings"))
+        if payload is None or payload.get("model") != model_name:
+            metrics.inc("extraction_cache.embeddings.misses")
+            return None
+        metrics.inc("extraction_cache.embeddings.hits")
+        return payload["chunks"], payload["embeddings"]
+
+    def put_embeddings(self, sha256: str, model_name: str, chunks: List[str], embeddings: List[List[float]]):
+        write_json_atomic(
+            self._path(sha256, "embeddings"),
+            {"model": model_name, "chunks": chunks, "embeddings": embeddings},
+        )
+
+    def delete(self, sha256: str):
+        """Удаляет все записи для хэша (когда исходный файл больше никому не нужен)."""
+        directory = os.path.join(self.base_path, sha256[:2])
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(f"{sha256}."):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+# Один экземпляр на процесс
+extraction_cache = ExtractionCache()
@@ -0,0 +1,265 @@
+# file: services/fake_openai.py
+
+"""
+Детерминированная локальная заглушка OpenAI API для нагрузочного тестирования.
+
+Это обычное ASGI-приложение (FastAPI), которое говорит на том же "проводном"
+формате, что и OpenAI: /v1/chat/completions (в том числе stream=true) и
+/v1/audio/transcriptions. Ответы строятся из самого запроса, поэтому одинаковый
+вход всегда дает одинаковый результат, а summary / flashcards / quiz проходят
+те же проверки, что и ответы настоящего gpt-4o.
+
+Варианты запуска:
+  * внутри процесса: LLM_PROVIDER=fake (см. services/llm_provider.py);
+  * отдельным сервером: uvicorn services.fake_openai:app --port 8001
+    и LLM_BASE_URL=http://localhost:8001/v1.
+
+Задержки, доля ошибок и стриминг настраиваются через FAKE_LLM_* в core/config.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from core.config import settings
+
+app = FastAPI(title="Fake OpenAI API", docs_url=None, redoc_url=None)
+
+# Один генератор на процесс: при одинаковом порядке запросов последовательность
+# задержек и ошибок воспроизводится от запуска к запуску.
+_rng = random.Random(settings.FAKE_LLM_SEED)
+_rng_lock = threading.Lock()
+
+
+# --- Задержки и ошибки ---
+
+def _sample_latency_seconds() -> float:
+    """Возвращает задержку ответа согласно FAKE_LLM_LATENCY_DISTRIBUTION."""
+    mean = settings.FAKE_LLM_LATENCY_MS
+    jitter = settings.FAKE_LLM_LATENCY_JITTER_MS
+    distribution = settings.FAKE_LLM_LATENCY_DISTRIBUTION.lower()
+    with _rng_lock:
+        if distribution == "uniform":
+            value = _rng.uniform(mean - jitter, mean + jitter)
+        elif distribution == "normal":
+            value = _rng.gauss(mean, jitter)
+        elif distribution == "lognormal" and mean > 0:
+            # Подбираем параметры так, чтобы среднее совпадало с FAKE_LLM_LATENCY_MS,
+            # а jitter задавал стандартное отклонение — типичный "длинный хвост" LLM.
+            sigma2 = math.log1p((jitter / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            value = _rng.lognormvariate(mu, sigma2 ** 0.5)
+        else:
+            value = mean
+    return max(value, 0.0) / 1000
+
+
+def _sample_error() -> Optional[JSONResponse]:
+    """С вероятностью FAKE_LLM_ERROR_RATE возвращает ошибку в формате OpenAI."""
+    if settings.FAKE_LLM_ERROR_RATE <= 0:
+        return None
+    with _rng_lock:
+        if _rng.random() >= settings.FAKE_LLM_ERROR_RATE:
+            return None
+        rate_limited = _rng.random() < 0.5
+    if rate_limited:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit reached (fake).", "type": "rate_limit_exceeded", "param": None, "code": "rate_limit_exceeded"}},
+        )
+    return JSONResponse(
+        status_code=500,
+        content={"error": {"message": "The server had an error (fake).", "type": "server_error", "param": None, "code": None}},
+    )
+
+
+# --- Построение содержимого ответа ---
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def _extract_source_text(prompt: str) -> str:
+    """Достает текст между последними маркерами '---', которыми наши промпты обрамляют вход."""
+    parts = prompt.split("---")
+    if len(parts) >= 3:
+        return parts[-2].strip()
+    return prompt.strip()
+
+
+def _sentences(text: str) -> List[str]:
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+    return sentences or ["Пустой текст."]
+
+
+def _build_summary(text: str) -> Dict[str, Any]:
+    sentences = _sentences(text)
+    return {
+        "key_points": [s[:200] for s in sentences[:3]],
+        "conclusion": sentences[-1][:300],
+    }
+
+
+def _build_flashcards(text: str) -> List[Dict[str, str]]:
+    cards = []
+    for sentence in _sentences(text)[:5]:
+        words = re.findall(r"\w{4,}", sentence)
+        term = words[0] if words else sentence[:20]
+        cards.append({"term": term, "definition": sentence[:200]})
+    return cards
+
+
+def _build_quiz(text: str) -> Dict[str, Any]:
+    sentences = _sentences(text)
+    questions = []
+    for i, sentence in enumerate(sentences[:3]):
+        options = [s[:80] for s in sentences[i:i + 4]] or [sentence[:80]]
+        questions.append({
+            "question": f"Какое утверждение встречается в тексте (#{i + 1})?",
+            "options": options,
+            "correct_answer": options[0],
+            "explanation": sentence[:200],
+        })
+    return {"title": "Квиз по заметке", "questions": questions}
+
+
+def _build_reply(messages: List[Dict[str, Any]]) -> str:
+    """Определяет, какую из наших задач выполняет промпт, и строит подходящий ответ."""
+    prompt = ""
+    for message in messages:
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            prompt = message["content"]
+
+    text = _extract_source_text(prompt)
+    if "СЫРОЙ ТЕКСТ" in prompt:
+        # Очистка веб-страницы: "идеальный" парсер возвращает вход без изменений.
+        return text
+    if '"key_points"' in prompt:
+        return json.dumps(_build_summary(text), ensure_ascii=False)
+    if '"term"' in prompt:
+        return json.dumps(_build_flashcards(text), ensure_ascii=False)
+    if '"questions"' in prompt:
+        return json.dumps(_build_quiz(text), ensure_ascii=False)
+    return json.dumps({"echo": text[:500]}, ensure_ascii=False)
+
+
+def _count_tokens(text: str) -> int:
+    # Грубая оценка, как у tiktoken для смешанного текста: ~4 символа на токен
+    return max(1, len(text) // 4)
+
+
+# --- Эндпоинты ---
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    messages = payload.get("messages") or []
+    model = payload.get("model", "gpt-4o")
+
+    await asyncio.sleep(_sample_latency_seconds())
+    error = _sample_error()
+    if error is not None:
+        return error
+
+    content = _build_reply(messages)
+    completion_id = f"chatcmpl-fake-{_digest(model, json.dumps(messages, ensure_ascii=False))[:24]}"
+    created = int(time.time())
+    prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in messages)
+
+    if payload.get("stream"):
+        return StreamingResponse(
+            _stream_chunks(completion_id, created, model, content),
+            media_type="text/event-stream",
+        )
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "logprobs": None,
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _count_tokens(content),
+            "total_tokens": prompt_tokens + _count_tokens(content),
+        },
+    }
+
+
+async def _stream_chunks(completion_id: str, created: int, model: str, content: str):
+    """Отдает ответ в формате server-sent events, как это делает OpenAI при stream=true."""
+    def event(delta: Dict[str, Any], finish_reason: Optional[str]) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    yield event({"role": "assistant", "content": ""}, None)
+    step = max(1, settings.FAKE_LLM_STREAM_CHUNK_CHARS)
+    delay = settings.FAKE_LLM_STREAM_CHUNK_DELAY_MS / 1000
+    for start in range(0, len(content), step):
+        if delay:
+            await asyncio.sleep(delay)
+        yield event({"content": content[start:start + step]}, None)
+    yield event({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/audio/transcriptions")
+async def audio_transcriptions(
+    file: UploadFile = File(...),
+    model: str = Form("whisper-1"),
+    response_format: str = Form("json"),
+):
+    data = await file.read()
+
+    await asyncio.sleep(_sample_latency_seconds())
+    error = _sample_error()
+    if error is not None:
+        return error
+
+    digest = hashlib.sha256(data).hexdigest()
+    # Длительность "записи" условно считаем по размеру файла (~16 КБ на секунду)
+    duration = round(max(len(data) / 16000, 1.0), 2)
+    text = f"Фейковая транскрипция файла {file.filename} ({len(data)} байт, {digest[:12]})."
+
+    if response_format == "text":
+        return PlainTextResponse(text + "\n")
+    if response_format == "verbose_json":
+        return {
+            "task": "transcribe",
+            "language": "russian",
+            "duration": duration,
+            "text": text,
+            "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text}],
+        }
+    return {"text": text}
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [
+            {"id": name, "object": "model", "created": 0, "owned_by": "fake"}
+            for name in ("gpt-4o", "whisper-1")
+        ],
+    }
@@ -0,0 +1,79 @@
+# file: services/file_references.py
+
+from typing import Iterable, Optional
+
+from db import crud, schemas
+from db.database import SessionLocal
+from services.extraction_cache import extraction_cache
+from services.storage import StoredFile, file_storage
+
+
+class FileReferences:
+    """
+    Ссылки на файлы хранилища (uploaded_files.refcount) для всех, кто их держит:
+    заметок, полностью полученных загрузок по частям и запросов, которые еще
+    извлекают текст. Файл удаляется с диска, только когда ссылок не осталось.
+
+    Взятие ссылки и удаление файла выполняются под блокировкой его хэша
+    (crud.lock_stored_file), поэтому файл, который только что нашелся как дубликат,
+    не может быть удален до того, как на него встанет ссылка. Методы блокирующие —
+    вызывать в пуле io; у каждого своя короткая транзакция.
+    """
+
+    def commit_and_reference(self, temp_path: str, sha256: str, size: int, filename: Optional[str]) -> StoredFile:
+        """
+        Переносит временный файл в хранилище (или находит дубликат) и берет на него
+        ссылку — в одной заблокированной секции. Ссылку потом снимает release.
+        """
+        db = SessionLocal()
+        try:
+            crud.lock_stored_file(db, sha256)
+            stored = file_storage.commit_temp_file(temp_path, sha256, size, filename)
+            crud.add_file_reference(db, schemas.FileReference(sha256=stored.sha256, path=stored.path, size=stored.size))
+            db.commit()
+            return stored
+        finally:
+            db.close()
+
+    def release(self, stored_files: Iterable[Optional[StoredFile]]) -> int:
+        """
+        Снимает по одной ссылке с каждого файла (None пропускаются) и удаляет файлы,
+        на которые больше никто не ссылается. Возвращает число освобожденных байт.
+        """
+        bytes_reclaimed = 0
+        for stored in stored_files:
+            if stored is None:
+                continue
+            db = SessionLocal()
+            try:
+                crud.lock_stored_file(db, stored.sha256)
+                orphan = crud.release_file_reference(db, stored.sha256)
+                if orphan is not None:
+                    bytes_reclaimed += self._delete(orphan.sha256, orphan.path)
+                db.commit()
+            finally:
+                db.close()
+        return bytes_reclaimed
+
+    def delete_if_unreferenced(self, sha256: str, path: str) -> int:
+        """
+        Удаляет файл, если на него по-прежнему никто не ссылается (например, после
+        очистки заметок: между снятием последней ссылки и удалением файл мог
+        понадобиться новой загрузке). Возвращает число освобожденных байт.
+        """
+        db = SessionLocal()
+        try:
+            crud.lock_stored_file(db, sha256)
+            if crud.is_file_referenced(db, sha256):
+                return 0
+            return self._delete(sha256, path)
+        finally:
+            # Транзакция только читала: закрытие сессии откатывает ее и снимает блокировку
+            db.close()
+
+    def _delete(self, sha256: str, path: str) -> int:
+        extraction_cache.delete(sha256)
+        return file_storage.delete_file(path)
+
+
+file_references = FileReferences()
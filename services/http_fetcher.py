@@ -0,0 +1,132 @@
+# file: services/http_fetcher.py
+
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Параметры, которые не влияют на содержимое страницы (метки рекламных кампаний и т.п.)
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "igshid", "_ga", "ref_src"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Приводит URL к каноническому виду для ключей кэша:
+    схема и хост в нижнем регистре, без порта по умолчанию, без фрагмента,
+    без трекинговых параметров и с отсортированной строкой запроса.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path or "/"
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+@dataclass
+class FetchedPage:
+    """Загруженная страница вместе с валидаторами для условных запросов."""
+    url: str
+    final_url: str
+    content: bytes
+    content_type: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # Момент последней проверки актуальности (time.monotonic())
+    validated_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content).hexdigest()
+
+
+class HttpFetcher:
+    """
+    Общий слой загрузки веб-страниц: один асинхронный клиент с пулом соединений и кэш ответов
+    по нормализованному URL. Свежие ответы отдаются из памяти без запроса, устаревшие
+    перепроверяются условным запросом (If-None-Match / If-Modified-Since): на 304
+    тело берется из кэша.
+    """
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        self._responses = TTLCache(
+            "http_responses",
+            maxsize=settings.HTTP_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.HTTP_CACHE_TTL_SECONDS,
+            max_bytes=settings.HTTP_CACHE_MAX_BYTES,
+            sizeof=lambda page: len(page.content),
+        )
+
+    async def fetch(self, url: str) -> FetchedPage:
+        """
+        Загружает страницу с учетом кэша.
+        Ошибки сети и HTTP пробрасываются как httpx.HTTPError.
+        """
+        key = normalize_url(url)
+        cached: Optional[FetchedPage] = self._responses.get(key)
+        if cached and time.monotonic() - cached.validated_at < settings.HTTP_CACHE_FRESH_SECONDS:
+            metrics.inc("http_fetch.fresh_hits")
+            return cached
+
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        started = time.perf_counter()
+        response = await self.client.get(url, headers=headers)
+        metrics.inc("http_fetch.requests")
+        metrics.inc("http_fetch.seconds_total", time.perf_counter() - started)
+
+        if response.status_code == 304 and cached:
+            metrics.inc("http_fetch.revalidated")
+            cached.validated_at = time.monotonic()
+            self._responses.set(key, cached)
+            return cached
+
+        response.raise_for_status()
+        metrics.inc("http_fetch.downloaded_bytes", len(response.content))
+        page = FetchedPage(
+            url=url,
+            final_url=str(response.url),
+            content=response.content,
+            content_type=response.headers.get("Content-Type"),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" not in cache_control and len(page.content) <= settings.HTTP_CACHE_MAX_ITEM_BYTES:
+            self._responses.set(key, page)
+        return page
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Один общий экземпляр на процесс, чтобы соединения переиспользовались
+http_fetcher = HttpFetcher()
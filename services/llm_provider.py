@@ -0,0 +1,41 @@
+# file: services/llm_provider.py
+
+"""
+Единая точка создания клиентов OpenAI.
+
+Все сервисы (ai_processor, url_reader_helper) берут клиентов отсюда, поэтому
+провайдер переключается одной настройкой LLM_PROVIDER:
+  * "openai" — настоящий API (или любой совместимый по LLM_BASE_URL);
+  * "fake"   — встроенная заглушка services/fake_openai.py. Без LLM_BASE_URL
+               запросы уходят в ASGI-приложение прямо внутри процесса,
+               без сети и без расхода квоты.
+"""
+
+import httpx
+from openai import AsyncOpenAI
+
+from core.config import settings
+
+# Условный адрес, по которому клиенты "видят" встроенную заглушку
+FAKE_BASE_URL = "http://fake-openai.local/v1"
+FAKE_API_KEY = "sk-fake-local"
+
+
+def _use_in_process_fake() -> bool:
+    return settings.LLM_PROVIDER.lower() == "fake" and not settings.LLM_BASE_URL
+
+
+def _api_key() -> str | None:
+    if settings.LLM_PROVIDER.lower() == "fake":
+        return settings.OPENAI_API_KEY or FAKE_API_KEY
+    return settings.OPENAI_API_KEY
+
+
+def create_async_client() -> AsyncOpenAI:
+    """Создает асинхронный клиент для текущего провайдера."""
+    if _use_in_process_fake():
+        from services.fake_openai import app as fake_app
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app))
+        return AsyncOpenAI(api_key=_api_key(), base_url=FAKE_BASE_URL, http_client=http_client)
+    return AsyncOpenAI(api_key=_api_key(), base_url=settings.LLM_BASE_URL)
+
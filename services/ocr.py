@@ -0,0 +1,105 @@
+# file: services/ocr.py
+
+"""
+Распознавание текста на фотографиях.
+
+Движок выбирается настройкой OCR_BACKEND:
+  * "tesseract" — локальный Tesseract через pytesseract (нужны пакет pytesseract
+                  и бинарник tesseract с языками из OCR_LANGUAGES);
+  * "fake"      — детерминированная заглушка для тестов и нагрузочных прогонов:
+                  одинаковое изображение всегда дает одинаковый "текст".
+
+Перед распознаванием изображение декодируется один раз и сразу в уменьшенном
+размере (не больше OCR_MAX_IMAGE_SIDE по длинной стороне): фотографии с телефона
+в 12 Мп никогда не обрабатываются в полном разрешении.
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+
+from PIL import Image, ImageOps
+
+from core.config import settings
+from core.metrics import metrics
+
+
+def load_image_for_ocr(file_path: str, max_side: int) -> Image.Image:
+    """
+    Декодирует изображение в оттенках серого с длинной стороной не больше max_side.
+
+    Для JPEG draft() включает масштабирование прямо при декодировании (DCT scaling),
+    поэтому полноразмерный кадр в памяти не появляется. Ориентация из EXIF
+    применяется, иначе повернутый снимок распознается как мусор.
+    """
+    with Image.open(file_path) as image:
+        original_size = image.size
+        image.draft("L", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if image.size != original_size:
+        metrics.inc("ocr.images_downscaled")
+    return image
+
+
+class OcrBackend(ABC):
+    """Интерфейс движка распознавания."""
+    name = "base"
+
+    @abstractmethod
+    def recognize(self, image: Image.Image) -> str:
+        """Возвращает текст с уже уменьшенного изображения в оттенках серого."""
+
+
+class TesseractOcrBackend(OcrBackend):
+    name = "tesseract"
+
+    def __init__(self, languages: str):
+        try:
+            import pytesseract
+        except ImportError as e:
+            raise RuntimeError("Для OCR_BACKEND=tesseract установите пакет pytesseract и tesseract-ocr.") from e
+        self._pytesseract = pytesseract
+        self.languages = languages
+
+    def recognize(self, image: Image.Image) -> str:
+        return self._pytesseract.image_to_string(image, lang=self.languages)
+
+
+class FakeOcrBackend(OcrBackend):
+    """Возвращает текст, зависящий только от содержимого (уже уменьшенного) изображения."""
+    name = "fake"
+
+    def recognize(self, image: Image.Image) -> str:
+        digest = hashlib.sha256(image.tobytes()).hexdigest()
+        width, height = image.size
+        return f"Распознанный текст фотографии {width}x{height} ({digest[:12]})."
+
+
+_backend: OcrBackend | None = None
+
+
+def get_ocr_backend() -> OcrBackend:
+    """Движок распознавания, выбранный в настройках (создается один раз)."""
+    global _backend
+    if _backend is None:
+        if settings.OCR_BACKEND.lower() == "fake":
+            _backend = FakeOcrBackend()
+        else:
+            _backend = TesseractOcrBackend(settings.OCR_LANGUAGES)
+        print(f"OCR backend: {_backend.name}")
+    return _backend
+
+
+def recognize_image_file(file_path: str) -> str | None:
+    """Распознает текст на фотографии (блокирующий вызов, для пула parsing)."""
+    try:
+        image = load_image_for_ocr(file_path, settings.OCR_MAX_IMAGE_SIDE)
+        text = get_ocr_backend().recognize(image)
+        metrics.inc("ocr.images_recognized")
+        return text.strip() or None
+    except RuntimeError:
+        raise
+    except Exception as e:
+        print(f"Failed to recognize image at {file_path}: {e}")
+        return None
@@ -0,0 +1,80 @@
+# file: services/pdf_extractor.py
+
+import math
+from typing import Iterator, List, Optional, Tuple
+
+import fitz
+
+# Модуль импортируется в дочерних процессах пула (spawn), поэтому
+# на верхнем уровне здесь только fitz и стандартная библиотека.
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Выполняется в отдельном процессе: каждый воркер открывает свой документ."""
+    with fitz.open(file_path) as doc:
+        return [doc[index].get_text() for index in range(start, stop)]
+
+
+def _sample_indices(page_count: int, sample_size: int) -> List[int]:
+    """Равномерно распределенные по документу номера страниц (первая и последняя включены)."""
+    if page_count <= sample_size:
+        return list(range(page_count))
+    step = (page_count - 1) / (sample_size - 1)
+    return sorted({round(i * step) for i in range(sample_size)})
+
+
+def looks_scanned(doc: "fitz.Document", sample_size: int) -> bool:
+    """
+    Быстрая проверка на скан без текстового слоя: смотрим только шрифты
+    нескольких страниц. Страница без шрифтов не может содержать извлекаемый текст,
+    а список шрифтов читается без разбора содержимого страницы.
+    """
+    for index in _sample_indices(doc.page_count, max(sample_size, 2)):
+        if doc.get_page_fonts(index):
+            return False
+    return True
+
+
+def iter_pdf_pages(file_path: str, pool, pages_per_task: int, sample_size: int) -> Iterator[Tuple[int, str]]:
+    """
+    Выдает (номер страницы с 1, текст) строго по порядку страниц.
+
+    Диапазоны страниц разбираются параллельно в пуле процессов pool
+    (core.executors.BoundedProcessPool); результаты отдаются по мере готовности
+    очередного диапазона, не дожидаясь всего документа. Короткие документы
+    разбираются в текущем потоке: передача в процесс стоила бы дороже самого разбора.
+    Для сканов без текстового слоя ничего не выдается.
+    """
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        if page_count == 0 or looks_scanned(doc, sample_size):
+            print(f"PDF at {file_path} looks like a scan without a text layer, skipping extraction.")
+            return
+        if page_count <= pages_per_task:
+            for index in range(page_count):
+                yield index + 1, doc[index].get_text()
+            return
+
+    # Дробим так, чтобы даже документ средней длины занял все процессы пула
+    chunk = max(1, min(pages_per_task, math.ceil(page_count / pool.max_workers)))
+    futures = [
+        (start, pool.submit(_extract_page_range, file_path, start, min(start + chunk, page_count)))
+        for start in range(0, page_count, chunk)
+    ]
+    try:
+        for start, future in futures:
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        # Если потребитель остановился раньше (или упал разбор), не тратим ядра впустую
+        for _, future in futures:
+            future.cancel()
+
+
+def extract_pdf_pages(file_path: str, pool, pages_per_task: int, sample_size: int) -> Optional[List[Tuple[int, str]]]:
+    """Собирает непустые страницы документа; None, если текста практически нет."""
+    pages = [(number, text) for number, text in iter_pdf_pages(file_path, pool, pages_per_task, sample_size) if text.strip()]
+    if sum(len(text.strip()) for _, text in pages) < 100:
+        print(f"PDF at {file_path} contains little or no extractable text.")
+        return None
+    return pages
@@ -0,0 +1,91 @@
+# file: services/purger.py
+
+import asyncio
+from typing import Optional
+
+from core.config import settings
+from core.executors import io_executor
+from core.metrics import metrics
+from db import crud
+from db.database import SessionLocal
+from services.file_references import file_references
+from services.vector_store import vector_store
+
+
+class Purger:
+    """
+    Фоновая очистка удаленных заметок.
+
+    Удаление в API только ставит deleted_at и сразу отвечает. Этот цикл пачками
+    удаляет векторы (один запрос к ChromaDB на пачку), AI-контент, блоки и файлы,
+    на которые больше не ссылается ни одна заметка, затем — помеченные папки и
+    старые надгробия. Отставание и объем работы видны в /metrics как purge.*.
+    """
+    def __init__(self, interval_seconds: float, batch_size: int, retention_days: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+        self._backlog = 0
+        metrics.register_gauge("purge.backlog_notes", lambda: self._backlog)
+
+    def purge_once(self) -> int:
+        """Одна пачка очистки (блокирующая). Возвращает число очищенных заметок."""
+        db = SessionLocal()
+        try:
+            note_ids = crud.lock_notes_pending_purge(db, limit=self.batch_size)
+            if note_ids:
+                # Векторы удаляются, пока строки заблокированы: при ошибке ChromaDB
+                # транзакция откатится, и пачка будет повторена в следующий раз
+                vector_store.delete_notes(note_ids)
+                ai_deleted, orphans = crud.purge_notes(db, note_ids)
+                bytes_reclaimed = 0
+                for orphan in orphans:
+                    # Файл мог снова понадобиться загрузке после снятия последней ссылки
+                    bytes_reclaimed += file_references.delete_if_unreferenced(orphan.sha256, orphan.path)
+                metrics.inc("purge.notes_purged", len(note_ids))
+                metrics.inc("purge.ai_content_deleted", ai_deleted)
+                metrics.inc("purge.files_deleted", len(orphans))
+                metrics.inc("purge.bytes_reclaimed", bytes_reclaimed)
+
+            metrics.inc("purge.folders_purged", crud.purge_deleted_folders(db, limit=self.batch_size))
+            metrics.inc("purge.tombstones_deleted", crud.delete_purged_tombstones(
+                db, retention_days=self.retention_days, limit=self.batch_size
+            ))
+            self._backlog = crud.count_notes_pending_purge(db)
+            return len(note_ids)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Цикл очистки: полная пачка — сразу следующая, иначе пауза interval_seconds."""
+        while True:
+            try:
+                purged = await io_executor.run(self.purge_once)
+            except Exception as e:
+                metrics.inc("purge.errors")
+                print(f"--- ERROR: purge of deleted notes failed: {e} ---")
+                purged = 0
+            if purged < self.batch_size:
+                await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+purger = Purger(
+    interval_seconds=settings.PURGE_INTERVAL_SECONDS,
+    batch_size=settings.PURGE_BATCH_SIZE,
+    retention_days=settings.PURGE_TOMBSTONE_RETENTION_DAYS,
+)
@@ -0,0 +1,256 @@
+# file: services/readability.py
+
+"""
+Локальное извлечение основного контента веб-страницы (в духе Readability).
+
+Узлы DOM оцениваются по плотности текста (длина абзацев, количество запятых),
+по плотности ссылок и по "говорящим" class/id. Лучший кандидат вместе с
+подходящими соседями и есть статья. Вместе с текстом возвращается оценка
+уверенности: если она низкая, url_reader_helper досылает в GPT только
+усеченный фрагмент-кандидат, а не всю страницу.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+# Теги, которые никогда не содержат основного текста
+_JUNK_TAGS = ["script", "style", "noscript", "iframe", "svg", "canvas", "template",
+              "button", "input", "select", "textarea", "object", "embed"]
+
+# Блочные теги: после каждого ставим перенос строки, чтобы сохранить абзацы
+_BLOCK_TAGS = ["p", "div", "section", "article", "main", "li", "ul", "ol", "pre",
+               "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "td", "th",
+               "dd", "dt", "figcaption", "table", "header", "footer"]
+
+# Теги, чей текст считается "абзацем" при подсчете очков
+_PARAGRAPH_TAGS = ["p", "pre", "td", "blockquote", "li", "div"]
+
+_UNLIKELY = re.compile(
+    r"banner|breadcrumb|combx|comment|community|cookie|disqus|extra|footer|gdpr|header|"
+    r"legends|menu|modal|nav|popup|related|remark|replies|rss|share|shoutbox|sidebar|"
+    r"skyscraper|social|sponsor|subscribe|ad-break|agegate|pagination|pager|promo|widget",
+    re.I,
+)
+_MAYBE = re.compile(r"and|article|body|column|content|main|shadow|story|text|post|entry", re.I)
+_POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|post|text|blog|story", re.I)
+_NEGATIVE = re.compile(
+    r"-ad-|hidden|^hid$| hid$| hid |^hid |banner|combx|comment|com-|contact|footer|gdpr|"
+    r"masthead|media|meta|outbrain|promo|related|scroll|share|shoutbox|sidebar|skyscraper|"
+    r"sponsor|shopping|tags|tool|widget|nav|menu|cookie|subscribe",
+    re.I,
+)
+
+_MIN_PARAGRAPH_CHARS = 25
+_PARAGRAPH_BREAK = "\u2029"
+
+
+@dataclass
+class ExtractionResult:
+    """Результат локального извлечения."""
+    # Итоговый текст статьи (абзацы разделены пустой строкой)
+    text: str
+    # Уверенность в результате от 0 до 1
+    confidence: float
+    # Текст области-кандидата целиком — его и отправляем в GPT при низкой уверенности
+    candidate_text: str
+
+
+def _class_weight(tag: Tag) -> float:
+    weight = 0.0
+    for attr in (" ".join(tag.get("class") or []), tag.get("id") or ""):
+        if not attr:
+            continue
+        if _NEGATIVE.search(attr):
+            weight -= 25
+        if _POSITIVE.search(attr):
+            weight += 25
+    return weight
+
+
+def _initial_score(tag: Tag) -> float:
+    score = _class_weight(tag)
+    if tag.name in ("div", "article", "main"):
+        score += 5
+    elif tag.name in ("pre", "td", "blockquote"):
+        score += 3
+    elif tag.name in ("address", "ol", "ul", "dl", "dd", "dt", "li", "form"):
+        score -= 3
+    elif tag.name in ("h1", "h2", "h3", "h4", "h5", "h6", "th"):
+        score -= 5
+    if tag.name in ("article", "main"):
+        # Семантическая разметка — сильный сигнал
+        score += 15
+    return score
+
+
+def _text_length(tag: Tag) -> int:
+    return len(" ".join(tag.get_text(" ").split()))
+
+
+def _link_density(tag: Tag) -> float:
+    total = _text_length(tag)
+    if not total:
+        return 0.0
+    link_chars = sum(_text_length(a) for a in tag.find_all("a"))
+    return min(link_chars / total, 1.0)
+
+
+def _remove_unlikely(body: Tag) -> None:
+    """Удаляет явный "мусор": служебные теги, навигацию и блоки с подозрительными class/id."""
+    for junk in body.find_all(_JUNK_TAGS):
+        junk.decompose()
+    for tag in body.find_all(["nav", "aside", "footer"]):
+        tag.decompose()
+    for tag in body.find_all(True):
+        if tag.decomposed or tag.name in ("body", "article", "main", "a"):
+            continue
+        marker = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+        if marker.strip() and _UNLIKELY.search(marker) and not _MAYBE.search(marker):
+            tag.decompose()
+
+
+def _has_block_children(tag: Tag) -> bool:
+    return tag.find(["p", "div", "section", "article", "table", "ul", "ol", "pre", "blockquote"]) is not None
+
+
+def _score_candidates(body: Tag) -> Tuple[Dict[int, float], Dict[int, Tag]]:
+    """Раздает очки родителям абзацев; возвращает очки и сами узлы по id()."""
+    scores: Dict[int, float] = {}
+    nodes: Dict[int, Tag] = {}
+
+    def add(node: Optional[Tag], value: float) -> None:
+        if node is None or not isinstance(node, Tag) or node.name in ("html", "[document]"):
+            return
+        key = id(node)
+        if key not in scores:
+            scores[key] = _initial_score(node)
+            nodes[key] = node
+        scores[key] += value
+
+    for paragraph in body.find_all(_PARAGRAPH_TAGS):
+        # div без вложенных блоков фактически является абзацем
+        if paragraph.name == "div" and _has_block_children(paragraph):
+            continue
+        text = " ".join(paragraph.get_text(" ").split())
+        if len(text) < _MIN_PARAGRAPH_CHARS:
+            continue
+        value = 1 + text.count(",") + text.count("，") + min(len(text) / 100, 3)
+        parent = paragraph.parent
+        add(parent, value)
+        if parent is not None:
+            add(parent.parent, value / 2)
+
+    # Штрафуем узлы, состоящие в основном из ссылок
+    final = {key: score * (1 - _link_density(nodes[key])) for key, score in scores.items()}
+    return final, nodes
+
+
+def _collect_region(top: Tag, top_score: float, scores: Dict[int, float]) -> List[Tag]:
+    """Добирает к лучшему кандидату соседей, которые тоже похожи на часть статьи."""
+    parent = top.parent
+    if parent is None:
+        return [top]
+    threshold = max(10.0, top_score * 0.2)
+    region = []
+    for sibling in parent.children:
+        if not isinstance(sibling, Tag):
+            continue
+        if sibling is top:
+            region.append(sibling)
+            continue
+        score = scores.get(id(sibling), 0.0)
+        if score >= threshold:
+            region.append(sibling)
+            continue
+        if sibling.name == "p":
+            length = _text_length(sibling)
+            density = _link_density(sibling)
+            if (length > 80 and density < 0.25) or (0 < length <= 80 and density == 0 and "." in sibling.get_text()):
+                region.append(sibling)
+    return region
+
+
+def _region_text(tags: List[Tag]) -> List[str]:
+    """Превращает набор узлов в список абзацев без лишних пробелов."""
+    paragraphs: List[str] = []
+    for tag in tags:
+        # Границы блоков помечаем отдельным символом: переводы строк в самом HTML
+        # встречаются посреди абзацев и ориентироваться на них нельзя.
+        for br in tag.find_all("br"):
+            br.replace_with(NavigableString(_PARAGRAPH_BREAK))
+        for block in tag.find_all(_BLOCK_TAGS):
+            block.insert_after(NavigableString(_PARAGRAPH_BREAK))
+        for segment in tag.get_text().split(_PARAGRAPH_BREAK):
+            segment = " ".join(segment.split())
+            if segment:
+                paragraphs.append(segment)
+    return paragraphs
+
+
+def extract_main_content(soup: BeautifulSoup) -> ExtractionResult:
+    """
+    Находит основной контент страницы.
+
+    Внимание: функция изменяет переданное дерево (удаляет мусорные узлы).
+    """
+    body = soup.body or soup
+    title_tag = body.find("h1")
+    title = " ".join(title_tag.get_text(" ").split()) if title_tag else ""
+
+    _remove_unlikely(body)
+    page_length = _text_length(body)
+
+    scores, nodes = _score_candidates(body)
+    if not scores:
+        fallback = "\n\n".join(_region_text([body]))
+        return ExtractionResult(text=fallback, confidence=0.0, candidate_text=fallback)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    top_key, top_score = ranked[0]
+    top = nodes[top_key]
+
+    # Ближайший "конкурент", не вложенный в лучший узел и не содержащий его
+    runner_up = 0.0
+    top_parents = {id(p) for p in top.parents}
+    for key, score in ranked[1:]:
+        node = nodes[key]
+        if key in top_parents or top_key in {id(p) for p in node.parents}:
+            continue
+        runner_up = max(score, 0.0)
+        break
+
+    region = _collect_region(top, top_score, scores)
+    # Область для GPT берем чуть шире найденной статьи: родитель лучшего узла
+    wider = top.parent if top.parent is not None and top.parent.name not in ("html", "[document]") else body
+    candidate_text = "\n\n".join(_region_text([wider]))
+    region_link_density = (
+        sum(_link_density(tag) * _text_length(tag) for tag in region)
+        / max(sum(_text_length(tag) for tag in region), 1)
+    )
+    paragraphs = _region_text(region)
+    if title and (not paragraphs or title not in paragraphs[:3]):
+        paragraphs.insert(0, title)
+    text = "\n\n".join(paragraphs)
+
+    # --- Оценка уверенности ---
+    text_length = len(text)
+    long_paragraphs = sum(1 for p in paragraphs if len(p) >= 80)
+    c_length = min(text_length / 1000, 1.0)
+    c_links = 1 - min(region_link_density * 2, 1.0)
+    c_separation = 1 - 0.5 * min(runner_up / top_score, 1.0) if top_score > 0 else 0.0
+    c_paragraphs = min(long_paragraphs / 3, 1.0)
+    confidence = 0.35 * c_length + 0.25 * c_links + 0.2 * c_separation + 0.2 * c_paragraphs
+    if any(tag.name in ("article", "main") for tag in [top, *top.parents]):
+        confidence += 0.1
+    if page_length and text_length / page_length < 0.05:
+        # Выбрали крошечный кусок большой страницы — вероятно, промахнулись
+        confidence *= 0.5
+
+    return ExtractionResult(
+        text=text,
+        confidence=round(max(0.0, min(confidence, 1.0)), 3),
+        candidate_text=candidate_text,
+    )
@@ -1,10 +1,60 @@
 # file: services/storage.py
 
+import glob
+import hashlib
 import os
-import shutil
+import re
 import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
 from fastapi import UploadFile
 
+from core.config import settings
+from core.executors import io_executor
+
+# Размер порции при копировании загруженного файла на диск
+COPY_CHUNK_SIZE = 1024 * 1024
+_MB = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Загружаемый файл превышает допустимый размер для своего типа."""
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds the limit of {max_bytes // _MB} MB.")
+        self.max_bytes = max_bytes
+
+
+def max_upload_bytes(source_type: str) -> int:
+    """Лимит размера файла для типа источника (pdf, docx, audio, ...)."""
+    limits_mb = {
+        "pdf": settings.MAX_UPLOAD_MB_PDF,
+        "docx": settings.MAX_UPLOAD_MB_DOCX,
+        "audio": settings.MAX_UPLOAD_MB_AUDIO,
+        "record": settings.MAX_UPLOAD_MB_AUDIO,
+        "photo": settings.MAX_UPLOAD_MB_PHOTO,
+    }
+    return limits_mb.get(source_type, settings.MAX_UPLOAD_MB_DEFAULT) * _MB
+
+
+# Допустимые расширения файлов на диске (все прочее отбрасываем)
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+@dataclass
+class StoredFile:
+    """Сохраненный файл: путь на диске, SHA-256 содержимого и размер в байтах."""
+    path: str
+    sha256: str
+    size: int
+    # True, если файл с таким содержимым уже лежал в хранилище
+    deduplicated: bool = False
+
+def _hash_and_write(digest, buffer, chunk: bytes):
+    # hashlib и запись на диск отпускают GIL, поэтому это выполняется в пуле
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
 class FileStorage:
     """
     Сервис для сохранения и получения URL загруженных файлов.
@@ -20,29 +70,104 @@ class FileStorage:
         if not os.path.exists(self.base_path):
             os.makedirs(self.base_path)
 
-    def save_file(self, file: UploadFile) -> str:
+    async def save_upload(
+        self, file: UploadFile, max_bytes: Optional[int] = None, commit: Optional[Callable[..., StoredFile]] = None
+    ) -> StoredFile:
         """
-        Сохраняет загруженный файл на диск.
+        Сохраняет загруженный файл в хранилище, адресуемое по содержимому.
+
+        Имя файла на диске — SHA-256 его содержимого, поэтому одинаковые загрузки
+        занимают место один раз. Файл читается порциями, каждая порция хэшируется
+        и пишется на диск в пуле ввода-вывода, так что память не зависит от размера
+        файла, а event loop не блокируется. Если такой файл уже есть, временный
+        просто удаляется.
 
         :param file: Объект UploadFile от FastAPI.
-        :return: Относительный путь к сохраненному файлу.
+        :param max_bytes: Лимит размера; при превышении — UploadTooLargeError.
+        :param commit: Чем перенести временный файл на место (по умолчанию commit_temp_file;
+            services/file_references заодно берет ссылку на файл).
+        :return: StoredFile с относительным путем, хэшем и размером файла.
         """
+        # Пишем во временный файл: итоговое имя станет известно только после хэширования
+        temp_path = os.path.join(self.base_path, f".tmp-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
         try:
-            # Генерируем уникальное имя файла, чтобы избежать перезаписи
-            # и проблем с одинаковыми именами. Сохраняем исходное расширение.
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-            file_path = os.path.join(self.base_path, unique_filename)
-
-            # Копируем содержимое загруженного файла в новый файл на диске
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            # Возвращаем путь, который мы сохраним в базу данных
-            return file_path
+            buffer = await io_executor.run(open, temp_path, "wb")
+            try:
+                while chunk := await file.read(COPY_CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLargeError(max_bytes)
+                    await io_executor.run(_hash_and_write, digest, buffer, chunk)
+            finally:
+                await io_executor.run(buffer.close)
+            return await io_executor.run(
+                commit or self.commit_temp_file, temp_path, digest.hexdigest(), size, file.filename
+            )
         finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             # Закрываем файл, чтобы освободить ресурсы
-            file.file.close()
+            await file.close()
+
+    def save_fileobj(
+        self, fileobj, filename: str, max_bytes: Optional[int] = None, commit: Optional[Callable[..., StoredFile]] = None
+    ) -> StoredFile:
+        """
+        Синхронный вариант save_upload для открытого файлового объекта
+        (например, файла внутри zip-архива). Блокирует — вызывать в пуле io.
+        """
+        temp_path = os.path.join(self.base_path, f".tmp-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, "wb") as buffer:
+                while chunk := fileobj.read(COPY_CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLargeError(max_bytes)
+                    _hash_and_write(digest, buffer, chunk)
+            return (commit or self.commit_temp_file)(temp_path, digest.hexdigest(), size, filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def commit_temp_file(self, temp_path: str, sha256: str, size: int, filename: str | None) -> StoredFile:
+        """
+        Переносит временный файл на место по хэшу или отбрасывает его как дубликат.
+        Временный файл после вызова больше не нужен вызывающему.
+        """
+        existing = self.find_by_hash(sha256)
+        if existing:
+            os.remove(temp_path)
+            return StoredFile(path=existing, sha256=sha256, size=size, deduplicated=True)
+
+        # Сохраняем исходное расширение, чтобы статика отдавала правильный Content-Type
+        file_extension = os.path.splitext(filename or "")[1].lower()
+        if not _EXTENSION_RE.match(file_extension):
+            file_extension = ""
+        file_path = os.path.join(self.base_path, f"{sha256}{file_extension}")
+        os.replace(temp_path, file_path)
+        return StoredFile(path=file_path, sha256=sha256, size=size)
+
+    def find_by_hash(self, sha256: str) -> str | None:
+        """Возвращает путь к уже сохраненному файлу с таким содержимым (расширение может отличаться)."""
+        matches = glob.glob(os.path.join(self.base_path, f"{sha256}*"))
+        return matches[0] if matches else None
+
+    def delete_file(self, file_path: str) -> int:
+        """
+        Удаляет файл из хранилища.
+
+        :return: Количество освобожденных байт (0, если файла уже не было).
+        """
+        try:
+            size = os.path.getsize(file_path)
+            os.remove(file_path)
+            return size
+        except FileNotFoundError:
+            return 0
 
     def get_file_url(self, file_path: str) -> str:
         """
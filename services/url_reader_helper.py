@@ -1,25 +1,38 @@
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
-from openai import OpenAI
+from core.cache import TTLCache
 from core.config import settings
+from core.executors import parsing_executor
+from core.metrics import metrics
+from services import llm_provider, readability
+from services.http_fetcher import http_fetcher
 import sys
 
 # --- Инициализация OpenAI клиента прямо в этом файле ---
 try:
-    # Мы используем синхронный клиент, так как наша функция синхронная
-    sync_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    # Асинхронный клиент: очистка текста не должна занимать поток, пока ждем GPT
+    async_client = llm_provider.create_async_client()
     print("OpenAI client initialized successfully for url_reader_helper.")
 except Exception as e:
-    sync_client = None
+    async_client = None
     print(f"CRITICAL: Could not initialize OpenAI client for url_reader_helper. Error: {e}")
 
+# Кэш готового текста по sha256 тела страницы: одна и та же статья, которой
+# делятся разные пользователи, разбирается (и чистится GPT) только один раз.
+_cleaned_text_cache = TTLCache(
+    "link_cleaned_text",
+    maxsize=settings.LINK_TEXT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LINK_TEXT_CACHE_TTL_SECONDS,
+)
 
-def _extract_main_content_with_gpt(text: str) -> str:
+
+async def _extract_main_content_with_gpt(text: str) -> str:
     """
     Внутренняя функция, которая использует GPT с продвинутым промптом
     для извлечения основного контента.
     """
-    if not sync_client:
+    if not async_client:
         print("OpenAI client is not initialized. Returning original text.")
         return text
 
@@ -63,7 +76,7 @@ def _extract_main_content_with_gpt(text: str) -> str:
     
     print("--- Вызываю GPT с продвинутым промптом для извлечения контента ---")
     try:
-        chat_completion = sync_client.chat.completions.create(
+        chat_completion = await async_client.chat.completions.create(
             messages=[
                 {"role": "system", "content": "Ты — высокоточный движок для извлечения и очистки веб-контента. Твоя задача — следовать инструкциям пользователя с максимальной педантичностью."},
                 {"role": "user", "content": prompt}
@@ -79,43 +92,54 @@ def _extract_main_content_with_gpt(text: str) -> str:
         return text
 
 
-def get_text_from_url(url: str) -> str | None:
+def _parse_and_extract(content: bytes) -> readability.ExtractionResult:
+    """Разбор HTML и поиск основного контента — чистая CPU-работа для пула parsing."""
+    soup = BeautifulSoup(content, 'html.parser')
+    return readability.extract_main_content(soup)
+
+
+async def get_text_from_url(url: str) -> str | None:
     """
     Основная функция, которую вызывает api/notes.py.
-    Загружает веб-страницу, извлекает весь текст, а затем
-    использует GPT для очистки и получения только основного контента.
+    Загружает веб-страницу и извлекает основной контент локальным экстрактором.
+    GPT подключается только если локальный результат ненадежен, и получает
+    не всю страницу, а лишь усеченную область-кандидат.
     """
     print(f"--- Шаг 1: Получаю 'сырые' данные со страницы: {url} ---")
     
     try:
-        # --- Часть 1: Скрейпинг с помощью BeautifulSoup ---
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        for script_or_style in soup(['script', 'style']):
-            script_or_style.extract()
-        
-        raw_text = soup.get_text()
-        lines = (line.strip() for line in raw_text.splitlines())
-        clean_raw_text = '\n'.join(line for line in lines if line)
-        
-        if not clean_raw_text:
+        # --- Часть 1: Загрузка через общий слой с пулом соединений и кэшем ---
+        page = await http_fetcher.fetch(url)
+        body_hash = page.content_hash
+        cached_text = _cleaned_text_cache.get(body_hash)
+        if cached_text is not None:
+            print("--- Текст страницы найден в кэше, разбор пропущен. ---")
+            return cached_text
+
+        # --- Часть 2: Локальное извлечение основного контента ---
+        result = await parsing_executor.run(_parse_and_extract, page.content)
+        if not result.candidate_text.strip():
             print("--- BeautifulSoup не смог извлечь текст. ---")
             return None
-        
-        print("--- 'Сырой' текст успешно извлечен. ---")
-        
-        # --- Часть 2: Отправляем "сырой" текст в GPT для очистки ---
-        print("--- Шаг 2: Отправляю текст в GPT для извлечения основного контента. ---")
-        main_content = _extract_main_content_with_gpt(clean_raw_text)
+
+        print(f"--- Локальный экстрактор: {len(result.text)} символов, уверенность {result.confidence} ---")
+        if result.text.strip() and result.confidence >= settings.LINK_LOCAL_MIN_CONFIDENCE:
+            metrics.inc("link_extraction.local")
+            _cleaned_text_cache.set(body_hash, result.text)
+            return result.text
+
+        # --- Часть 3: Уверенность низкая — досылаем в GPT только область-кандидат ---
+        candidate = result.candidate_text[:settings.LINK_GPT_MAX_INPUT_CHARS]
+        print(f"--- Шаг 2: Отправляю в GPT область-кандидат ({len(candidate)} символов). ---")
+        metrics.inc("link_extraction.gpt")
+        main_content = await _extract_main_content_with_gpt(candidate)
+        if main_content is not candidate:
+            # Кэшируем только реально очищенный текст, а не возврат исходника после ошибки GPT
+            _cleaned_text_cache.set(body_hash, main_content)
         
         return main_content
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Ошибка: Не удалось загрузить страницу. Причина: {e}")
         return None
     except Exception as e:
@@ -130,7 +154,7 @@ if __name__ == "__main__":
     
     target_url = sys.argv[1]
     print(f"\n--- Начинаю тест модуля services.url_reader_helper ---")
-    final_text = get_text_from_url(target_url)
+    final_text = asyncio.run(get_text_from_url(target_url))
     print("\n--- ИТОГОВЫЙ ТЕКСТ ---")
     if final_text:
         print(final_text)
@@ -2,17 +2,18 @@
 
 import chromadb
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 CHROMA_PATH = "./chroma_db"
 COLLECTION_NAME = "notes_collection"
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 
 class VectorStore:
     def __init__(self):
         self.client = chromadb.PersistentClient(path=CHROMA_PATH)
         # Используем стандартную многоязычную модель для создания векторов (эмбеддингов)
         self.embedding_model = SentenceTransformer(
-            'paraphrase-multilingual-MiniLM-L12-v2',
+            EMBEDDING_MODEL_NAME,
             device='cpu'
         )
         self.collection = self.client.get_or_create_collection(
@@ -42,10 +43,54 @@ class VectorStore:
                 chunks.append(p.strip())
         return chunks
 
-    def upsert_note_chunks(self, note_id: int, user_id: int, text_content: str):
+    def embed_text(self, text_content: str) -> Tuple[List[str], List[List[float]]]:
+        """Разбивает текст на чанки и считает их эмбеддинги одним батчем."""
+        chunks = self._chunk_text(text_content or "")
+        if not chunks:
+            return [], []
+        return chunks, self.embedding_model.encode(chunks).tolist()
+
+    def embed_texts(self, texts: List[str]) -> List[Tuple[List[str], List[List[float]]]]:
+        """
+        То же, что embed_text, но для многих текстов сразу: чанки всех текстов
+        кодируются одним вызовом модели, что гораздо быстрее поштучного кодирования.
+        """
+        chunked = [self._chunk_text(text or "") for text in texts]
+        all_chunks = [chunk for chunks in chunked for chunk in chunks]
+        if not all_chunks:
+            return [([], []) for _ in texts]
+        all_embeddings = self.embedding_model.encode(all_chunks).tolist()
+        results, position = [], 0
+        for chunks in chunked:
+            results.append((chunks, all_embeddings[position:position + len(chunks)]))
+            position += len(chunks)
+        return results
+
+    def add_notes_chunks(self, entries: List[Tuple[int, int, List[str], List[List[float]]]]):
+        """
+        Сохраняет чанки сразу многих новых заметок одним запросом к ChromaDB.
+        entries — список (note_id, user_id, чанки, эмбеддинги). Старые чанки не удаляются:
+        метод предназначен только для только что созданных заметок.
+        """
+        ids, embeddings, metadatas, documents = [], [], [], []
+        for note_id, user_id, chunks, chunk_embeddings in entries:
+            ids.extend(f"{note_id}_{i}" for i in range(len(chunks)))
+            embeddings.extend(chunk_embeddings)
+            metadatas.extend({"note_id": note_id, "user_id": user_id} for _ in chunks)
+            documents.extend(chunks)
+        if not ids:
+            return
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        print(f"Upserted {len(ids)} chunks for {len(entries)} notes to vector store.")
+
+    def upsert_note_chunks(
+        self, note_id: int, user_id: int, text_content: str,
+        precomputed: Optional[Tuple[List[str], List[List[float]]]] = None
+    ):
         """
         Главная функция для добавления/обновления заметки в векторной базе.
         Разбивает текст на чанки и сохраняет каждый как отдельный вектор.
+        Готовые (чанки, эмбеддинги) можно передать в precomputed — например, из кэша.
         """
         # 1. Сначала удаляем все старые чанки для этой заметки, чтобы избежать дублей
         self.delete_note(note_id)
@@ -54,15 +99,14 @@ class VectorStore:
             print(f"Note {note_id} has no content to upsert.")
             return
 
-        # 2. Разбиваем новый текст на чанки
-        chunks = self._chunk_text(text_content)
+        # 2. Разбиваем новый текст на чанки и считаем эмбеддинги (если их не передали)
+        chunks, embeddings = precomputed if precomputed is not None else self.embed_text(text_content)
         if not chunks:
             print(f"No suitable chunks found for note {note_id}.")
             return
 
         # 3. Готовим данные для сохранения в ChromaDB
         chunk_ids = [f"{note_id}_{i}" for i in range(len(chunks))]
-        embeddings = [self._generate_embedding(chunk) for chunk in chunks]
         metadatas = [{"note_id": note_id, "user_id": user_id} for _ in chunks]
 
         # 4. Сохраняем все чанки в векторную базу
@@ -74,6 +118,22 @@ class VectorStore:
         )
         print(f"Upserted {len(chunks)} chunks for note {note_id} to vector store.")
 
+    def append_note_chunks(self, note_id: int, user_id: int, text_content: str, chunk_prefix: str):
+        """
+        Добавляет чанки только для нового текста заметки, не трогая уже сохраненные.
+        chunk_prefix делает ID новых чанков уникальными (например, позиция первого нового блока).
+        """
+        chunks, embeddings = self.embed_text(text_content)
+        if not chunks:
+            return
+        self.collection.upsert(
+            ids=[f"{note_id}_{chunk_prefix}_{i}" for i in range(len(chunks))],
+            embeddings=embeddings,
+            metadatas=[{"note_id": note_id, "user_id": user_id} for _ in chunks],
+            documents=chunks,
+        )
+        print(f"Appended {len(chunks)} chunks for note {note_id} to vector store.")
+
     def search_notes(self, user_id: int, query_text: str, top_n: int = 5, threshold: float = 0.5) -> List[Dict[str, Any]]:
         """
         Улучшенная и надежная функция поиска. Находит релевантные чанки.
@@ -123,6 +183,13 @@ class VectorStore:
         # Возвращаем отсортированный список уникальных результатов
         return sorted(list(unique_notes.values()), key=lambda x: x['relevance'], reverse=True)
 
+    def delete_notes(self, note_ids: List[int]):
+        """Удаляет чанки сразу многих заметок одним запросом к ChromaDB."""
+        if not note_ids:
+            return
+        self.collection.delete(where={"note_id": {"$in": list(note_ids)}})
+        print(f"Deleted all chunks for {len(note_ids)} notes from vector store.")
+
     def delete_note(self, note_id: int):
         """
         Удаляет ВСЕ чанки, связанные с указанной заметкой.
@@ -1,48 +1,191 @@
-# file: services/youtube_helper.py (ФИНАЛЬНАЯ ВЕРСИЯ С ПРАВИЛЬНЫМ ВЫЗОВОМ)
+# file: services/youtube_helper.py
 
+import os
+import re
 import sys
-# ПРАВИЛЬНЫЙ ИМПОРТ: импортируем сам КЛАСС, а не отдельную функцию
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 
-def _extract_video_id(url: str) -> str | None:
-    video_id = None
-    if "v=" in url:
-        video_id = url.split("v=")[-1].split("&")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[-1].split("?")[0]
-    return video_id
+from core.metrics import metrics
+from services.extraction_cache import read_json, write_json_atomic
 
-def fetch_transcript(url: str) -> str | None:
-    video_id = _extract_video_id(url)
+# Языки в порядке предпочтения; если ни одного нет, берем любые доступные субтитры
+PRIORITY_LANGUAGES = ['ru', 'en']
+# Сегменты субтитров длятся по 2-5 секунд; в заметке склеиваем их в блоки примерно такой длины
+BLOCK_SECONDS = 30.0
+# Сколько помнить, что у видео нет субтитров (их могут добавить позже)
+NO_TRANSCRIPT_TTL_SECONDS = 6 * 3600
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com"}
+# Пути вида /shorts/<id>, /embed/<id>, /live/<id>, /v/<id>
+_PATH_PREFIXES = {"shorts", "embed", "live", "v", "e"}
+
+
+def extract_video_id(url: str) -> str | None:
+    """
+    Достает ID видео из любых вариантов ссылок YouTube без сетевых запросов:
+    watch?v=, youtu.be/, shorts/, embed/, live/, мобильные (m.youtube.com)
+    и youtube-nocookie.com. Голый ID из 11 символов тоже принимается.
+    """
+    url = url.strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+    if "://" not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    segments = [segment for segment in parts.path.split("/") if segment]
+
+    candidate = None
+    if host == "youtu.be" and segments:
+        candidate = segments[0]
+    elif host in _YOUTUBE_HOSTS:
+        query = parse_qs(parts.query)
+        if "v" in query:
+            candidate = query["v"][0]
+        elif len(segments) >= 2 and segments[0] in _PATH_PREFIXES:
+            candidate = segments[1]
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+class TranscriptCache:
+    """
+    Постоянный кэш субтитров на диске: одно видео скачивается один раз для всех пользователей.
+
+    <video_id>.json        — какой язык выбран для видео (или что субтитров нет);
+    <video_id>.<lang>.json — сегменты субтитров этого языка с временем начала.
+    """
+    def __init__(self, base_path: str = "cache/youtube"):
+        self.base_path = base_path
+        os.makedirs(self.base_path, exist_ok=True)
+
+    def _path(self, video_id: str, filename: str) -> str:
+        return os.path.join(self.base_path, video_id[:2], filename)
+
+    def get_selection(self, video_id: str) -> Optional[dict]:
+        return read_json(self._path(video_id, f"{video_id}.json"))
+
+    def put_selection(self, video_id: str, language: Optional[str], reason: Optional[str] = None):
+        write_json_atomic(self._path(video_id, f"{video_id}.json"), {
+            "priority": PRIORITY_LANGUAGES, "language": language, "reason": reason, "checked_at": time.time(),
+        })
+
+    def get_segments(self, video_id: str, language: str) -> Optional[List[dict]]:
+        payload = read_json(self._path(video_id, f"{video_id}.{language}.json"))
+        return payload["segments"] if payload else None
+
+    def put_segments(self, video_id: str, language: str, segments: List[dict]):
+        write_json_atomic(self._path(video_id, f"{video_id}.{language}.json"), {"language": language, "segments": segments})
+
+
+transcript_cache = TranscriptCache()
+
+
+def _choose_transcript(transcripts: list):
+    """
+    Выбирает субтитры локально, по уже полученному списку:
+    сначала ручные на приоритетных языках, потом автоматические на них же,
+    потом любые ручные, потом любые автоматические.
+    """
+    for is_generated in (False, True):
+        for language in PRIORITY_LANGUAGES:
+            for transcript in transcripts:
+                if transcript.is_generated == is_generated and transcript.language_code.split("-")[0] == language:
+                    return transcript
+    ordered = sorted(transcripts, key=lambda transcript: transcript.is_generated)
+    return ordered[0] if ordered else None
+
+
+def _cached_segments(video_id: str) -> tuple[bool, Optional[List[dict]]]:
+    """(найдено в кэше, сегменты) — сегменты None, если известно, что субтитров нет."""
+    selection = transcript_cache.get_selection(video_id)
+    if not selection or selection.get("priority") != PRIORITY_LANGUAGES:
+        return False, None
+    language = selection.get("language")
+    if language is None:
+        fresh = time.time() - selection.get("checked_at", 0) < NO_TRANSCRIPT_TTL_SECONDS
+        return fresh, None
+    segments = transcript_cache.get_segments(video_id, language)
+    return segments is not None, segments
+
+
+def fetch_transcript_segments(url: str) -> List[dict] | None:
+    """
+    Возвращает сегменты субтитров [{"text", "start", "duration"}, ...] или None.
+    На видео уходит один запрос списка субтитров и один запрос выбранной дорожки;
+    результат кэшируется на диске по ID видео и языку.
+    """
+    video_id = extract_video_id(url)
     if not video_id:
         print(f"Could not extract video_id from URL: {url}")
         return None
 
-    priority_languages = ['ru', 'en']
-    
-    for lang in priority_languages:
-        try:
-            print(f"Пытаюсь получить субтитры для языка: '{lang}'...")
-            
-            # ПРАВИЛЬНЫЙ ВЫЗОВ: вызываем метод .get_transcript() на классе YouTubeTranscriptApi
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-            
-            full_text = " ".join([item['text'] for item in transcript_list])
-            
-            print(f"Успех! Субтитры для языка '{lang}' получены.")
-            return full_text
-        except NoTranscriptFound:
-            print(f"Субтитры для языка '{lang}' не найдены.")
-            continue
-        except TranscriptsDisabled:
-            print(f"Субтитры отключены для видео {video_id}.")
+    found, segments = _cached_segments(video_id)
+    if found:
+        metrics.inc("youtube.transcript_cache.hits")
+        return segments
+    metrics.inc("youtube.transcript_cache.misses")
+
+    try:
+        transcripts = list(YouTubeTranscriptApi().list(video_id))
+        transcript = _choose_transcript(transcripts)
+        if transcript is None:
+            print(f"Для видео {video_id} нет субтитров.")
+            transcript_cache.put_selection(video_id, None, reason="not_found")
             return None
-        except Exception as e:
-            print(f"Произошла непредвиденная ошибка при получении субтитров для '{lang}': {e}.")
+        segments = transcript.fetch().to_raw_data()
+    except TranscriptsDisabled:
+        print(f"Субтитры отключены для видео {video_id}.")
+        transcript_cache.put_selection(video_id, None, reason="disabled")
+        return None
+    except NoTranscriptFound:
+        print(f"Для видео {video_id} нет субтитров.")
+        transcript_cache.put_selection(video_id, None, reason="not_found")
+        return None
+    except Exception as e:
+        # Сетевые ошибки и блокировки не кэшируем: следующая попытка может пройти
+        print(f"Произошла непредвиденная ошибка при получении субтитров для видео {video_id}: {e}.")
+        return None
+
+    print(f"Успех! Субтитры для языка '{transcript.language_code}' получены.")
+    transcript_cache.put_segments(video_id, transcript.language_code, segments)
+    transcript_cache.put_selection(video_id, transcript.language_code)
+    return segments
+
+
+def group_segments(segments: List[dict], block_seconds: float = BLOCK_SECONDS) -> List[dict]:
+    """Склеивает короткие сегменты в блоки {"time_start", "text"} длиной около block_seconds."""
+    blocks = []
+    current_start, current_text = None, []
+    for segment in segments:
+        text = segment["text"].replace("\n", " ").strip()
+        if not text:
             continue
+        if current_start is not None and segment["start"] - current_start >= block_seconds:
+            blocks.append({"time_start": current_start, "text": " ".join(current_text)})
+            current_start, current_text = None, []
+        if current_start is None:
+            current_start = segment["start"]
+        current_text.append(text)
+    if current_text:
+        blocks.append({"time_start": current_start, "text": " ".join(current_text)})
+    return blocks
 
-    print(f"Не удалось найти субтитры ни на одном из приоритетных языков для видео {video_id}.")
-    return None
+
+def fetch_transcript(url: str) -> str | None:
+    """Текст субтитров одной строкой (для отладки из командной строки)."""
+    segments = fetch_transcript_segments(url)
+    if not segments:
+        return None
+    return " ".join(segment["text"] for segment in segments)
 
 # Тестовый блок
 if __name__ == '__main__':
@@ -56,4 +199,4 @@ if __name__ == '__main__':
     if transcript_text:
         print(transcript_text)
     else:
-        print("Не удалось получить транскрипцию.")
\ No newline at end of file
+        print("Не удалось получить транскрипцию.")